@@ -429,6 +429,30 @@ document.addEventListener('DOMContentLoaded', () => {
         updateUIState();
     });
 
+    async function waitForProcessingJob(jobId) {
+        // Polls the background ingestion job until it completes or fails, showing progress.
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            const response = await fetch(`/process_docs/${currentUser}/status?job_id=${encodeURIComponent(jobId)}`, {
+                headers: { 'Authorization': 'Basic ' + btoa(currentUser + ":" + currentPassword) }
+            });
+            const job = await response.json();
+            if (!response.ok) {
+                return { status: 'failed', error: job.error || response.statusText };
+            }
+            const files = Object.values(job.files || {});
+            const finishedFiles = files.filter(f => ['done', 'partial', 'skipped', 'failed'].includes(f.status)).length;
+            let progressText = `Processing documents (${job.stage})... ${finishedFiles}/${files.length} files finished.`;
+            if (job.stage === 'embedding' && job.embedding && job.embedding.chunks_total) {
+                progressText += ` ${job.embedding.chunks_done}/${job.embedding.chunks_total} chunks embedded.`;
+            }
+            processStatus.textContent = progressText;
+            if (job.status === 'completed' || job.status === 'failed') {
+                return job;
+            }
+        }
+    }
+
     async function fetchUserRagStatus() {
         if (!currentUser) return;
         dbStatusMessage.textContent = 'Checking RAG status...';
@@ -682,9 +706,13 @@ document.addEventListener('DOMContentLoaded', () => {
                     'Authorization': 'Basic ' + btoa(currentUser + ":" + currentPassword),
                 }
             });
-            const data = await response.json();
-            if (response.ok) {
-                processStatus.textContent = data.message || 'Documents processed successfully! RAG updated.';
+            let data = await response.json();
+            if (response.ok && data.job_id) {
+                // Processing runs as a background job on the server; wait for it to finish.
+                data = await waitForProcessingJob(data.job_id);
+            }
+            if (response.ok && data.status !== 'failed') {
+                processStatus.textContent = 'Documents processed successfully! RAG updated.';
                 processStatus.style.color = 'green';
                 processFilesButton.classList.add('hidden'); // Hide after successful processing
                 await fetchUserRagStatus(); // This updates userHasCustomRag and custom chat button visibility
@@ -725,7 +753,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 // --- END: API Info Box Logic ---
 
             } else {
-                processStatus.textContent = `Processing failed: ${data.detail || response.statusText}`;
+                processStatus.textContent = `Processing failed: ${data.error || data.detail || response.statusText}`;
                 processStatus.style.color = 'red';
                 // Don't hide the button on failure, allow retry
                 processFilesButton.disabled = false;
@@ -919,7 +947,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     prompt: promptText,
                     user_id: currentUser,
                     session_id: currentSessionId,
-                    stream_events: true // Explicitly request detailed events if backend supports
+                    debug: false // true adds the full ADK event dumps (logged to the console)
                 })
             });
 
@@ -960,60 +988,36 @@ document.addEventListener('DOMContentLoaded', () => {
                         try {
                             const eventData = JSON.parse(jsonData);
                             
-                            // Remove initial "Thinking..." if this is the first actual content
-                            if (agentMessageElement && agentMessageElement.classList.contains('thinking') && eventData.content?.parts?.[0]?.text) {
-                                agentMessageElement.remove();
-                                agentMessageElement = null; 
-                                accumulatedText = "";
-                            }
-
-                            if (eventData.event === 'agent_request' && eventData.data?.message) {
-                                appendChatMessage('system', `Agent Request: ${eventData.data.message}`);
-                            } else if (eventData.event === 'tool_code' && eventData.data?.tool_name) {
-                                appendChatMessage('system', `Using Tool: ${eventData.data.tool_name}`);
-                                if(eventData.data.tool_input) {
-                                    const inputStr = JSON.stringify(eventData.data.tool_input, null, 2);
-                                    appendChatMessage('system', `Tool Input: <pre>${inputStr.replace(/</g, "&lt;").replace(/>/g, "&gt;")}</pre>`, false, 'tool-input-message');
-                                }
-                            } else if (eventData.event === 'tool_response' && eventData.data?.tool_name) {
-                                appendChatMessage('system', `Tool Response from ${eventData.data.tool_name} received.`);
-                                 if(eventData.data.tool_output) {
-                                    const outputStr = typeof eventData.data.tool_output === 'string' ? eventData.data.tool_output : JSON.stringify(eventData.data.tool_output, null, 2);
-                                    appendChatMessage('system', `Tool Output: <pre>${outputStr.replace(/</g, "&lt;").replace(/>/g, "&gt;")}</pre>`, false, 'tool-output-message');
-                                }
-                            } else if (eventData.event === 'agent_response_start') {
-                                // This might be where you initialize the agent's message bubble
+                            const data = eventData.data || {};
+                            const renderAgentText = (text, typing) => {
                                 if (!agentMessageElement) {
-                                    agentMessageElement = appendChatMessage('agent', '...', true); // Start with a placeholder
-                                }
-                            } else if (eventData.content && eventData.content.parts && eventData.content.parts[0].text) {
-                                const textPart = eventData.content.parts[0].text;
-                                accumulatedText += textPart;
-                                if (!agentMessageElement) {
-                                    agentMessageElement = appendChatMessage('agent', accumulatedText, !eventData.is_final_response);
+                                    agentMessageElement = appendChatMessage('agent', text, typing);
                                 } else {
-                                    agentMessageElement.innerHTML = `<strong>Agent:</strong> ${accumulatedText.replace(/</g, "&lt;").replace(/>/g, "&gt;")}`;
-                                    if (!eventData.is_final_response) {
-                                        agentMessageElement.classList.add('thinking'); // Keep it looking like it's typing
-                                    } else {
-                                        agentMessageElement.classList.remove('thinking');
-                                    }
-                                }
-                            } else if (eventData.is_final_response) {
-                                if (agentMessageElement) {
-                                    agentMessageElement.classList.remove('thinking');
-                                }
-                                // If there was no content part but it's final, ensure any "Thinking" is removed or updated.
-                                if (!accumulatedText && agentMessageElement) {
-                                     agentMessageElement.innerHTML = `<strong>Agent:</strong> (No textual response)`;
+                                    agentMessageElement.innerHTML = `<strong>Agent:</strong> ${text.replace(/</g, "&lt;").replace(/>/g, "&gt;")}`;
+                                    agentMessageElement.classList.toggle('thinking', typing);
                                 }
+                            };
+
+                            if (eventData.event === 'text_delta') {
+                                accumulatedText += data.text || '';
+                                renderAgentText(accumulatedText, true);
+                            } else if (eventData.event === 'final') {
+                                // The final text replaces the streamed deltas; later output starts a new bubble
+                                renderAgentText(data.text || accumulatedText || '(No textual response)', false);
+                                agentMessageElement = null;
+                                accumulatedText = "";
+                            } else if (eventData.event === 'tool_start') {
+                                appendChatMessage('system', `Using Tool: ${data.tool}`);
+                            } else if (eventData.event === 'tool_end') {
+                                appendChatMessage('system', `Tool ${data.tool} finished (${data.status}).`);
+                            } else if (eventData.event === 'agent_transfer') {
+                                appendChatMessage('system', `Transferred to agent: ${data.agent}`);
                             } else if (eventData.event === 'error') {
-                                appendChatMessage('system', `Stream Error: ${eventData.data?.message || 'Unknown error'}`);
-                            } else if (eventData.event) { // Catch other named events
-                                appendChatMessage('system', `Event: ${eventData.event} - ${JSON.stringify(eventData.data || {})}`);
+                                appendChatMessage('system', `Stream Error: ${data.message || 'Unknown error'}`);
+                            } else if (eventData.event === 'debug') {
+                                console.debug("ADK event:", data);
                             }
 
-
                         } catch (e) {
                             console.error("Error parsing SSE event data:", e, jsonData);
                             appendChatMessage('system', `Error parsing stream data: ${jsonData.substring(0,100)}...`);
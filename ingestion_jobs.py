@@ -0,0 +1,259 @@
+import os
+import re
+import uuid
+import shutil
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: job folders are not locked against other workers
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Number of ingestion jobs that may run at the same time across all users
+DEFAULT_MAX_WORKERS = int(os.getenv("INGESTION_MAX_WORKERS", "2"))
+# Finished jobs kept in memory for status polling
+MAX_FINISHED_JOBS = 100
+# Worker processes that parse documents for server builds. At least 2, because jobs=1 parses
+# inline, and CPU-bound parsing on a thread of the API process would hold the GIL and slow chat.
+DEFAULT_PARSE_PROCESSES = int(os.getenv("INGESTION_PARSE_JOBS", str(max(2, (os.cpu_count() or 2) // 2))))
+
+_JOB_FOLDER_RE = re.compile(r"^(?P<staged>.+)_job_[0-9a-f]{32}$")
+
+
+class JobAlreadyRunningError(Exception):
+    """Raised when a user submits a job while another of their jobs is still queued or running."""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Ingestion job {job_id} is already active for this user.")
+        self.job_id = job_id
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _lock_job_folder(job_folder: str, blocking: bool = True) -> Any:
+    """Takes an exclusive lock on `<job_folder>.lock`; raises BlockingIOError if non-blocking and held."""
+    if fcntl is None:
+        return None
+    lock_file = open(job_folder + ".lock", "a")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BaseException:
+        lock_file.close()
+        raise
+    return lock_file
+
+
+def _unlock_job_folder(job_folder: str, lock_file: Any) -> None:
+    if lock_file is None:
+        return
+    try:
+        os.remove(job_folder + ".lock")
+    except OSError:
+        pass
+    lock_file.close()
+
+
+def _restore_staged_files(job_id: str, staged_folder: str, job_folder: str) -> None:
+    """Moves a failed or interrupted job's files back to the staging folder so the user can retry."""
+    try:
+        os.makedirs(staged_folder, exist_ok=True)
+        for name in os.listdir(job_folder):
+            target = os.path.join(staged_folder, name)
+            if os.path.exists(target):
+                continue  # re-uploaded while the job ran; the newer upload wins
+            os.replace(os.path.join(job_folder, name), target)
+    except OSError as e:
+        logger.error(f"Could not restore the files of ingestion job {job_id} to {staged_folder}: {e}")
+        return
+    shutil.rmtree(job_folder, ignore_errors=True)
+
+
+class IngestionJobManager:
+    """
+    Runs document ingestion (process_documents_and_build_db) on a bounded thread pool so
+    builds never block the event loop, and keeps per-job progress for status polling.
+    Each user may have at most one queued or running job.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._active_job_by_user: Dict[str, str] = {}
+        self._latest_job_by_user: Dict[str, str] = {}
+        self._folder_locks: Dict[str, Any] = {}
+
+    def submit(
+        self,
+        user_name: str,
+        staged_folder: str,
+        build: Callable[..., Optional[Dict[str, Any]]],
+        **build_kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Queues a build of `staged_folder` for `user_name`. The folder is first moved to a
+        job-owned location, so uploads made while the job runs are staged for the next job.
+        `build` is called as build(docs_folder=..., progress_callback=..., **build_kwargs).
+        """
+        with self._lock:
+            active_job_id = self._active_job_by_user.get(user_name)
+            if active_job_id is not None:
+                raise JobAlreadyRunningError(active_job_id)
+
+            job_id = uuid.uuid4().hex
+            job_folder = f"{staged_folder.rstrip(os.sep)}_job_{job_id}"
+            # Held until the job ends, so recover_orphaned_jobs in another worker leaves it alone
+            lock_file = _lock_job_folder(job_folder)
+            try:
+                os.replace(staged_folder, job_folder)
+            except OSError:
+                _unlock_job_folder(job_folder, lock_file)
+                raise
+            self._folder_locks[job_id] = lock_file
+
+            job = {
+                "job_id": job_id,
+                "user_name": user_name,
+                "status": "queued",
+                "stage": "queued",
+                "created_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "files": {name: {"status": "pending"} for name in sorted(os.listdir(job_folder))},
+                "embedding": {"chunks_done": 0, "chunks_total": 0},
+                "summary": None,
+                "error": None,
+            }
+            self._jobs[job_id] = job
+            self._active_job_by_user[user_name] = job_id
+            self._latest_job_by_user[user_name] = job_id
+
+        self._executor.submit(self._run, job_id, staged_folder, job_folder, build, build_kwargs)
+        logger.info(f"Queued ingestion job {job_id} for user '{user_name}'.")
+        return self.get(job_id)
+
+    def _run(
+        self,
+        job_id: str,
+        staged_folder: str,
+        job_folder: str,
+        build: Callable[..., Any],
+        build_kwargs: Dict[str, Any],
+    ) -> None:
+        self._update(job_id, status="running", stage="starting", started_at=_now())
+        succeeded = False
+        try:
+            summary = build(
+                docs_folder=job_folder,
+                progress_callback=lambda event: self._on_progress(job_id, event),
+                **build_kwargs,
+            )
+            self._update(job_id, status="completed", stage="done", summary=summary)
+            succeeded = True
+        except BaseException as e:  # load_environment() may sys.exit(); never let it kill the worker
+            logger.error(f"Ingestion job {job_id} failed: {e}", exc_info=True)
+            with self._lock:
+                job = self._jobs[job_id]
+                job.update(status="failed", stage="failed", error=str(e) or type(e).__name__)
+                # Nothing from this job was published, whatever the per-file progress said
+                for file_progress in job["files"].values():
+                    if file_progress.get("status") not in ("failed", "skipped"):
+                        file_progress["status"] = "failed"
+        finally:
+            if succeeded:
+                shutil.rmtree(job_folder, ignore_errors=True)
+            else:
+                _restore_staged_files(job_id, staged_folder, job_folder)
+            with self._lock:
+                _unlock_job_folder(job_folder, self._folder_locks.pop(job_id, None))
+                job = self._jobs[job_id]
+                job["finished_at"] = _now()
+                if self._active_job_by_user.get(job["user_name"]) == job_id:
+                    del self._active_job_by_user[job["user_name"]]
+                self._prune_locked()
+
+    def recover_orphaned_jobs(self, base_path: str) -> List[str]:
+        """
+        Moves the files of job folders left behind by a server that stopped mid-job back to
+        their staging folders, so the uploads can be processed again. Folders of jobs still
+        running in another worker are locked and skipped. Returns the recovered folders.
+        """
+        recovered = []
+        for name in sorted(os.listdir(base_path)):
+            match = _JOB_FOLDER_RE.match(name)
+            job_folder = os.path.join(base_path, name)
+            if match is None or not os.path.isdir(job_folder):
+                continue
+            try:
+                lock_file = _lock_job_folder(job_folder, blocking=False)
+            except BlockingIOError:
+                continue  # still being processed by another worker
+            try:
+                if not os.path.isdir(job_folder):
+                    continue  # finished by its worker while we waited for the lock
+                job_id = name.rsplit("_", 1)[-1]
+                logger.warning(f"Restoring the files of interrupted ingestion job {job_id}.")
+                _restore_staged_files(job_id, os.path.join(base_path, match.group("staged")), job_folder)
+                recovered.append(job_folder)
+            finally:
+                _unlock_job_folder(job_folder, lock_file)
+        return recovered
+
+    def _on_progress(self, job_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            stage = event.get("stage")
+            if stage == "file":
+                file_progress = job["files"].setdefault(event["file"], {})
+                file_progress.update({k: v for k, v in event.items() if k not in ("stage", "file")})
+            elif stage == "embedding":
+                job["stage"] = "embedding"
+                job["embedding"] = {"chunks_done": event["chunks_done"], "chunks_total": event["chunks_total"]}
+            elif stage == "parsing":
+                job["stage"] = "parsing"
+                for name in event.get("files", []):
+                    job["files"].setdefault(name, {})["status"] = "parsing"
+            elif stage:
+                job["stage"] = stage
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _prune_locked(self) -> None:
+        finished = [j for j in self._jobs.values() if j["finished_at"] is not None]
+        latest = set(self._latest_job_by_user.values())
+        for job in sorted(finished, key=lambda j: j["finished_at"])[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            if job["job_id"] not in latest:
+                del self._jobs[job["job_id"]]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a snapshot of a job's state, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot["files"] = {name: dict(progress) for name, progress in job["files"].items()}
+            snapshot["embedding"] = dict(job["embedding"])
+            return snapshot
+
+    def latest_for_user(self, user_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job_id = self._latest_job_by_user.get(user_name)
+        return self.get(job_id) if job_id else None
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+# Shared manager used by main.py
+ingestion_jobs = IngestionJobManager()
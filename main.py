@@ -11,18 +11,29 @@ from typing import List, Optional
 import pathlib
 from pydantic import BaseModel
 
-from multi_tool_agent.agent import AGENT, SESSION_SERVICE, MEMORY_SERVICE, APP_NAME, get_vector_db_path, root_agent as agent_root_agent, DEFAULT_ROOT_AGENT_INSTRUCTION
-import multi_tool_agent.agent as agent_module
-
-from google.adk.runners import Runner
+from multi_tool_agent.agent import AGENT, SESSION_SERVICE, MEMORY_SERVICE, APP_NAME, get_vector_db_path, DEFAULT_ROOT_AGENT_INSTRUCTION
+from multi_tool_agent.request_context import rag_request_context
+from multi_tool_agent.index_cache import index_registry
+from multi_tool_agent.embedding_cache import query_embedding_cache
+from multi_tool_agent.http_client import http_client
+from multi_tool_agent.web_cache import web_result_cache
+from multi_tool_agent.history import history_manager
+from multi_tool_agent.runners import runner_registry
+from multi_tool_agent.sse_events import DEFAULT_HEARTBEAT_SECONDS, HEARTBEAT, STREAM_OPEN, EventProjector, sse_message
+
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types
 
 from rag_builder import process_documents_and_build_db, load_environment as load_rag_env
+from rag_snapshots import rag_index_exists
+from ingestion_jobs import ingestion_jobs, JobAlreadyRunningError, DEFAULT_PARSE_PROCESSES
+from user_store import UserStore
 
 app = FastAPI()
 
 security = HTTPBasic()
 USERS_FILE = pathlib.Path(__file__).parent / "users.json"
+user_store = UserStore(USERS_FILE)
 CUSTOM_RAG_BASE_PATH = pathlib.Path(__file__).parent / "custom_rag"
 TEMP_UPLOAD_DIR_NAME = "_temp_uploads"
 
@@ -33,10 +44,7 @@ class SignupPayload(BaseModel):
     access_code: str
 
 def get_current_user(credentials: HTTPBasicCredentials = Depends(security)):
-    with open(USERS_FILE, "r") as f:
-        users = json.load(f)
-    correct_password = users.get(credentials.username)
-    if not (correct_password and credentials.password == correct_password):
+    if not user_store.verify(credentials.username, credentials.password):
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password",
@@ -55,22 +63,12 @@ async def signup_user(payload: SignupPayload):
             detail="Invalid access code."
         )
 
-    with open(USERS_FILE, "r+") as f:
-        try:
-            users = json.load(f)
-        except json.JSONDecodeError:
-            users = {} # Initialize if file is empty or malformed
-
-        if payload.username in users:
-            raise HTTPException(
-                status_code=400,
-                detail="Username already exists."
-            )
-
-        users[payload.username] = payload.password
-        f.seek(0)
-        json.dump(users, f, indent=2)
-        f.truncate()
+    # The file lock may briefly wait on a signup in another worker; keep it off the event loop
+    if not await asyncio.to_thread(user_store.add_user, payload.username, payload.password):
+        raise HTTPException(
+            status_code=400,
+            detail="Username already exists."
+        )
 
     return JSONResponse(
         status_code=201,
@@ -78,11 +76,23 @@ async def signup_user(payload: SignupPayload):
     )
 
 async def ensure_session(user_id: str, session_id: str):
-    await SESSION_SERVICE.create_session(
-        app_name=APP_NAME,
-        user_id=user_id,
-        session_id=session_id
-    )
+    # Get-or-create: sessions this worker has seen are answered from memory
+    await SESSION_SERVICE.ensure_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+
+_memory_tasks = set()
+
+def remember_session(user_id: str, session_id: str):
+    """Indexes the session's new turns for load_memory in the background."""
+    async def _remember():
+        try:
+            session = await SESSION_SERVICE.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+            if session is not None:
+                await MEMORY_SERVICE.add_session_to_memory(session)
+        except Exception as e:
+            print(f"Error adding session {session_id} to memory: {e}")
+    task = asyncio.create_task(_remember())
+    _memory_tasks.add(task)
+    task.add_done_callback(_memory_tasks.discard)
 
 @app.post("/upload")
 async def upload_redirect_base(user: str = Depends(get_current_user)):
@@ -96,8 +106,7 @@ async def check_or_initiate_upload_get(user_name: str, current_user: str = Depen
     user_db_path = CUSTOM_RAG_BASE_PATH / user_name
     user_temp_upload_path = CUSTOM_RAG_BASE_PATH / f"{user_name}{TEMP_UPLOAD_DIR_NAME}"
     
-    db_exists = user_db_path.exists() and any(f.name != f"{user_name}_instructions.txt" for f in user_db_path.iterdir() if f.is_file()) \
-                 or (user_db_path.exists() and any(d.is_dir() for d in user_db_path.iterdir())) # Check for non-instruction files or any subdirectories
+    db_exists = rag_index_exists(str(user_db_path), f"{user_name}_collection") # Pointer/index file stats, no directory scan
 
     temp_files_exist = user_temp_upload_path.exists() and any(user_temp_upload_path.iterdir())
 
@@ -198,7 +207,7 @@ async def handle_file_upload(
     })
 
 @app.post("/process_docs/{user_name}")
-async def process_uploaded_documents(user_name: str, current_user: str = Depends(get_current_user)):
+async def process_uploaded_documents(user_name: str, jobs: int = DEFAULT_PARSE_PROCESSES, current_user: str = Depends(get_current_user)):
     if user_name != current_user:
         raise HTTPException(status_code=403, detail="Forbidden: Cannot process another user's documents")
 
@@ -208,68 +217,71 @@ async def process_uploaded_documents(user_name: str, current_user: str = Depends
     if not user_temp_upload_path.exists() or not any(user_temp_upload_path.iterdir()):
         return JSONResponse({"error": "No files found to process. Please upload files first."}, status_code=400)
 
+    # The build runs on the ingestion worker pool; this handler only queues it so the
+    # event loop (and every other user's chat) is never blocked by a build.
     try:
         load_rag_env()
-        process_documents_and_build_db(
-            docs_folder=str(user_temp_upload_path),
+        job = ingestion_jobs.submit(
+            user_name,
+            str(user_temp_upload_path),
+            process_documents_and_build_db,
             db_path=str(user_db_target_path),
             collection_name=f"{user_name}_collection",
             embedding_model_name="models/embedding-001",
             chunk_size=1000,
-            chunk_overlap=200
+            chunk_overlap=200,
+            jobs=max(1, jobs)
         )
-        shutil.rmtree(user_temp_upload_path)
-
-        return JSONResponse({
-            "message": f"RAG database for '{user_name}' created/updated successfully.",
-            "access_endpoints": {
-                "run": f"/run/{user_name}",
-                "run_sse": f"/run_sse/{user_name}"
-            }
-        })
-    except Exception as e:
+    except JobAlreadyRunningError as e:
+        return JSONResponse({"error": str(e), "job_id": e.job_id, "status_endpoint": f"/process_docs/{user_name}/status"}, status_code=409)
+    except (Exception, SystemExit) as e:
         return JSONResponse({"error": f"Failed to process documents: {str(e)}"}, status_code=500)
 
-async def run_agent_with_rag_context(user_id: str, session_id: str, prompt: str, rag_name_override: Optional[str]):
-    original_active_rag_name = agent_module.ACTIVE_RAG_NAME
-    original_agent_instruction = agent_root_agent.instruction
+    return JSONResponse({
+        "message": f"Processing of documents for '{user_name}' started.",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_endpoint": f"/process_docs/{user_name}/status",
+        "access_endpoints": {
+            "run": f"/run/{user_name}",
+            "run_sse": f"/run_sse/{user_name}"
+        }
+    }, status_code=202)
+
+@app.get("/process_docs/{user_name}/status")
+async def process_docs_status(user_name: str, job_id: Optional[str] = None, current_user: str = Depends(get_current_user)):
+    if user_name != current_user:
+        raise HTTPException(status_code=403, detail="Forbidden: Cannot view another user's processing jobs")
 
-    if rag_name_override:
-        agent_module.ACTIVE_RAG_NAME = rag_name_override
-        custom_instructions_path = CUSTOM_RAG_BASE_PATH / rag_name_override / f"{rag_name_override}_instructions.txt"
-        if custom_instructions_path.exists():
-            try:
-                with open(custom_instructions_path, "r") as f:
-                    agent_root_agent.instruction = f.read()
-                print(f"Loaded custom instructions for RAG: {rag_name_override}")
-            except Exception as e:
-                print(f"Error loading custom instructions for {rag_name_override}, using default: {e}")
-                agent_root_agent.instruction = DEFAULT_ROOT_AGENT_INSTRUCTION
-        else:
-            agent_root_agent.instruction = DEFAULT_ROOT_AGENT_INSTRUCTION
-            print(f"No custom instructions file found for RAG: {rag_name_override}. Using default agent instructions.")
-    else:
-        agent_module.ACTIVE_RAG_NAME = "default_rag"
-        default_instructions_path = CUSTOM_RAG_BASE_PATH / "default_rag" / "default_rag_instructions.txt"
-        if default_instructions_path.exists():
-            try:
-                with open(default_instructions_path, "r") as f:
-                    agent_root_agent.instruction = f.read()
-                print("Loaded custom instructions for default_rag.")
-            except Exception as e:
-                print(f"Error loading custom instructions for default_rag, using default: {e}")
-                agent_root_agent.instruction = DEFAULT_ROOT_AGENT_INSTRUCTION
-        else:
-            agent_root_agent.instruction = DEFAULT_ROOT_AGENT_INSTRUCTION
-            print("Using default agent instructions for default_rag.")
+    job = ingestion_jobs.get(job_id) if job_id else ingestion_jobs.latest_for_user(user_name)
+    if job is None or job["user_name"] != user_name:
+        return JSONResponse({"error": "No processing job found."}, status_code=404)
+    return JSONResponse(job)
 
-    try:
-        runner = Runner(
-            agent=AGENT,
-            app_name=APP_NAME,
-            session_service=SESSION_SERVICE,
-            memory_service=MEMORY_SERVICE
-        )
+def load_rag_instructions(rag_name: str, log_suffix: str = "") -> str:
+    """Returns the custom instructions saved for a RAG, or DEFAULT_ROOT_AGENT_INSTRUCTION."""
+    instructions_path = CUSTOM_RAG_BASE_PATH / rag_name / f"{rag_name}_instructions.txt"
+    if instructions_path.exists():
+        try:
+            with open(instructions_path, "r") as f:
+                instructions = f.read()
+            print(f"Loaded custom instructions for RAG: {rag_name}{log_suffix}")
+            return instructions
+        except Exception as e:
+            print(f"Error loading custom instructions for {rag_name}{log_suffix}, using default: {e}")
+            return DEFAULT_ROOT_AGENT_INSTRUCTION
+    print(f"No custom instructions file found for RAG: {rag_name}{log_suffix}. Using default agent instructions.")
+    return DEFAULT_ROOT_AGENT_INSTRUCTION
+
+# /run_sse asks the model for partial responses so text reaches the browser as it is generated
+SSE_RUN_CONFIG = RunConfig(streaming_mode=StreamingMode.SSE)
+
+async def run_agent_with_rag_context(user_id: str, session_id: str, prompt: str, rag_name_override: Optional[str]):
+    # The RAG name and instructions are scoped to this request only, so overlapping
+    # requests for different RAGs never see each other's settings.
+    rag_name = rag_name_override or "default_rag"
+    with rag_request_context(rag_name, load_rag_instructions(rag_name)):
+        runner = runner_registry.get(AGENT, APP_NAME, SESSION_SERVICE, MEMORY_SERVICE)
         content = types.Content(role='user', parts=[types.Part(text=prompt)])
         
         final_response_text = "Agent did not produce a final response."
@@ -281,9 +293,6 @@ async def run_agent_with_rag_context(user_id: str, session_id: str, prompt: str,
                     final_response_text = f"Agent escalated: {event.error_message or 'No specific message.'}"
                 break
         return final_response_text
-    finally:
-        agent_module.ACTIVE_RAG_NAME = original_active_rag_name
-        agent_root_agent.instruction = original_agent_instruction
 
 @app.post("/run")
 @app.post("/run/{user_rag_name}")
@@ -297,6 +306,7 @@ async def run_endpoint(request: Request, user_rag_name: Optional[str] = None):
     await ensure_session(user_id, session_id)
     
     response_text = await run_agent_with_rag_context(user_id, session_id, prompt, user_rag_name)
+    remember_session(user_id, session_id)
     return JSONResponse({"response": response_text})
 
 @app.post("/run_sse")
@@ -310,54 +320,81 @@ async def run_sse_endpoint(request: Request, user_rag_name: Optional[str] = None
         return JSONResponse({"error": "Missing prompt"}, status_code=400)
     await ensure_session(user_id, session_id)
 
+    # The full ADK event dumps (tool arguments and outputs included) are opt-in
+    projector = EventProjector(debug=bool(data.get("debug")))
+
     async def event_generator():
-        original_active_rag_name = agent_module.ACTIVE_RAG_NAME
-        original_agent_instruction = agent_root_agent.instruction
+        rag_name = user_rag_name or "default_rag"
+        queue: asyncio.Queue = asyncio.Queue()
 
-        if user_rag_name:
-            agent_module.ACTIVE_RAG_NAME = user_rag_name
-            custom_instructions_path = CUSTOM_RAG_BASE_PATH / user_rag_name / f"{user_rag_name}_instructions.txt"
-            if custom_instructions_path.exists():
-                try:
-                    with open(custom_instructions_path, "r") as f:
-                        agent_root_agent.instruction = f.read()
-                    print(f"Loaded custom instructions for RAG: {user_rag_name} in SSE")
-                except Exception as e:
-                    print(f"Error loading custom instructions for {user_rag_name} in SSE, using default: {e}")
-                    agent_root_agent.instruction = DEFAULT_ROOT_AGENT_INSTRUCTION
-            else:
-                agent_root_agent.instruction = DEFAULT_ROOT_AGENT_INSTRUCTION
-                print(f"No custom instructions file found for RAG: {user_rag_name} in SSE. Using default agent instructions.")
-        else:
-            agent_module.ACTIVE_RAG_NAME = "default_rag"
-            default_instructions_path = CUSTOM_RAG_BASE_PATH / "default_rag" / "default_rag_instructions.txt"
-            if default_instructions_path.exists():
-                try:
-                    with open(default_instructions_path, "r") as f:
-                        agent_root_agent.instruction = f.read()
-                    print("Loaded custom instructions for default_rag in SSE.")
-                except Exception as e:
-                    print(f"Error loading custom instructions for default_rag in SSE, using default: {e}")
-                    agent_root_agent.instruction = DEFAULT_ROOT_AGENT_INSTRUCTION
-            else:
-                agent_root_agent.instruction = DEFAULT_ROOT_AGENT_INSTRUCTION
-                print("Using default agent instructions for default_rag in SSE.")
-        
+        async def produce():
+            try:
+                runner = runner_registry.get(AGENT, APP_NAME, SESSION_SERVICE, MEMORY_SERVICE)
+                content = types.Content(role='user', parts=[types.Part(text=prompt)])
+                async for event in runner.run_async(
+                    user_id=user_id, session_id=session_id, new_message=content, run_config=SSE_RUN_CONFIG
+                ):
+                    for message in projector.project(event):
+                        await queue.put(message)
+                remember_session(user_id, session_id)
+            except Exception as e:
+                print(f"Error in SSE run for session {session_id}: {e}")
+                await queue.put(sse_message("error", {"message": str(e)}))
+            finally:
+                await queue.put(None)
+
+        # The run happens in its own task (which inherits the request context) so heartbeats
+        # can be sent while the agent waits on the model or a tool
+        with rag_request_context(rag_name, load_rag_instructions(rag_name, " in SSE")):
+            producer = asyncio.create_task(produce())
         try:
-            runner = Runner(
-                agent=AGENT,
-                app_name=APP_NAME,
-                session_service=SESSION_SERVICE,
-                memory_service=MEMORY_SERVICE
-            )
-            content = types.Content(role='user', parts=[types.Part(text=prompt)])
-            async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
-                yield f"data: {event.model_dump_json() if hasattr(event, 'model_dump_json') else str(event)}\n\n"
+            yield STREAM_OPEN
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=DEFAULT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                if message is None:
+                    break
+                yield message
         finally:
-            agent_module.ACTIVE_RAG_NAME = original_active_rag_name
-            agent_root_agent.instruction = original_agent_instruction
+            if not producer.done():
+                producer.cancel()
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/cache_stats")
+async def cache_stats(current_user: str = Depends(get_current_user)):
+    return JSONResponse({
+        "faiss_index_cache": index_registry.stats(),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "http_client": http_client.stats(),
+        "web_result_cache": web_result_cache.stats(),
+        "sessions": SESSION_SERVICE.stats(),
+        "memory": MEMORY_SERVICE.stats(),
+        "history": history_manager.stats(),
+        "runners": runner_registry.stats(),
+    })
+
+@app.on_event("startup")
+async def create_runner():
+    # Build the app's runner before the first request instead of on it
+    runner_registry.get(AGENT, APP_NAME, SESSION_SERVICE, MEMORY_SERVICE)
+
+@app.on_event("startup")
+async def recover_ingestion_jobs():
+    # Uploads of jobs interrupted by a restart go back to staging so they can be processed again
+    if CUSTOM_RAG_BASE_PATH.is_dir():
+        ingestion_jobs.recover_orphaned_jobs(str(CUSTOM_RAG_BASE_PATH))
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
 
 # Mount static files - this should be after all API routes and before the __main__ block
 static_files_path = pathlib.Path(__file__).parent / "UI-UX"
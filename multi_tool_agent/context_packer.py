@@ -0,0 +1,132 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the retrieved context returned by rag_answer (per question for rag_answer_batch)
+DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+# Rough characters-per-token ratio of Gemini tokenizers on English text
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = " ..."
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class _Segment:
+    """A contiguous span of one source document, built from one or more chunks."""
+
+    __slots__ = ("label", "group", "start", "text", "rank")
+
+    def __init__(self, label: str, group: Optional[Tuple], start: Optional[int], text: str, rank: int):
+        self.label = label
+        self.group = group
+        self.start = start
+        self.text = text
+        self.rank = rank
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+    def try_merge(self, other: "_Segment") -> bool:
+        """Extends this segment with a later-starting one if they overlap or touch and agree on the shared text."""
+        if other.start > self.end:
+            return False
+        overlap = self.end - other.start
+        if overlap > len(other.text):
+            # other lies entirely inside this segment
+            contained = self.text[other.start - self.start:other.start - self.start + len(other.text)] == other.text
+            if contained:
+                self.rank = min(self.rank, other.rank)
+            return contained
+        if overlap and self.text[len(self.text) - overlap:] != other.text[:overlap]:
+            # Same start_index range but different text (e.g. another page of a pre-page-metadata PDF)
+            return False
+        self.text += other.text[overlap:]
+        self.rank = min(self.rank, other.rank)
+        return True
+
+
+def _label(doc: Document) -> str:
+    meta = doc.metadata or {}
+    label = meta.get("original_filename") or meta.get("source") or "unknown source"
+    if meta.get("page") is not None:
+        label += f" (page {int(meta['page']) + 1})"
+    return label
+
+
+def _format(label: str, text: str) -> str:
+    return f"From {label}: {text}"
+
+
+def pack_context(
+    documents: Sequence[Document], token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Packs retrieved chunks into one context string within token_budget.
+
+    Chunks of the same file version and page are ordered by their stored start_index;
+    overlapping or adjacent ones are merged so shared text is sent once. Segments are then
+    emitted in the order of their best-ranked chunk until the budget is used up, cutting the
+    last one short if needed. Returns the context and token counts (raw, packed, saved).
+    """
+    segments: List[_Segment] = []
+    grouped: Dict[Tuple, List[_Segment]] = {}
+    for rank, doc in enumerate(documents):
+        meta = doc.metadata or {}
+        text = doc.page_content or ""
+        start = meta.get("start_index")
+        if meta.get("original_filename") and isinstance(start, int) and start >= 0:
+            group = (meta["original_filename"], meta.get("version_timestamp"), meta.get("page"))
+            grouped.setdefault(group, []).append(_Segment(_label(doc), group, start, text, rank))
+        else:
+            segments.append(_Segment(_label(doc), None, None, text, rank))
+
+    for group_segments in grouped.values():
+        group_segments.sort(key=lambda segment: (segment.start, -len(segment.text)))
+        merged = [group_segments[0]]
+        for segment in group_segments[1:]:
+            if not any(existing.try_merge(segment) for existing in merged):
+                merged.append(segment)
+        segments.extend(merged)
+    segments.sort(key=lambda segment: segment.rank)
+
+    raw_context = "\n\n".join(_format(_label(doc), doc.page_content or "") for doc in documents)
+    parts: List[str] = []
+    used_tokens = 0
+    truncated = False
+    for segment in segments:
+        part = _format(segment.label, segment.text)
+        separator_tokens = 1 if parts else 0
+        remaining = token_budget - used_tokens - separator_tokens
+        if remaining <= 0:
+            truncated = True
+            break
+        if estimate_tokens(part) > remaining:
+            max_chars = remaining * CHARS_PER_TOKEN - len(TRUNCATION_MARKER)
+            if max_chars <= len(_format(segment.label, "")):
+                truncated = True
+                break
+            part = part[:max_chars].rstrip() + TRUNCATION_MARKER
+            truncated = True
+        parts.append(part)
+        used_tokens += separator_tokens + estimate_tokens(part)
+        if truncated:
+            break
+
+    context = "\n\n".join(parts)
+    raw_tokens = estimate_tokens(raw_context)
+    packed_tokens = estimate_tokens(context)
+    return context, {
+        "chunks": len(documents),
+        "segments": len(parts),
+        "raw_tokens": raw_tokens,
+        "packed_tokens": packed_tokens,
+        "tokens_saved": raw_tokens - packed_tokens,
+        "truncated": truncated,
+    }
@@ -0,0 +1,215 @@
+import os
+import re
+import time
+import array
+import sqlite3
+import threading
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Budgets for the shared query-embedding cache; override through the environment.
+# RAG_EMBEDDING_CACHE_DB enables on-disk persistence when set to a SQLite file path.
+DEFAULT_MAX_ENTRIES = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_MAX_BYTES = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_TTL_SECONDS = float(os.getenv("RAG_EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+DEFAULT_DB_PATH = os.getenv("RAG_EMBEDDING_CACHE_DB") or None
+# Expired rows are purged when the cache opens its file and then every this many writes
+PURGE_EVERY_WRITES = 1000
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Normalizes query text so trivially different spellings share a cache entry."""
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, TTL-based cache of query vectors keyed by (model, normalized text).
+
+    Vectors are held as float32 arrays in an in-memory LRU. When `db_path` is given,
+    entries are also written through to a SQLite file so they survive restarts; the
+    file is consulted on in-memory misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        db_path: Optional[str] = DEFAULT_DB_PATH,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[array.array, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (model, text))"
+            )
+            self._db.commit()
+            logger.info(f"Query embedding cache persisted to {db_path}")
+            self.purge_expired()
+        except sqlite3.Error as e:
+            logger.error(f"Could not open query embedding cache at {db_path}, using memory only: {e}")
+            self._db = None
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = (model, normalize_query(text))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, created = entry
+                if now - created <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector.tolist()
+                self._remove_locked(key)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector, created FROM query_embeddings WHERE model = ? AND text = ?", key
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    vector = array.array("f")
+                    vector.frombytes(row[0])
+                    self._insert_locked(key, vector, row[1])
+                    self.disk_hits += 1
+                    return vector.tolist()
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vector: List[float]) -> None:
+        key = (model, normalize_query(text))
+        packed = array.array("f", vector)
+        created = time.time()
+        with self._lock:
+            self._insert_locked(key, packed, created)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO query_embeddings (model, text, vector, created) VALUES (?, ?, ?, ?)",
+                        (key[0], key[1], packed.tobytes(), created),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to persist query embedding: {e}")
+                self._writes += 1
+                if self._writes % PURGE_EVERY_WRITES == 0:
+                    self._purge_expired_locked()
+
+    def _insert_locked(self, key: Tuple[str, str], vector: array.array, created: float) -> None:
+        self._remove_locked(key)
+        self._entries[key] = (vector, created)
+        self._total_bytes += vector.itemsize * len(vector)
+        while self._entries and (
+            (self.max_entries > 0 and len(self._entries) > self.max_entries)
+            or (self.max_bytes > 0 and self._total_bytes > self.max_bytes)
+        ):
+            oldest_key = next(iter(self._entries))
+            self._remove_locked(oldest_key)
+            self.evictions += 1
+
+    def _remove_locked(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0].itemsize * len(entry[0])
+
+    def purge_expired(self) -> None:
+        """Drops expired entries from memory and from the SQLite file."""
+        with self._lock:
+            self._purge_expired_locked()
+
+    def _purge_expired_locked(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for key in [k for k, (_, created) in self._entries.items() if created < cutoff]:
+            self._remove_locked(key)
+        if self._db is not None:
+            try:
+                self._db.execute("DELETE FROM query_embeddings WHERE created < ?", (cutoff,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to purge expired rows from {self.db_path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._db is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that serves embed_query from a QueryEmbeddingCache."""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: "QueryEmbeddingCache"):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(self.model_name, text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embeds several queries, sending every cache miss in one batched request."""
+        vectors: List[Optional[List[float]]] = [self.cache.get(self.model_name, text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            try:
+                # Google embeddings embed batches as documents unless told these are queries
+                embedded = self.embeddings.embed_documents(missing_texts, task_type="RETRIEVAL_QUERY")
+            except TypeError:
+                embedded = [self.embeddings.embed_query(text) for text in missing_texts]
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+                self.cache.put(self.model_name, texts[i], vector)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Document embeddings are produced at build time; they are not worth caching here.
+        return self.embeddings.embed_documents(texts)
+
+
+# Shared cache used by every RAG that embeds queries with the same model
+query_embedding_cache = QueryEmbeddingCache()
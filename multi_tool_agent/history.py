@@ -0,0 +1,238 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from .context_packer import CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# Turns (a user message and everything the agents did for it) always sent verbatim
+DEFAULT_HISTORY_MAX_TURNS = int(os.getenv("AGENT_HISTORY_MAX_TURNS", "6"))
+# Token budget for the history sent with each model call; older tool outputs and turns give way first
+DEFAULT_HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKEN_BUDGET", "8000"))
+# Characters of rolling summary kept (the most recent folded turns win)
+DEFAULT_SUMMARY_MAX_CHARS = int(os.getenv("AGENT_HISTORY_SUMMARY_MAX_CHARS", "2000"))
+DEFAULT_SUMMARY_CACHE_MAX_ENTRIES = 1024
+SUMMARY_LINE_CHARS = 200
+
+# ADK passes other agents' messages to the model as user content starting with this text
+FOREIGN_EVENT_PREFIX = "For context:"
+
+SummaryKey = Tuple[str, ...]
+Turn = List[types.Content]
+
+
+def _part_chars(part: types.Part) -> int:
+    if part.text:
+        return len(part.text)
+    if part.function_call:
+        return len(json.dumps(part.function_call.args or {}, default=str))
+    if part.function_response:
+        return len(json.dumps(part.function_response.response or {}, default=str))
+    return 0
+
+
+def content_tokens(content: types.Content) -> int:
+    chars = sum(_part_chars(part) for part in content.parts or [])
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _is_turn_start(content: types.Content) -> bool:
+    parts = content.parts or []
+    return (
+        content.role == "user"
+        and any(part.text for part in parts)
+        and not any(part.function_response for part in parts)
+        and not (parts[0].text or "").startswith(FOREIGN_EVENT_PREFIX)
+    )
+
+
+def split_turns(contents: List[types.Content]) -> List[Turn]:
+    """Groups contents into turns, each starting with a user message."""
+    turns: List[Turn] = []
+    for content in contents:
+        if not turns or _is_turn_start(content):
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def _shorten(text: str, limit: int = SUMMARY_LINE_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def summarize_turn(turn: Turn) -> str:
+    """One summary line per turn: the question, the tools used and the final answer."""
+    question = next((part.text for part in turn[0].parts or [] if part.text), "")
+    tools = [part.function_call.name for content in turn for part in content.parts or [] if part.function_call]
+    answer = ""
+    for content in reversed(turn):
+        if content.role == "model":
+            answer = " ".join(part.text for part in content.parts or [] if part.text)
+            if answer:
+                break
+    line = f"- User: {_shorten(question)}"
+    if tools:
+        line += f" | Tools: {', '.join(dict.fromkeys(tools))}"
+    if answer:
+        line += f" | Assistant: {_shorten(answer)}"
+    return line
+
+
+def compact_tool_outputs(content: types.Content) -> Tuple[types.Content, int]:
+    """Replaces tool responses with short references; the call/response pairing is kept."""
+    parts = []
+    compacted = 0
+    for part in content.parts or []:
+        if part.function_response and _part_chars(part) > SUMMARY_LINE_CHARS:
+            name = part.function_response.name
+            parts.append(types.Part(function_response=types.FunctionResponse(
+                id=part.function_response.id,
+                name=name,
+                response={"omitted": f"{name} output from an earlier turn ({_part_chars(part)} chars); call {name} again if its details are needed."},
+            )))
+            compacted += 1
+        else:
+            parts.append(part)
+    if not compacted:
+        return content, 0
+    return types.Content(role=content.role, parts=parts), compacted
+
+
+class HistoryManager:
+    """
+    Keeps the conversation history sent to the model bounded.
+
+    Runs as a before_model_callback. The last max_turns turns are sent verbatim; older turns
+    are folded into a rolling summary (one extractive line per turn, no extra model call),
+    cached per session so each turn is summarized once. If the result still exceeds
+    token_budget, tool outputs of earlier turns are replaced with short references, oldest
+    first, and then more turns are folded. The current turn is never changed.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = DEFAULT_HISTORY_MAX_TURNS,
+        token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET,
+        summary_max_chars: int = DEFAULT_SUMMARY_MAX_CHARS,
+        cache_max_entries: int = DEFAULT_SUMMARY_CACHE_MAX_ENTRIES,
+    ):
+        self.max_turns = max(1, max_turns)
+        self.token_budget = token_budget
+        self.summary_max_chars = summary_max_chars
+        self.cache_max_entries = cache_max_entries
+        self._summaries: "OrderedDict[SummaryKey, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.turns_folded = 0
+        self.tool_outputs_compacted = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.summary_hits = 0
+        self.summary_misses = 0
+
+    def _summary_lines(self, key: Optional[SummaryKey], folded: List[Turn]) -> List[str]:
+        """Summary lines of the folded turns, extending the cached lines when the prefix is known."""
+        with self._lock:
+            cached = self._summaries.get(key) if key else None
+            if cached is not None:
+                self._summaries.move_to_end(key)
+        if cached is not None and len(cached) <= len(folded):
+            self.summary_hits += 1
+            lines = cached + [summarize_turn(turn) for turn in folded[len(cached):]]
+        else:
+            self.summary_misses += 1
+            lines = [summarize_turn(turn) for turn in folded]
+        if key:
+            with self._lock:
+                self._summaries[key] = lines
+                self._summaries.move_to_end(key)
+                while len(self._summaries) > self.cache_max_entries:
+                    self._summaries.popitem(last=False)
+        return lines
+
+    def _summary_content(self, lines: List[str]) -> types.Content:
+        summary = "\n".join(lines)
+        if len(summary) > self.summary_max_chars:
+            summary = "(older turns omitted)\n" + summary[-self.summary_max_chars:].split("\n", 1)[-1]
+        return types.Content(role="user", parts=[types.Part(
+            text=f"Summary of the earlier conversation (older messages are not shown):\n{summary}"
+        )])
+
+    def bound_history(self, contents: List[types.Content], key: Optional[SummaryKey] = None) -> Tuple[List[types.Content], Dict[str, Any]]:
+        turns = split_turns(contents)
+        before = sum(content_tokens(content) for content in contents)
+        fold = max(0, len(turns) - self.max_turns)
+        kept = [list(turn) for turn in turns[fold:]]
+        compacted = 0
+
+        def total(summary: Optional[types.Content]) -> int:
+            tokens = sum(content_tokens(content) for turn in kept for content in turn)
+            return tokens + (content_tokens(summary) if summary else 0)
+
+        summary = self._summary_content(self._summary_lines(key, turns[:fold])) if fold else None
+        # Over budget: first shrink tool outputs of earlier turns, oldest first
+        for turn in kept[:-1]:
+            if total(summary) <= self.token_budget:
+                break
+            for i, content in enumerate(turn):
+                turn[i], n = compact_tool_outputs(content)
+                compacted += n
+        # Still over budget: fold more turns into the summary
+        while len(kept) > 1 and total(summary) > self.token_budget:
+            kept.pop(0)
+            fold += 1
+            summary = self._summary_content(self._summary_lines(key, turns[:fold]))
+
+        bounded = ([summary] if summary else []) + [content for turn in kept for content in turn]
+        after = sum(content_tokens(content) for content in bounded)
+        self.requests += 1
+        self.turns_folded += fold
+        self.tool_outputs_compacted += compacted
+        self.tokens_before += before
+        self.tokens_after += after
+        return bounded, {"turns": len(turns), "folded": fold, "compacted": compacted, "tokens_before": before, "tokens_after": after}
+
+    def before_model_callback(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        session = getattr(getattr(callback_context, "_invocation_context", None), "session", None)
+        # Each agent sees the session through its own lens, so summaries are cached per agent
+        key = (session.app_name, session.user_id, session.id, callback_context.agent_name) if session is not None else None
+        try:
+            llm_request.contents, info = self.bound_history(list(llm_request.contents or []), key)
+        except Exception as e:  # never fail a model call over history trimming
+            logger.error(f"History bounding failed, sending the full history: {e}", exc_info=True)
+            return None
+        if info["folded"] or info["compacted"]:
+            logger.info(
+                f"History for {callback_context.agent_name}: {info['turns']} turns, {info['folded']} folded, "
+                f"{info['compacted']} tool outputs compacted, ~{info['tokens_before']} -> ~{info['tokens_after']} tokens"
+            )
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = len(self._summaries)
+        return {
+            "max_turns": self.max_turns,
+            "token_budget": self.token_budget,
+            "requests": self.requests,
+            "turns_folded": self.turns_folded,
+            "tool_outputs_compacted": self.tool_outputs_compacted,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "cached_summaries": cached,
+            "summary_hits": self.summary_hits,
+            "summary_misses": self.summary_misses,
+        }
+
+
+# Shared by every agent of the app
+history_manager = HistoryManager()
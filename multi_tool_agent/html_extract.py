@@ -0,0 +1,196 @@
+import os
+import re
+import time
+import codecs
+import asyncio
+import logging
+import importlib.util
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Limits for link_fetcher, overridable through the environment
+DEFAULT_MAX_BYTES = int(os.getenv("LINK_FETCHER_MAX_BYTES", str(2 * 1024 * 1024)))
+DEFAULT_MAX_CHARS = int(os.getenv("LINK_FETCHER_MAX_CHARS", "20000"))
+# "auto" uses lxml when it is installed, else the standard library parser
+DEFAULT_PARSER = os.getenv("LINK_FETCHER_PARSER", "auto")
+
+LXML_AVAILABLE = importlib.util.find_spec("lxml") is not None
+PARSERS = ("auto", "lxml", "html.parser")
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+TEXT_CONTENT_TYPES = ("text/plain",)
+# Elements whose content is never useful page text
+BOILERPLATE_TAGS = frozenset(
+    ("script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe")
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class UnsupportedContentError(Exception):
+    """Raised when a response is not HTML or plain text."""
+
+
+class _TextCollector:
+    """Parser target that keeps the text outside boilerplate elements, up to max_chars."""
+
+    def __init__(self, max_chars: int, raw: bool = False):
+        self.max_chars = max_chars
+        self.raw = raw  # plain text: keep chunks as they are and normalize whitespace at the end
+        self.parts: List[str] = []
+        # Text between two tags can arrive in several pieces when a chunk boundary splits it
+        self.pending: List[str] = []
+        self.chars = 0
+        self.skip_depth = 0
+        self.done = False
+
+    def start(self, tag: str, attrib: Any = None) -> None:
+        self._flush()
+        if str(tag).lower() in BOILERPLATE_TAGS:
+            self.skip_depth += 1
+
+    def end(self, tag: str) -> None:
+        self._flush()
+        if str(tag).lower() in BOILERPLATE_TAGS and self.skip_depth > 0:
+            self.skip_depth -= 1
+
+    def data(self, data: str) -> None:
+        if self.raw:
+            self._add(data)
+        elif not self.skip_depth and not self.done:
+            self.pending.append(data)
+
+    def _flush(self) -> None:
+        if self.pending:
+            text = "".join(self.pending)
+            self.pending = []
+            if not self.skip_depth:
+                self._add(_WHITESPACE_RE.sub(" ", text).strip())
+
+    def _add(self, text: str) -> None:
+        if self.done or not text:
+            return
+        remaining = self.max_chars - self.chars
+        if len(text) >= remaining:
+            text = text[:remaining]
+            self.done = True
+        self.parts.append(text)
+        self.chars += len(text) + (0 if self.raw else 1)
+
+    def close(self) -> str:
+        self._flush()
+        if self.raw:
+            return _WHITESPACE_RE.sub(" ", "".join(self.parts)).strip()
+        return " ".join(self.parts)
+
+
+class _StdlibParser(HTMLParser):
+    """html.parser front end for _TextCollector."""
+
+    def __init__(self, collector: _TextCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+def _make_parser(name: str, collector: _TextCollector) -> Tuple[str, Any]:
+    if name == "auto":
+        name = "lxml" if LXML_AVAILABLE else "html.parser"
+    if name == "lxml":
+        if not LXML_AVAILABLE:
+            logger.warning("lxml is not installed; falling back to html.parser for link_fetcher.")
+        else:
+            from lxml import etree
+            return name, etree.HTMLParser(target=collector, recover=True)
+    return "html.parser", _StdlibParser(collector)
+
+
+def _content_kind(content_type: str) -> str:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if not media_type or media_type in HTML_CONTENT_TYPES:
+        return "html"
+    if media_type in TEXT_CONTENT_TYPES:
+        return "text"
+    raise UnsupportedContentError(f"Unsupported content type '{media_type}'; only HTML and plain text pages can be read.")
+
+
+def _parse_chunk(decoder: Any, html_parser: Any, collector: _TextCollector, chunk: bytes, final: bool = False) -> None:
+    text = decoder.decode(chunk, final=final)
+    if html_parser is not None:
+        html_parser.feed(text)
+        if final:
+            try:
+                html_parser.close()
+            except Exception as e:  # lxml may raise on a truncated document; the collected text is still valid
+                logger.debug(f"Parser close failed after truncated read: {e}")
+    elif text:
+        collector.data(text)
+
+
+async def extract_text(
+    response: httpx.Response,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_chars: int = DEFAULT_MAX_CHARS,
+    parser: str = DEFAULT_PARSER,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Reads a streamed response and extracts its text incrementally.
+
+    Chunks are decoded and fed to the parser as they arrive, one at a time on a worker
+    thread so parsing a large page never stalls the event loop; boilerplate elements
+    (scripts, styles, navigation, headers, footers, forms) are dropped during parsing. Reading stops
+    after max_bytes of body or once max_chars of text have been collected, so huge pages
+    cost neither memory nor context. Returns the text and extraction details, including
+    time spent waiting on the network versus parsing.
+    """
+    kind = _content_kind(response.headers.get("Content-Type", ""))
+    collector = _TextCollector(max_chars, raw=(kind == "text"))
+    parser_name, html_parser = _make_parser(parser, collector) if kind == "html" else ("text", None)
+    decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+
+    received = 0
+    parse_seconds = 0.0
+    truncated = False
+    start = time.perf_counter()
+    async for chunk in response.aiter_bytes():
+        if received + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - received]
+            truncated = True
+        received += len(chunk)
+
+        parse_start = time.perf_counter()
+        await asyncio.to_thread(_parse_chunk, decoder, html_parser, collector, chunk)
+        parse_seconds += time.perf_counter() - parse_start
+
+        if truncated or collector.done:
+            truncated = True
+            break
+
+    parse_start = time.perf_counter()
+    await asyncio.to_thread(_parse_chunk, decoder, html_parser, collector, b"", True)
+    content = collector.close()
+    parse_seconds += time.perf_counter() - parse_start
+    total_seconds = time.perf_counter() - start
+
+    return content, {
+        "parser": parser_name,
+        "bytes_read": received,
+        "chars": len(content),
+        "truncated": truncated,
+        "timings_ms": {
+            "download": round(1000 * (total_seconds - parse_seconds), 1),
+            "parse": round(1000 * parse_seconds, 1),
+        },
+    }
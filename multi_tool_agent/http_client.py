@@ -0,0 +1,140 @@
+import os
+import asyncio
+import logging
+import threading
+import importlib.util
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Pool limits for the shared client, overridable through the environment
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "100"))
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", "20"))
+DEFAULT_PER_HOST_LIMIT = int(os.getenv("HTTP_CLIENT_PER_HOST_LIMIT", "6"))
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CLIENT_TIMEOUT_SECONDS", "10"))
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; multi-tool-agent/1.0)"
+
+# HTTP/2 needs the optional `h2` package (httpx[http2]); without it the client speaks HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class _HostSlots:
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0  # requests holding or waiting for a slot
+
+
+class _LoopState:
+    __slots__ = ("client", "hosts")
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        # Only hosts with requests in flight; link_fetcher may visit any number of hosts
+        self.hosts: Dict[str, _HostSlots] = {}
+
+
+class AsyncHttpClient:
+    """
+    Shared async HTTP client for the agent's web tools.
+
+    Connections are pooled and kept alive across tool calls (HTTP/2 when available), and
+    at most per_host_limit requests run against one host at a time. httpx clients are bound
+    to an event loop, so one client is kept per running loop. A custom `transport` (e.g.
+    httpx.MockTransport, or a local stub server via base URLs) can be passed for offline tests.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        http2: bool = HTTP2_AVAILABLE,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive_connections
+        )
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.http2 = http2
+        self.transport = transport
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._states.get(loop)
+            if state is None or state.client.is_closed:
+                state = _LoopState(httpx.AsyncClient(
+                    http2=self.http2,
+                    limits=self.limits,
+                    timeout=self.timeout,
+                    transport=self.transport,
+                    follow_redirects=True,
+                    headers={"User-Agent": DEFAULT_USER_AGENT},
+                ))
+                self._states[loop] = state
+            return state
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Streams a response; the per-host slot is held until the body has been consumed."""
+        state = self._state()
+        host = urlsplit(url).netloc
+        slots = state.hosts.get(host)
+        if slots is None:
+            slots = state.hosts[host] = _HostSlots(self.per_host_limit)
+        slots.users += 1
+        try:
+            async with slots.semaphore:
+                self.requests += 1
+                async with state.client.stream(method, url, **kwargs) as response:
+                    yield response
+        finally:
+            # The loop's state is only touched from its own thread, so this cannot race
+            slots.users -= 1
+            if not slots.users:
+                del state.hosts[host]
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Sends a request and reads the whole response body."""
+        async with self.stream(method, url, **kwargs) as response:
+            await response.aread()
+            return response
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self) -> None:
+        """Closes the client of the running loop (clients of other loops close with their loop)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._states.pop(loop, None)
+        if state is not None:
+            await state.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "http2": self.http2,
+                "clients": len(self._states),
+                "active_hosts": sum(len(state.hosts) for state in self._states.values()),
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "per_host_limit": self.per_host_limit,
+                "requests": self.requests,
+            }
+
+
+# Shared client used by web_search and link_fetcher
+http_client = AsyncHttpClient()
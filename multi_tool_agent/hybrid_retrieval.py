@@ -0,0 +1,136 @@
+import os
+import re
+import logging
+from typing import Any, Dict, List, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+from rag_lexical import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Reciprocal rank fusion constant (score = sum of 1 / (RRF_K + rank) over retrievers)
+RRF_K = 60
+# Candidates each retriever contributes to the fusion
+CANDIDATES_PER_RETRIEVER = 10
+# Queries of at most this many terms whose best lexical hit contains all of them, and which
+# name an identifier (a code-like term found in at most LEXICAL_SHORTCUT_MAX_DF chunks),
+# are answered from the lexical index alone, without embedding the query. 0 disables this.
+LEXICAL_SHORTCUT_MAX_TERMS = int(os.getenv("RAG_LEXICAL_SHORTCUT_MAX_TERMS", "4"))
+LEXICAL_SHORTCUT_MAX_DF = int(os.getenv("RAG_LEXICAL_SHORTCUT_MAX_DF", "3"))
+# Terms with a digit or a joining character look like codes, IDs or versions ("e1234", "v2.1", "sku-88")
+_CODE_TERM_RE = re.compile(r"\d|[-./_]")
+
+
+def vector_rankings(vector_db: FAISS, questions: Sequence[str], k: int) -> List[List[int]]:
+    """
+    FAISS positions of the k nearest chunks to each question. All questions are embedded in
+    one call (when the embeddings support embed_queries) and searched as one matrix query.
+    """
+    if not questions:
+        return []
+    embedding_function = vector_db.embedding_function
+    if hasattr(embedding_function, "embed_queries"):
+        vectors = embedding_function.embed_queries(list(questions))
+    else:
+        vectors = [embedding_function.embed_query(question) for question in questions]
+    embeddings = np.array(vectors, dtype=np.float32)
+    if getattr(vector_db, "_normalize_L2", False):
+        faiss.normalize_L2(embeddings)
+    _, indices = vector_db.index.search(embeddings, k)
+    return [[int(i) for i in row if i >= 0] for row in indices]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], rrf_k: int = RRF_K) -> List[int]:
+    """Merges ranked row lists into one ranking by reciprocal rank fusion."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=lambda row: -scores[row])
+
+
+def documents_for_rows(vector_db: FAISS, rows: Sequence[int]) -> List[Document]:
+    """Docstore documents of FAISS positions, skipping any that cannot be resolved."""
+    documents = []
+    for row in rows:
+        doc_id = vector_db.index_to_docstore_id.get(row)
+        doc = vector_db.docstore.search(doc_id) if doc_id is not None else None
+        if isinstance(doc, Document):
+            documents.append(doc)
+    return documents
+
+
+def _is_lexical_match(question: str, lexical_hits: List[Tuple[int, float, float]], lexical_index: Any) -> bool:
+    """
+    True for short identifier lookups that BM25 answers exactly. Natural-language questions,
+    even short and fully matched ones, always go through vector search as well.
+    """
+    terms = set(tokenize(question))
+    if not lexical_hits or not 0 < len(terms) <= LEXICAL_SHORTCUT_MAX_TERMS or lexical_hits[0][2] < 1.0:
+        return False
+    return any(
+        _CODE_TERM_RE.search(term) and lexical_index.document_frequency(term) <= LEXICAL_SHORTCUT_MAX_DF
+        for term in terms
+    )
+
+
+def hybrid_search_many(vector_db: FAISS, questions: Sequence[str], k: int = 3) -> Tuple[List[Document], Dict[str, Any]]:
+    """
+    Retrieves the best chunks for several questions at once by fusing BM25 and vector rankings.
+
+    The lexical side runs in-process against the snapshot's BM25 index (attached to the
+    store as `lexical_index` when it was loaded). A short identifier lookup (a rare code-like
+    term, fully matched by its best lexical hit) is answered from the lexical ranking without
+    an embedding; natural-language questions always fuse with vector search. The remaining
+    questions are embedded in one call and searched as one matrix query. Each question's
+    ranking is fused by reciprocal rank fusion, then the per-question rankings are fused
+    again, so chunks found by several questions are returned once and rank higher.
+    Stores without a lexical index fall back to vector search only.
+    Returns up to k documents per question and a dict describing how they were retrieved.
+    """
+    lexical_index = getattr(vector_db, "lexical_index", None)
+    lexical_rankings: List[List[int]] = []
+    needs_vector: List[int] = []
+    for i, question in enumerate(questions):
+        hits = lexical_index.search(question, CANDIDATES_PER_RETRIEVER) if lexical_index is not None else []
+        lexical_rankings.append([row for row, _, _ in hits])
+        if _is_lexical_match(question, hits, lexical_index):
+            logger.info(f"Lexical index matched identifier query '{question}'; skipping vector search.")
+        else:
+            needs_vector.append(i)
+
+    vector_by_question = dict(zip(needs_vector, vector_rankings(vector_db, [questions[i] for i in needs_vector], CANDIDATES_PER_RETRIEVER)))
+    question_rankings = []
+    for i, lexical_ranking in enumerate(lexical_rankings):
+        vector_ranking = vector_by_question.get(i)
+        if vector_ranking is None:
+            question_rankings.append(lexical_ranking)
+        elif not lexical_ranking:
+            question_rankings.append(vector_ranking)
+        else:
+            question_rankings.append(reciprocal_rank_fusion([vector_ranking, lexical_ranking]))
+
+    if len(question_rankings) == 1:
+        merged = question_rankings[0]
+    else:
+        merged = reciprocal_rank_fusion([ranking[:k] for ranking in question_rankings])
+    if not needs_vector:
+        retrieval = "lexical"
+    elif lexical_index is None or not any(lexical_rankings):
+        retrieval = "vector"
+    else:
+        retrieval = "hybrid"
+    return documents_for_rows(vector_db, merged[:k * len(questions)]), {
+        "retrieval": retrieval,
+        "queries": len(questions),
+        "embedded_queries": len(needs_vector),
+    }
+
+
+def hybrid_search(vector_db: FAISS, question: str, k: int = 3) -> Tuple[List[Document], Dict[str, Any]]:
+    """Retrieves the k best chunks for one question (see hybrid_search_many)."""
+    return hybrid_search_many(vector_db, [question], k)
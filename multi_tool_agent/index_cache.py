@@ -0,0 +1,163 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default budgets for the process-wide registry. Either limit can be overridden
+# through the environment; a max_bytes of 0 disables the byte budget.
+DEFAULT_MAX_ENTRIES = int(os.getenv("RAG_INDEX_CACHE_MAX_ENTRIES", "8"))
+DEFAULT_MAX_BYTES = int(os.getenv("RAG_INDEX_CACHE_MAX_BYTES", "0"))
+
+# (mtime_ns, size) for each file backing an index
+FileSignature = Tuple[Tuple[int, int], ...]
+
+
+def file_signature(*paths: str) -> Optional[FileSignature]:
+    """Returns the (mtime_ns, size) of every path, or None if any of them is missing."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature.append((st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+class _CacheEntry:
+    __slots__ = ("value", "paths", "signature", "nbytes")
+
+    def __init__(self, value: Any, paths: Tuple[str, ...], signature: FileSignature, nbytes: int):
+        self.value = value
+        self.paths = paths
+        self.signature = signature
+        self.nbytes = nbytes
+
+    def matches(self, paths: Tuple[str, ...], signature: FileSignature) -> bool:
+        return self.paths == paths and self.signature == signature
+
+
+class IndexRegistry:
+    """
+    Process-wide LRU cache of loaded vector indexes keyed by RAG name.
+
+    An entry is only reloaded when its backing files move (a new snapshot was published)
+    or their (mtime, size) signature changes. If a reload fails, the previously loaded
+    value keeps being served. Entries are evicted in LRU order once either the
+    entry-count or the byte budget is exceeded. The byte cost of an entry is
+    approximated by the on-disk size of its files.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def get(self, key: str, paths: Tuple[str, ...], loader: Callable[[], Any]) -> Optional[Any]:
+        """
+        Returns the cached value for `key`, loading it with `loader()` on a miss or when
+        the files in `paths` changed on disk. Returns None (and drops any stale entry)
+        if one of the files is missing or the loader returns None.
+        """
+        signature = file_signature(*paths)
+        if signature is None:
+            self.invalidate(key)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.matches(paths, signature):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given key; others wait and then re-check the cache.
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.matches(paths, signature):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                self.misses += 1
+                if entry is not None:
+                    self.reloads += 1
+
+            try:
+                value = loader()
+            except Exception as e:
+                if entry is None:
+                    raise
+                # Keep serving the previously loaded index rather than failing the request
+                logger.warning(f"Reloading index '{key}' failed, serving the previously loaded version: {e}")
+                return entry.value
+            if value is None:
+                self.invalidate(key)
+                return None
+
+            nbytes = sum(size for _, size in signature)
+            with self._lock:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._total_bytes -= old.nbytes
+                self._entries[key] = _CacheEntry(value, paths, signature, nbytes)
+                self._total_bytes += nbytes
+                self._evict_locked(keep=key)
+            return value
+
+    def _evict_locked(self, keep: str) -> None:
+        while self._entries:
+            over_count = self.max_entries > 0 and len(self._entries) > self.max_entries
+            over_bytes = self.max_bytes > 0 and self._total_bytes > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+            oldest_key = next(iter(self._entries))
+            if oldest_key == keep:
+                # Never evict the entry we just loaded, even if it alone exceeds the budget.
+                break
+            evicted = self._entries.pop(oldest_key)
+            self._total_bytes -= evicted.nbytes
+            self.evictions += 1
+            logger.info(f"Evicted index '{oldest_key}' from cache ({evicted.nbytes} bytes)")
+
+    def invalidate(self, key: str) -> None:
+        """Drops a single entry, if present."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "keys": list(self._entries.keys()),
+            }
+
+
+# Shared registry used by get_vector_db
+index_registry = IndexRegistry()
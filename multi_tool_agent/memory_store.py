@@ -0,0 +1,316 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from google.adk.memory import BaseMemoryService
+from google.adk.memory.base_memory_service import SearchMemoryResponse
+from google.adk.memory.memory_entry import MemoryEntry
+from google.adk.sessions import Session
+from google.genai import types
+
+from rag_lexical import BM25_B, BM25_K1, tokenize
+from .hybrid_retrieval import reciprocal_rank_fusion
+from .sqlite_db import SqliteDatabase
+
+logger = logging.getLogger(__name__)
+
+# Memories returned per search, and limits that keep the per-user index (and search latency) bounded
+DEFAULT_MEMORY_TOP_K = int(os.getenv("MEMORY_SEARCH_TOP_K", "10"))
+DEFAULT_MAX_EVENTS_PER_USER = int(os.getenv("MEMORY_MAX_EVENTS_PER_USER", "5000"))
+DEFAULT_MAX_AGE_DAYS = float(os.getenv("MEMORY_MAX_AGE_DAYS", "90"))  # 0 disables age-based archiving
+# Query terms beyond this many are ignored
+MAX_QUERY_TERMS = 16
+
+MEMORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agent_memories (
+    id INTEGER PRIMARY KEY,
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL, event_id TEXT NOT NULL,
+    author TEXT, timestamp REAL NOT NULL, content TEXT NOT NULL, length INTEGER NOT NULL,
+    embedding BLOB, archived INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (app_name, user_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS agent_memories_by_session ON agent_memories (app_name, user_id, session_id);
+CREATE TABLE IF NOT EXISTS agent_memory_postings (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, term TEXT NOT NULL, memory_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL, length INTEGER NOT NULL,
+    PRIMARY KEY (app_name, user_id, term, memory_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agent_memory_users (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL,
+    events INTEGER NOT NULL, total_length INTEGER NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+def event_text(content: types.Content) -> str:
+    return " ".join(part.text for part in (content.parts or []) if part.text)
+
+
+class SqliteMemoryService(BaseMemoryService):
+    """
+    ADK memory service with a per-user inverted index in the shared SQLite file.
+
+    Text events are tokenized when a session is added (only events not stored yet), and
+    their postings are written in the same transaction, so search_memory reads the postings
+    of the query terms and ranks them with BM25 instead of scanning every stored event.
+    With an embeddings client, events are also embedded on add and the vector ranking is
+    fused with the keyword ranking. Each user's index is bounded: sessions older than
+    max_age_days, and the oldest sessions beyond max_events_per_user, are archived (kept,
+    but removed from the index). stats() reads running totals, loaded once at startup and
+    adjusted by each committed index or archive transaction of this process.
+    """
+
+    def __init__(
+        self,
+        db: SqliteDatabase,
+        embeddings: Optional[Embeddings] = None,
+        top_k: int = DEFAULT_MEMORY_TOP_K,
+        max_events_per_user: int = DEFAULT_MAX_EVENTS_PER_USER,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    ):
+        self.db = db
+        self.embeddings = embeddings
+        self.top_k = top_k
+        self.max_events_per_user = max_events_per_user
+        self.max_age_days = max_age_days
+        self.searches = 0
+        self.archived_sessions = 0
+        self._totals_lock = threading.Lock()
+        self._totals = self._load_totals()
+
+    def _load_totals(self) -> Dict[str, int]:
+        conn = self.db.reader()
+        (indexed, archived, embedded, embedding_bytes) = conn.execute(
+            "SELECT SUM(archived = 0), SUM(archived), COUNT(embedding), COALESCE(SUM(LENGTH(embedding)), 0)"
+            " FROM agent_memories"
+        ).fetchone()
+        (postings,) = conn.execute("SELECT COUNT(*) FROM agent_memory_postings").fetchone()
+        return {
+            "indexed_events": indexed or 0,
+            "archived_events": archived or 0,
+            "postings": postings,
+            "embedded_events": embedded,
+            "embedding_bytes": embedding_bytes,
+        }
+
+    # --- indexing ---
+    def _new_events(self, session: Session) -> List[Tuple[Any, str, Counter]]:
+        stored = {
+            event_id for (event_id,) in self.db.reader().execute(
+                "SELECT event_id FROM agent_memories WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (session.app_name, session.user_id, session.id),
+            )
+        }
+        new_events = []
+        for event in session.events:
+            if event.id in stored or not event.content or not event.content.parts:
+                continue
+            text = event_text(event.content)
+            if text:
+                new_events.append((event, text, Counter(tokenize(text))))
+        return new_events
+
+    def _archive_locked(
+        self, conn: sqlite3.Connection, app_name: str, user_id: str, session_ids: Sequence[str], totals: Counter
+    ) -> None:
+        for session_id in session_ids:
+            rows = conn.execute(
+                "SELECT id, length, LENGTH(embedding) FROM agent_memories"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ? AND archived = 0",
+                (app_name, user_id, session_id),
+            ).fetchall()
+            if not rows:
+                continue
+            cursor = conn.executemany(
+                "DELETE FROM agent_memory_postings WHERE app_name = ? AND user_id = ? AND memory_id = ?",
+                [(app_name, user_id, memory_id) for memory_id, _, _ in rows],
+            )
+            conn.execute(
+                "UPDATE agent_memories SET archived = 1, embedding = NULL"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id),
+            )
+            conn.execute(
+                "UPDATE agent_memory_users SET events = events - ?, total_length = total_length - ?"
+                " WHERE app_name = ? AND user_id = ?",
+                (len(rows), sum(length for _, length, _ in rows), app_name, user_id),
+            )
+            embedded = [size for _, _, size in rows if size is not None]
+            totals["indexed_events"] -= len(rows)
+            totals["archived_events"] += len(rows)
+            totals["postings"] -= cursor.rowcount
+            totals["embedded_events"] -= len(embedded)
+            totals["embedding_bytes"] -= sum(embedded)
+            totals["archived_sessions"] += 1
+
+    def _enforce_limits_locked(self, conn: sqlite3.Connection, app_name: str, user_id: str, totals: Counter) -> None:
+        sessions = conn.execute(
+            "SELECT session_id, COUNT(*), MAX(timestamp) FROM agent_memories"
+            " WHERE app_name = ? AND user_id = ? AND archived = 0 GROUP BY session_id ORDER BY MAX(timestamp) DESC",
+            (app_name, user_id),
+        ).fetchall()
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days > 0 else None
+        kept = 0
+        to_archive = []
+        for session_id, count, last_timestamp in sessions:
+            if (cutoff is not None and last_timestamp < cutoff) or (kept and kept + count > self.max_events_per_user):
+                to_archive.append(session_id)
+            else:
+                kept += count
+        if to_archive:
+            self._archive_locked(conn, app_name, user_id, to_archive, totals)
+
+    async def add_session_to_memory(self, session: Session) -> None:
+        new_events = await asyncio.to_thread(self._new_events, session)
+        if not new_events:
+            return
+        vectors: List[Optional[bytes]] = [None] * len(new_events)
+        if self.embeddings is not None:
+            try:
+                embedded = await asyncio.to_thread(self.embeddings.embed_documents, [text for _, text, _ in new_events])
+                vectors = [np.asarray(vector, dtype=np.float32).tobytes() for vector in embedded]
+            except Exception as e:
+                logger.warning(f"Embedding memories for session {session.id} failed, indexing keywords only: {e}")
+        app_name, user_id = session.app_name, session.user_id
+
+        # Changes to the stats totals, applied once the transaction has committed
+        totals: Counter = Counter()
+
+        def _index(conn: sqlite3.Connection) -> int:
+            totals.clear()
+            added = 0
+            added_length = 0
+            for (event, _, term_counts), vector in zip(new_events, vectors):
+                length = sum(term_counts.values())
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO agent_memories"
+                    " (app_name, user_id, session_id, event_id, author, timestamp, content, length, embedding)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (app_name, user_id, session.id, event.id, event.author, event.timestamp,
+                     event.content.model_dump_json(exclude_none=True), length, vector),
+                )
+                if not cursor.rowcount:
+                    continue  # stored concurrently by another request
+                conn.executemany(
+                    "INSERT INTO agent_memory_postings (app_name, user_id, term, memory_id, tf, length)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(app_name, user_id, term, cursor.lastrowid, tf, length) for term, tf in term_counts.items()],
+                )
+                added += 1
+                added_length += length
+                totals["postings"] += len(term_counts)
+                if vector is not None:
+                    totals["embedded_events"] += 1
+                    totals["embedding_bytes"] += len(vector)
+            if added:
+                conn.execute(
+                    "INSERT INTO agent_memory_users (app_name, user_id, events, total_length) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (app_name, user_id) DO UPDATE SET"
+                    " events = events + excluded.events, total_length = total_length + excluded.total_length",
+                    (app_name, user_id, added, added_length),
+                )
+                totals["indexed_events"] += added
+                self._enforce_limits_locked(conn, app_name, user_id, totals)
+            return added
+
+        added = await asyncio.wrap_future(self.db.submit(_index))
+        with self._totals_lock:
+            self.archived_sessions += totals.pop("archived_sessions", 0)
+            for key, change in totals.items():
+                self._totals[key] += change
+        logger.debug(f"Indexed {added} memories from session {session.id} for user {user_id}")
+
+    # --- search ---
+    def _keyword_ranking(self, conn: sqlite3.Connection, app_name: str, user_id: str, query: str) -> List[int]:
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        row = conn.execute(
+            "SELECT events, total_length FROM agent_memory_users WHERE app_name = ? AND user_id = ?",
+            (app_name, user_id),
+        ).fetchone()
+        if not terms or not row or not row[0]:
+            return []
+        events, total_length = row
+        avg_length = max(total_length / events, 1.0)
+
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = conn.execute(
+                "SELECT memory_id, tf, length FROM agent_memory_postings WHERE app_name = ? AND user_id = ? AND term = ?",
+                (app_name, user_id, term),
+            ).fetchall()
+            if not postings:
+                continue
+            idf = float(np.log1p((events - len(postings) + 0.5) / (len(postings) + 0.5)))
+            for memory_id, tf, length in postings:
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * length / avg_length)
+                scores[memory_id] = scores.get(memory_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return heapq.nlargest(self.top_k, scores, key=scores.get)
+
+    def _vector_ranking(self, conn: sqlite3.Connection, app_name: str, user_id: str, query: str) -> List[int]:
+        rows = conn.execute(
+            "SELECT id, embedding FROM agent_memories"
+            " WHERE app_name = ? AND user_id = ? AND archived = 0 AND embedding IS NOT NULL",
+            (app_name, user_id),
+        ).fetchall()
+        if not rows:
+            return []
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+        similarities = matrix @ query_vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector) + 1e-9)
+        top = np.argsort(-similarities)[:self.top_k]
+        return [rows[i][0] for i in top]
+
+    def _search(self, app_name: str, user_id: str, query: str) -> List[MemoryEntry]:
+        conn = self.db.reader()
+        rankings = [self._keyword_ranking(conn, app_name, user_id, query)]
+        if self.embeddings is not None:
+            try:
+                rankings.append(self._vector_ranking(conn, app_name, user_id, query))
+            except Exception as e:
+                logger.warning(f"Vector memory search failed, using keyword results only: {e}")
+        memory_ids = reciprocal_rank_fusion(rankings)[:self.top_k] if len(rankings) > 1 else rankings[0]
+        if not memory_ids:
+            return []
+
+        placeholders = ",".join("?" * len(memory_ids))
+        rows = {
+            memory_id: (author, timestamp, content)
+            for memory_id, author, timestamp, content in conn.execute(
+                f"SELECT id, author, timestamp, content FROM agent_memories WHERE id IN ({placeholders})",
+                memory_ids,
+            )
+        }
+        return [
+            MemoryEntry(
+                content=types.Content.model_validate_json(rows[memory_id][2]),
+                author=rows[memory_id][0],
+                timestamp=str(rows[memory_id][1]),
+            )
+            for memory_id in memory_ids if memory_id in rows
+        ]
+
+    async def search_memory(self, *, app_name: str, user_id: str, query: str) -> SearchMemoryResponse:
+        self.searches += 1
+        memories = await asyncio.to_thread(self._search, app_name, user_id, query)
+        return SearchMemoryResponse(memories=memories)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._totals_lock:
+            totals = dict(self._totals)
+        return {
+            **totals,
+            "top_k": self.top_k,
+            "max_events_per_user": self.max_events_per_user,
+            "max_age_days": self.max_age_days,
+            "searches": self.searches,
+            "archived_sessions": self.archived_sessions,
+        }
@@ -0,0 +1,103 @@
+import re
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from rag_lexical import BM25_B, BM25_K1, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Passages are built from whole sentences up to about this many characters
+PASSAGE_TARGET_CHARS = 400
+# Characters of passage text returned by summarizer
+DEFAULT_SUMMARY_CHARS = 1500
+PASSAGE_SEPARATOR = " ... "
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+def split_passages(content: str, target_chars: int = PASSAGE_TARGET_CHARS) -> List[str]:
+    """Splits text into passages of whole sentences of roughly target_chars each."""
+    passages: List[str] = []
+    current: List[str] = []
+    length = 0
+    for sentence in _SENTENCE_END_RE.split(content):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        if current and length + len(sentence) > target_chars:
+            passages.append(" ".join(current))
+            current, length = [], 0
+        # Sentences longer than a passage (e.g. unpunctuated page text) are cut into pieces
+        while len(sentence) > 2 * target_chars:
+            cut = sentence.rfind(" ", 0, target_chars)
+            cut = cut if cut > 0 else target_chars
+            passages.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        current.append(sentence)
+        length += len(sentence) + 1
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def score_passages(query: str, passages: List[str]) -> np.ndarray:
+    """BM25 score of every passage against the query, computed as one (passages x terms) matrix."""
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    if not query_terms or not passages:
+        return np.zeros(len(passages), dtype=np.float32)
+
+    term_index = {term: j for j, term in enumerate(query_terms)}
+    tf = np.zeros((len(passages), len(query_terms)), dtype=np.float32)
+    lengths = np.zeros(len(passages), dtype=np.float32)
+    for i, passage in enumerate(passages):
+        tokens = tokenize(passage)
+        lengths[i] = len(tokens)
+        for term, count in Counter(tokens).items():
+            j = term_index.get(term)
+            if j is not None:
+                tf[i, j] = count
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5))
+    avg_length = max(float(lengths.mean()), 1.0)
+    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / avg_length)
+    return (idf * tf * (BM25_K1 + 1.0) / (tf + norm[:, None])).sum(axis=1)
+
+
+def top_passages(query: str, content: str, max_chars: int = DEFAULT_SUMMARY_CHARS) -> Tuple[str, Dict[str, Any]]:
+    """
+    Returns the passages of content that best match the query, within max_chars, joined in
+    their original order. Falls back to the opening passages when nothing matches.
+    """
+    passages = split_passages(content)
+    scores = score_passages(query, passages)
+    matched = bool(len(scores)) and float(scores.max()) > 0
+    order = np.argsort(-scores, kind="stable") if matched else np.arange(len(passages))
+
+    selected: List[int] = []
+    used = 0
+    for i in order:
+        if matched and scores[i] <= 0:
+            break
+        cost = len(passages[i]) + (len(PASSAGE_SEPARATOR) if selected else 0)
+        if used + cost > max_chars:
+            if not selected:
+                # Always return something: cut the best passage to the budget
+                selected.append(int(i))
+                used = max_chars
+            break
+        selected.append(int(i))
+        used += cost
+
+    selected.sort()
+    text = PASSAGE_SEPARATOR.join(passages[i] for i in selected)[:max_chars]
+    return text, {
+        "passages": len(passages),
+        "selected": len(selected),
+        "matched": matched,
+        "chars": len(text),
+        "content_chars": len(content),
+    }
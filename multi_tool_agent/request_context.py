@@ -0,0 +1,43 @@
+import contextvars
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RagRequestContext:
+    """Per-request agent settings: which RAG to query and which root instruction to use."""
+    rag_name: str
+    instruction: Optional[str] = None
+    vector_db: Any = None  # Index handle, resolved lazily by rag_answer and pinned for the request
+
+
+# ContextVars are copied into the tasks/threads ADK uses to run tools, so every
+# overlapping /run or /run_sse request sees only its own context.
+_current_context: contextvars.ContextVar[Optional[RagRequestContext]] = contextvars.ContextVar(
+    "rag_request_context", default=None
+)
+
+
+def get_request_context() -> Optional[RagRequestContext]:
+    """Returns the context of the request being served, or None outside of a request (e.g. `adk web`)."""
+    return _current_context.get()
+
+
+@contextmanager
+def rag_request_context(rag_name: str, instruction: Optional[str] = None) -> Iterator[RagRequestContext]:
+    """Activates a RagRequestContext for the duration of the `with` block."""
+    context = RagRequestContext(rag_name=rag_name, instruction=instruction)
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        try:
+            _current_context.reset(token)
+        except ValueError:
+            # The block was closed from another context (e.g. a streaming generator
+            # finalised after the client disconnected); nothing left to restore there.
+            logger.debug(f"RAG request context for '{rag_name}' closed from a different context")
@@ -0,0 +1,111 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from google.adk.agents import BaseAgent
+from google.adk.memory import BaseMemoryService
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService
+
+logger = logging.getLogger(__name__)
+
+RunnerKey = Tuple[str, str, int, int, int]
+
+
+class RunnerRegistry:
+    """
+    Long-lived Runners keyed by app and agent configuration.
+
+    A Runner holds no per-request state (the user, session and message are arguments of
+    run_async, and per-request RAG settings live in the request context), so one instance
+    per configuration serves every request.
+    """
+
+    def __init__(self):
+        self._runners: Dict[RunnerKey, Runner] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.created = 0
+
+    def get(
+        self,
+        agent: BaseAgent,
+        app_name: str,
+        session_service: BaseSessionService,
+        memory_service: Optional[BaseMemoryService] = None,
+    ) -> Runner:
+        key = (app_name, agent.name, id(agent), id(session_service), id(memory_service))
+        runner = self._runners.get(key)
+        if runner is not None:
+            self.hits += 1
+            return runner
+        with self._lock:
+            runner = self._runners.get(key)
+            if runner is None:
+                runner = Runner(
+                    agent=agent,
+                    app_name=app_name,
+                    session_service=session_service,
+                    memory_service=memory_service,
+                )
+                self._runners[key] = runner
+                self.created += 1
+                logger.info(f"Created runner for app '{app_name}', agent '{agent.name}'")
+        return runner
+
+    def stats(self) -> Dict[str, Any]:
+        return {"runners": len(self._runners), "hits": self.hits, "created": self.created}
+
+
+# Shared by every request handler of the process
+runner_registry = RunnerRegistry()
+
+
+async def _benchmark(iterations: int) -> None:
+    """Per-request setup cost: Runner construction and create_session versus registry and get-or-create."""
+    from .agent import AGENT, APP_NAME, MEMORY_SERVICE, SESSION_SERVICE
+
+    def report(label: str, seconds: float) -> None:
+        print(f"{label:<44} {1e6 * seconds / iterations:10.1f} us/request")
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        Runner(agent=AGENT, app_name=APP_NAME, session_service=SESSION_SERVICE, memory_service=MEMORY_SERVICE)
+    report("Runner per request", time.perf_counter() - start)
+
+    registry = RunnerRegistry()
+    registry.get(AGENT, APP_NAME, SESSION_SERVICE, MEMORY_SERVICE)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        registry.get(AGENT, APP_NAME, SESSION_SERVICE, MEMORY_SERVICE)
+    report("Runner from registry", time.perf_counter() - start)
+
+    user_id = f"bench_{int(time.time())}"
+    await SESSION_SERVICE.create_session(app_name=APP_NAME, user_id=user_id, session_id="bench")
+    start = time.perf_counter()
+    for _ in range(iterations):
+        session = await SESSION_SERVICE.get_session(app_name=APP_NAME, user_id=user_id, session_id="bench")
+        if session is None:
+            await SESSION_SERVICE.create_session(app_name=APP_NAME, user_id=user_id, session_id="bench")
+    report("get_session then create (existing session)", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await SESSION_SERVICE.ensure_session(app_name=APP_NAME, user_id=user_id, session_id="bench")
+    report("ensure_session (existing session)", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        SESSION_SERVICE.forget_known_sessions()  # as for a session first seen by this worker
+        await SESSION_SERVICE.ensure_session(app_name=APP_NAME, user_id=user_id, session_id="bench")
+    report("ensure_session (existing, not yet seen)", time.perf_counter() - start)
+    await SESSION_SERVICE.delete_session(app_name=APP_NAME, user_id=user_id, session_id="bench")
+
+
+if __name__ == "__main__":
+    # python -m multi_tool_agent.runners [iterations]; set SESSION_DB_PATH to keep the benchmark
+    # session out of the app database
+    import sys
+    asyncio.run(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
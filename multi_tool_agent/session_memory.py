@@ -1,5 +1,8 @@
-from google.adk.sessions import InMemorySessionService
-from google.adk.memory import InMemoryMemoryService
+import os
+
+from .sqlite_db import SqliteDatabase
+from .session_store import SESSION_SCHEMA, SqliteSessionService
+from .memory_store import MEMORY_SCHEMA, SqliteMemoryService
 
 # --- Session and Memory Service Setup for Import ---
 # These can be imported and used in other modules
@@ -7,5 +10,14 @@ APP_NAME = "multi_tool_agent_app"
 USER_ID = "user_1"
 SESSION_ID = "session_001"
 
-session_service = InMemorySessionService()
-memory_service = InMemoryMemoryService()
+# Sessions and memory persist in one SQLite file shared by all worker processes. This is
+# its own file, not the adk_sessions.db checked into the repo: nothing reads that file (the
+# app kept sessions in memory before), and writing a tracked file would dirty the checkout.
+SESSION_DB_PATH = os.getenv(
+    "SESSION_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent_sessions.db"),
+)
+
+session_db = SqliteDatabase(SESSION_DB_PATH, SESSION_SCHEMA + MEMORY_SCHEMA)
+session_service = SqliteSessionService(session_db)
+memory_service = SqliteMemoryService(session_db)
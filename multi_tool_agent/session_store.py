@@ -0,0 +1,388 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+from .sqlite_db import SqliteDatabase
+
+logger = logging.getLogger(__name__)
+
+# Hot sessions kept in memory per process; override through the environment
+DEFAULT_SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "256"))
+# Session keys known to exist, so get-or-create needs no database round trip
+DEFAULT_KNOWN_SESSIONS_MAX_ENTRIES = 65536
+
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agent_sessions (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, id TEXT NOT NULL,
+    state TEXT NOT NULL, create_time REAL NOT NULL, update_time REAL NOT NULL,
+    next_seq INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS agent_session_events (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL, seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, seq),
+    FOREIGN KEY (app_name, user_id, session_id) REFERENCES agent_sessions (app_name, user_id, id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS agent_app_states (
+    app_name TEXT NOT NULL PRIMARY KEY, state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agent_user_states (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+SessionKey = Tuple[str, str, str]
+# Touched on every delete, so other workers drop their known-session sets (one stat per ensure_session)
+DELETIONS_MARKER_SUFFIX = ".deleted"
+
+
+class _SessionMissing(Exception):
+    """Raised inside a write when the session row no longer exists (deleted by another worker)."""
+
+
+def _split_state(state: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Splits a state (delta) into app-, user- and session-scoped parts; temp: keys are dropped."""
+    app_state, user_state, session_state = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+def _merge_scoped_state(conn: sqlite3.Connection, app_name: str, user_id: str, app_delta: Dict[str, Any], user_delta: Dict[str, Any]) -> None:
+    if app_delta:
+        row = conn.execute("SELECT state FROM agent_app_states WHERE app_name = ?", (app_name,)).fetchone()
+        state = json.loads(row[0]) if row else {}
+        state.update(app_delta)
+        conn.execute(
+            "INSERT INTO agent_app_states (app_name, state) VALUES (?, ?)"
+            " ON CONFLICT (app_name) DO UPDATE SET state = excluded.state",
+            (app_name, json.dumps(state)),
+        )
+    if user_delta:
+        row = conn.execute(
+            "SELECT state FROM agent_user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+        ).fetchone()
+        state = json.loads(row[0]) if row else {}
+        state.update(user_delta)
+        conn.execute(
+            "INSERT INTO agent_user_states (app_name, user_id, state) VALUES (?, ?, ?)"
+            " ON CONFLICT (app_name, user_id) DO UPDATE SET state = excluded.state",
+            (app_name, user_id, json.dumps(state)),
+        )
+
+
+class _CachedSession:
+    __slots__ = ("events", "next_seq", "update_time")
+
+    def __init__(self, events: List[Event], next_seq: int, update_time: float):
+        self.events = events
+        self.next_seq = next_seq
+        self.update_time = update_time
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    ADK session service on a local SQLite file (WAL mode), shared by all worker processes.
+
+    Each event is one row keyed by (session, seq), so appending costs one insert and one
+    session-row update regardless of session length; appends from concurrent requests are
+    group-committed by the database's writer thread. Recently used sessions are kept in a
+    per-process LRU: a read checks the session row and loads only events appended since
+    (e.g. by another worker), so no sticky routing is needed. Deletes touch a marker file
+    next to the database, which tells every worker to forget the sessions it knew.
+    """
+
+    def __init__(self, db: SqliteDatabase, cache_max_entries: int = DEFAULT_SESSION_CACHE_MAX_ENTRIES):
+        self.db = db
+        self.cache_max_entries = cache_max_entries
+        self._cache: "OrderedDict[SessionKey, _CachedSession]" = OrderedDict()
+        self._known: "OrderedDict[SessionKey, None]" = OrderedDict()
+        self._deletions_marker = db.path + DELETIONS_MARKER_SUFFIX
+        self._deletions_seen = self._deletions_version()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # --- cache ---
+    def _cache_get(self, key: SessionKey) -> Optional[_CachedSession]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key: SessionKey, entry: _CachedSession) -> None:
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, key: SessionKey) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+            self._known.pop(key, None)
+
+    def _mark_known(self, key: SessionKey) -> None:
+        with self._lock:
+            self._known[key] = None
+            self._known.move_to_end(key)
+            while len(self._known) > DEFAULT_KNOWN_SESSIONS_MAX_ENTRIES:
+                self._known.popitem(last=False)
+
+    def _deletions_version(self) -> int:
+        try:
+            return os.stat(self._deletions_marker).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _mark_deleted(self) -> None:
+        with open(self._deletions_marker, "a"):
+            pass
+        now = time.time_ns()
+        os.utime(self._deletions_marker, ns=(now, now))
+
+    def forget_known_sessions(self) -> None:
+        """Drops the known-session set, so ensure_session checks the database again."""
+        with self._lock:
+            self._known.clear()
+
+    # --- reads ---
+    def _scoped_state(self, conn: sqlite3.Connection, app_name: str, user_id: str) -> Dict[str, Any]:
+        state = {}
+        row = conn.execute("SELECT state FROM agent_app_states WHERE app_name = ?", (app_name,)).fetchone()
+        if row:
+            state.update({State.APP_PREFIX + k: v for k, v in json.loads(row[0]).items()})
+        row = conn.execute(
+            "SELECT state FROM agent_user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+        ).fetchone()
+        if row:
+            state.update({State.USER_PREFIX + k: v for k, v in json.loads(row[0]).items()})
+        return state
+
+    def _load_session(self, app_name: str, user_id: str, session_id: str) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        conn = self.db.reader()
+        row = conn.execute(
+            "SELECT state, update_time, next_seq FROM agent_sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            self._cache_drop(key)
+            return None
+        session_state, update_time, next_seq = json.loads(row[0]), row[1], row[2]
+        self._mark_known(key)
+
+        cached = self._cache_get(key)
+        if cached is not None and cached.next_seq == next_seq:
+            self.cache_hits += 1
+            events = cached.events
+        else:
+            self.cache_misses += 1
+            # Only fetch what was appended since the cached copy (by this or another worker)
+            first_seq = cached.next_seq if cached is not None and cached.next_seq < next_seq else 0
+            new_events = [
+                Event.model_validate_json(event_json)
+                for (event_json,) in conn.execute(
+                    "SELECT event FROM agent_session_events WHERE app_name = ? AND user_id = ? AND session_id = ?"
+                    " AND seq >= ? AND seq < ? ORDER BY seq",
+                    (*key, first_seq, next_seq),
+                )
+            ]
+            events = (cached.events + new_events) if first_seq else new_events
+            self._cache_put(key, _CachedSession(events, next_seq, update_time))
+
+        state = self._scoped_state(conn, app_name, user_id)
+        state.update(session_state)
+        # A fresh list per caller: the runner appends to session.events while the cached list stays ours
+        return Session.model_construct(
+            id=session_id, app_name=app_name, user_id=user_id,
+            state=state, events=list(events), last_update_time=update_time,
+        )
+
+    async def get_session(
+        self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None
+    ) -> Optional[Session]:
+        session = await asyncio.to_thread(self._load_session, app_name, user_id, session_id)
+        if session is None or config is None:
+            return session
+        events = session.events
+        if config.after_timestamp:
+            events = [event for event in events if event.timestamp >= config.after_timestamp]
+        if config.num_recent_events:
+            events = events[-config.num_recent_events:]
+        session.events = events
+        return session
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        def _list() -> List[Session]:
+            rows = self.db.reader().execute(
+                "SELECT id, update_time FROM agent_sessions WHERE app_name = ? AND user_id = ? ORDER BY update_time DESC",
+                (app_name, user_id),
+            ).fetchall()
+            return [
+                Session.model_construct(id=sid, app_name=app_name, user_id=user_id, state={}, events=[], last_update_time=ts)
+                for sid, ts in rows
+            ]
+        return ListSessionsResponse(sessions=await asyncio.to_thread(_list))
+
+    # --- writes ---
+    async def create_session(
+        self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None
+    ) -> Session:
+        session_id = (session_id or "").strip() or uuid.uuid4().hex
+        app_delta, user_delta, session_state = _split_state(state)
+        now = time.time()
+
+        def _create(conn: sqlite3.Connection) -> None:
+            try:
+                conn.execute(
+                    "INSERT INTO agent_sessions (app_name, user_id, id, state, create_time, update_time, next_seq)"
+                    " VALUES (?, ?, ?, ?, ?, ?, 0)",
+                    (app_name, user_id, session_id, json.dumps(session_state), now, now),
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Session '{session_id}' already exists for user '{user_id}'.")
+            _merge_scoped_state(conn, app_name, user_id, app_delta, user_delta)
+
+        await asyncio.wrap_future(self.db.submit(_create))
+        self._cache_put((app_name, user_id, session_id), _CachedSession([], 0, now))
+        self._mark_known((app_name, user_id, session_id))
+        return await self.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def ensure_session(self, *, app_name: str, user_id: str, session_id: str) -> bool:
+        """
+        Creates the session unless it exists. Returns True if it was created. Sessions seen
+        by this process are answered from memory, others with a primary-key lookup.
+        """
+        key = (app_name, user_id, session_id)
+        deletions = self._deletions_version()
+        with self._lock:
+            if deletions != self._deletions_seen:
+                # Some worker deleted a session; any known key may be gone
+                self._deletions_seen = deletions
+                self._known.clear()
+            elif key in self._known:
+                self._known.move_to_end(key)
+                return False
+
+        def _exists() -> bool:
+            return self.db.reader().execute(
+                "SELECT 1 FROM agent_sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+            ).fetchone() is not None
+
+        if not await asyncio.to_thread(_exists):
+            try:
+                await self.create_session(app_name=app_name, user_id=user_id, session_id=session_id)
+                return True
+            except ValueError:
+                pass  # created concurrently by another request or worker
+        self._mark_known(key)
+        return False
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+
+        def _delete(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM agent_sessions WHERE app_name = ? AND user_id = ? AND id = ?", key)
+
+        await asyncio.wrap_future(self.db.submit(_delete))
+        self._cache_drop(key)
+        self._mark_deleted()
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # Applies the state delta to the in-memory session and appends the event to it
+        event = await super().append_event(session=session, event=event)
+        key = (session.app_name, session.user_id, session.id)
+        state_delta = event.actions.state_delta if event.actions and event.actions.state_delta else {}
+        app_delta, user_delta, session_delta = _split_state(state_delta)
+        event_json = event.model_dump_json(exclude_none=True)
+
+        def _append(conn: sqlite3.Connection) -> int:
+            row = conn.execute(
+                "SELECT next_seq, state FROM agent_sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+            ).fetchone()
+            if row is None:
+                raise _SessionMissing()
+            seq = row[0]
+            conn.execute(
+                "INSERT INTO agent_session_events (app_name, user_id, session_id, seq, event) VALUES (?, ?, ?, ?, ?)",
+                (*key, seq, event_json),
+            )
+            if session_delta:
+                session_state = json.loads(row[1])
+                session_state.update(session_delta)
+                conn.execute(
+                    "UPDATE agent_sessions SET next_seq = ?, update_time = ?, state = ?"
+                    " WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (seq + 1, event.timestamp, json.dumps(session_state), *key),
+                )
+            else:
+                conn.execute(
+                    "UPDATE agent_sessions SET next_seq = ?, update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (seq + 1, event.timestamp, *key),
+                )
+            _merge_scoped_state(conn, *key[:2], app_delta, user_delta)
+            return seq
+
+        try:
+            seq = await asyncio.wrap_future(self.db.submit(_append))
+        except _SessionMissing:
+            # Deleted by another worker after this run loaded it: re-create it and append again
+            logger.warning(f"Session '{session.id}' of user '{session.user_id}' was deleted during a run; re-creating it.")
+            self._cache_drop(key)
+            try:
+                await self.create_session(
+                    app_name=session.app_name, user_id=session.user_id,
+                    state=_split_state(session.state)[2], session_id=session.id,
+                )
+            except ValueError:
+                pass  # re-created concurrently
+            seq = await asyncio.wrap_future(self.db.submit(_append))
+        session.last_update_time = event.timestamp
+
+        cached = self._cache_get(key)
+        if cached is not None and cached.next_seq == seq:
+            # O(1): extend the cached copy instead of reloading the session
+            cached.events.append(event)
+            cached.next_seq = seq + 1
+            cached.update_time = event.timestamp
+        elif cached is not None:
+            self._cache_drop(key)
+        return event
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = len(self._cache)
+            known = len(self._known)
+        return {
+            "db_path": self.db.path,
+            "cached_sessions": cached,
+            "known_sessions": known,
+            "cache_max_entries": self.cache_max_entries,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "write_batches": self.db.batches,
+            "writes": self.db.writes,
+        }
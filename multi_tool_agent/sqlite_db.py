@@ -0,0 +1,103 @@
+import os
+import queue
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Writes queued while a transaction commits are grouped into the next one, up to this many
+DEFAULT_MAX_BATCH = 256
+BUSY_TIMEOUT_MS = 5000
+
+WriteOp = Callable[[sqlite3.Connection], Any]
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens a connection in WAL mode: readers never block the writer, and several processes
+    can share the file. Transactions are managed explicitly (isolation_level=None);
+    statements are prepared once per connection via the statement cache.
+    """
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, cached_statements=256)
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class SqliteDatabase:
+    """
+    A SQLite file shared by the session and memory services.
+
+    Reads use one connection per thread. Writes go to a single writer thread that commits
+    whatever has been queued in one transaction (group commit), with a savepoint per
+    operation so one failing write does not roll back the others. Callers get a Future
+    that resolves once their write is durable.
+    """
+
+    def __init__(self, path: str, schema: str, max_batch: int = DEFAULT_MAX_BATCH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_batch = max_batch
+        self._local = threading.local()
+        self._queue: "queue.Queue[Tuple[WriteOp, Future]]" = queue.Queue()
+        self._writer_conn = connect(path)
+        self._writer_conn.executescript(schema)
+        self.batches = 0
+        self.writes = 0
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def submit(self, op: WriteOp) -> Future:
+        """Queues op(conn) to run inside the writer's next transaction."""
+        future: Future = Future()
+        self._queue.put((op, future))
+        return future
+
+    def _write_loop(self) -> None:
+        conn = self._writer_conn
+        while True:
+            batch: List[Tuple[WriteOp, Future]] = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            outcomes = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for op, future in batch:
+                    conn.execute("SAVEPOINT op")
+                    try:
+                        outcomes.append((future, op(conn), None))
+                        conn.execute("RELEASE op")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO op")
+                        conn.execute("RELEASE op")
+                        outcomes.append((future, None, e))
+                conn.execute("COMMIT")
+            except Exception as e:
+                logger.error(f"SQLite write batch of {len(batch)} failed: {e}", exc_info=True)
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                outcomes = [(future, None, e) for _, future in batch]
+
+            self.batches += 1
+            self.writes += len(batch)
+            for future, result, error in outcomes:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,69 @@
+import os
+import json
+import logging
+from typing import Any, Dict, List
+
+from google.adk.events import Event
+
+logger = logging.getLogger(__name__)
+
+# Seconds without output after which /run_sse sends a keep-alive comment
+DEFAULT_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+HEARTBEAT = ": ping\n\n"
+# Sent first so proxies forward the response headers and start streaming right away
+STREAM_OPEN = ": stream open\n\n"
+
+
+def sse_message(event: str, data: Dict[str, Any]) -> str:
+    return f"data: {json.dumps({'event': event, 'data': data}, separators=(',', ':'), default=str)}\n\n"
+
+
+class EventProjector:
+    """
+    Projects ADK events of one run onto the compact /run_sse schema:
+
+    - text_delta {author, text}: model text as it is generated
+    - tool_start {author, tool} and tool_end {author, tool, status}: tool calls, without arguments or outputs
+    - agent_transfer {author, agent}: control moved to another agent
+    - final {author, text}: the complete text of a final response
+
+    With streaming enabled the model's text arrives as partial events followed by one
+    aggregated event; the aggregate is not sent again as a delta.
+    """
+
+    def __init__(self, debug: bool = False):
+        self.debug = debug
+        self.streamed_text = False
+
+    def project(self, event: Event) -> List[str]:
+        messages = []
+        if self.debug:
+            messages.append(f"data: {json.dumps({'event': 'debug', 'data': json.loads(event.model_dump_json(exclude_none=True))})}\n\n")
+        author = event.author
+        parts = event.content.parts if event.content and event.content.parts else []
+        text = "".join(part.text for part in parts if part.text and not getattr(part, "thought", False))
+
+        if event.partial:
+            if text:
+                self.streamed_text = True
+                messages.append(sse_message("text_delta", {"author": author, "text": text}))
+            return messages
+
+        if text and not self.streamed_text:
+            messages.append(sse_message("text_delta", {"author": author, "text": text}))
+        self.streamed_text = False
+
+        for part in parts:
+            if part.function_call:
+                messages.append(sse_message("tool_start", {"author": author, "tool": part.function_call.name}))
+            elif part.function_response:
+                response = part.function_response.response or {}
+                status = response.get("status", "success") if isinstance(response, dict) else "success"
+                messages.append(sse_message("tool_end", {"author": author, "tool": part.function_response.name, "status": status}))
+        if event.actions and event.actions.transfer_to_agent:
+            messages.append(sse_message("agent_transfer", {"author": author, "agent": event.actions.transfer_to_agent}))
+        if event.is_final_response() and text:
+            messages.append(sse_message("final", {"author": author, "text": text}))
+        elif event.error_message:
+            messages.append(sse_message("error", {"message": event.error_message}))
+        return messages
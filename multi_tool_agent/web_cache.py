@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from .embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Budgets for the shared web result cache; override through the environment.
+# WEB_CACHE_DB enables on-disk persistence when set to a SQLite file path.
+DEFAULT_MAX_ENTRIES = int(os.getenv("WEB_CACHE_MAX_ENTRIES", "2000"))
+DEFAULT_MAX_BYTES = int(os.getenv("WEB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_TTL_SECONDS = float(os.getenv("WEB_CACHE_TTL_SECONDS", "900"))
+# Expired entries with an ETag/Last-Modified are kept this much longer for revalidation
+DEFAULT_STALE_SECONDS = float(os.getenv("WEB_CACHE_STALE_SECONDS", str(24 * 3600)))
+DEFAULT_DB_PATH = os.getenv("WEB_CACHE_DB") or None
+# Expired rows are purged when the cache opens its file and then every this many writes
+PURGE_EVERY_WRITES = 1000
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+# Result handed to coalesced waiters when the fetching request is cancelled
+_OWNER_CANCELLED = object()
+
+
+def search_cache_key(query: str, engine: str) -> str:
+    return f"search:{engine}:{normalize_query(query)}"
+
+
+def page_cache_key(url: str) -> str:
+    """Normalizes a URL (scheme/host case, default port, fragment) so equivalent URLs share an entry."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    return "page:" + urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    created: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    nbytes: int = 0
+
+    @property
+    def revalidatable(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+
+class FetchResult(NamedTuple):
+    """What a fetch function returns to WebResultCache.get_or_fetch."""
+    value: Any
+    cacheable: bool = True
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    revalidated: bool = False  # upstream answered 304 Not Modified
+
+
+class WebResultCache:
+    """
+    Bounded, TTL-based cache of web tool results (search responses and fetched pages).
+
+    Entries live in an in-memory LRU and, when `db_path` is given, are written through to a
+    SQLite file so they survive restarts and can be shared by workers on one host. Expired
+    entries that carry an ETag or Last-Modified are kept for stale_seconds so the next fetch
+    can revalidate them with a conditional request instead of downloading the page again.
+    Concurrent misses for the same key on one event loop share a single upstream fetch.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        stale_seconds: float = DEFAULT_STALE_SECONDS,
+        db_path: Optional[str] = DEFAULT_DB_PATH,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self._writes = 0
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS web_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL,"
+                " etag TEXT, last_modified TEXT)"
+            )
+            self._db.commit()
+            logger.info(f"Web result cache persisted to {db_path}")
+            self.purge_expired()
+        except sqlite3.Error as e:
+            logger.error(f"Could not open web result cache at {db_path}, using memory only: {e}")
+            self._db = None
+
+    def _is_fresh(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.created <= self.ttl_seconds
+
+    def _is_usable(self, entry: CacheEntry, now: float) -> bool:
+        """Fresh, or expired but still worth a conditional request."""
+        return self._is_fresh(entry, now) or (
+            entry.revalidatable and now - entry.created <= self.ttl_seconds + self.stale_seconds
+        )
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Returns the entry for a key, fresh or revalidatable, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_usable(entry, now):
+                    self._entries.move_to_end(key)
+                    return entry
+                self._remove_locked(key)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created, etag, last_modified FROM web_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = CacheEntry(json.loads(row[0]), row[1], row[2], row[3], len(row[0]))
+                    if self._is_usable(entry, now):
+                        self._insert_locked(key, entry)
+                        self.disk_hits += 1
+                        return entry
+            return None
+
+    def put(self, key: str, value: Any, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        serialized = json.dumps(value)
+        entry = CacheEntry(value, time.time(), etag, last_modified, len(serialized))
+        with self._lock:
+            self._insert_locked(key, entry)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO web_cache (key, value, created, etag, last_modified) VALUES (?, ?, ?, ?, ?)",
+                        (key, serialized, entry.created, etag, last_modified),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to persist web cache entry: {e}")
+                self._writes += 1
+                if self._writes % PURGE_EVERY_WRITES == 0:
+                    self._purge_expired_locked()
+
+    def _insert_locked(self, key: str, entry: CacheEntry) -> None:
+        self._remove_locked(key)
+        self._entries[key] = entry
+        self._total_bytes += entry.nbytes
+        while self._entries and (
+            (self.max_entries > 0 and len(self._entries) > self.max_entries)
+            or (self.max_bytes > 0 and self._total_bytes > self.max_bytes)
+        ):
+            oldest_key = next(iter(self._entries))
+            self._remove_locked(oldest_key)
+            self.evictions += 1
+
+    def _remove_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.nbytes
+
+    async def get_or_fetch(
+        self, key: str, fetch: Callable[[Optional[CacheEntry]], Awaitable[FetchResult]]
+    ) -> Tuple[Any, str]:
+        """
+        Returns (value, source) for a key, where source is "hit", "revalidated", "coalesced"
+        or "fetched". On a miss, fetch(stale_entry) is awaited; stale_entry is the expired
+        entry to revalidate (or None). Concurrent callers for the same key await the same fetch.
+        """
+        entry = self.get(key)
+        if entry is not None and self._is_fresh(entry, time.time()):
+            with self._lock:
+                self.hits += 1
+            return entry.value, "hit"
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight[0] is loop:
+                future = inflight[1]
+                self.coalesced += 1
+                owner = False
+            else:
+                future = loop.create_future()
+                self._inflight[key] = (loop, future)
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            result = await asyncio.shield(future)
+            if result is _OWNER_CANCELLED:
+                # The request that started the fetch went away; fetch (or join a new fetch) ourselves
+                return await self.get_or_fetch(key, fetch)
+            return result[0], "coalesced"
+
+        try:
+            result = await fetch(entry)
+            if result.cacheable:
+                self.put(key, result.value, result.etag, result.last_modified)
+            source = "revalidated" if result.revalidated else "fetched"
+            if result.revalidated:
+                with self._lock:
+                    self.revalidated += 1
+            future.set_result((result.value, source))
+            return result.value, source
+        except asyncio.CancelledError:
+            # Only the owner was cancelled: waiters (possibly other users' runs) must not be.
+            # Drop the in-flight entry first so they start a fresh fetch instead of rejoining this one.
+            with self._lock:
+                if self._inflight.get(key, (None, None))[1] is future:
+                    del self._inflight[key]
+            future.set_result(_OWNER_CANCELLED)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Marks the exception retrieved when nobody else was waiting
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key, (None, None))[1] is future:
+                    del self._inflight[key]
+
+    def purge_expired(self) -> None:
+        """Drops entries past their TTL and revalidation window from memory and from the SQLite file."""
+        with self._lock:
+            self._purge_expired_locked()
+
+    def _purge_expired_locked(self) -> None:
+        cutoff = time.time() - self.ttl_seconds - self.stale_seconds
+        for key in [k for k, entry in self._entries.items() if entry.created < cutoff]:
+            self._remove_locked(key)
+        if self._db is not None:
+            try:
+                self._db.execute("DELETE FROM web_cache WHERE created < ?", (cutoff,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to purge expired rows from {self.db_path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "stale_seconds": self.stale_seconds,
+                "persistent": self._db is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+                "inflight": len(self._inflight),
+            }
+
+
+# Shared cache used by web_search and link_fetcher
+web_result_cache = WebResultCache()
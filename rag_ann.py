@@ -0,0 +1,188 @@
+import os
+import json
+import math
+import time
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Index types a RAG can be built with. "auto" picks one from the chunk count.
+INDEX_TYPES = ("auto", "flat", "ivf", "hnsw", "ivfpq")
+DEFAULT_INDEX_TYPE = "auto"
+
+# Chunk counts at which "auto" switches to the next index type
+AUTO_HNSW_MIN_CHUNKS = 20_000
+AUTO_IVF_MIN_CHUNKS = 200_000
+AUTO_IVFPQ_MIN_CHUNKS = 1_000_000
+
+# Minimum training points per IVF list / PQ centroid suggested by FAISS
+TRAINING_POINTS_PER_CENTROID = 39
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+PQ_NBITS = 8
+PQ_MAX_SUBQUANTIZERS = 64
+
+INDEX_META_SUFFIX = ".index.json"
+RAW_VECTORS_SUFFIX = ".vectors.npy"
+
+
+def index_meta_path(index_dir: str, collection_name: str) -> str:
+    return os.path.join(index_dir, collection_name + INDEX_META_SUFFIX)
+
+
+def raw_vectors_path(index_dir: str, collection_name: str) -> str:
+    return os.path.join(index_dir, collection_name + RAW_VECTORS_SUFFIX)
+
+
+def choose_index_type(num_vectors: int) -> str:
+    """Default index type for a corpus of num_vectors chunks."""
+    if num_vectors >= AUTO_IVFPQ_MIN_CHUNKS:
+        return "ivfpq"
+    if num_vectors >= AUTO_IVF_MIN_CHUNKS:
+        return "ivf"
+    if num_vectors >= AUTO_HNSW_MIN_CHUNKS:
+        return "hnsw"
+    return "flat"
+
+
+def _ivf_nlist(num_vectors: int) -> int:
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // TRAINING_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest divisor of the dimension not above PQ_MAX_SUBQUANTIZERS."""
+    for m in range(min(PQ_MAX_SUBQUANTIZERS, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def build_ann_index(vectors: np.ndarray, index_type: str, metric: int = faiss.METRIC_L2) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Builds and fills a FAISS index of the requested type from float32 vectors, in the same
+    row order (so docstore positions stay valid). Falls back to a simpler type when there
+    are too few vectors to train it. Returns the index and the parameters used.
+    """
+    num_vectors, dimension = vectors.shape
+    if index_type == "auto":
+        index_type = choose_index_type(num_vectors)
+
+    nlist = _ivf_nlist(num_vectors)
+    if index_type == "ivfpq" and num_vectors < (1 << PQ_NBITS) * TRAINING_POINTS_PER_CENTROID:
+        logger.warning(f"Too few vectors ({num_vectors}) to train IVF-PQ; using IVF instead.")
+        index_type = "ivf"
+    if index_type == "ivf" and nlist < 2:
+        logger.warning(f"Too few vectors ({num_vectors}) to train IVF; using a flat index instead.")
+        index_type = "flat"
+
+    params: Dict[str, Any] = {"index_type": index_type, "num_vectors": num_vectors, "dimension": dimension}
+    if index_type == "flat":
+        index = faiss.IndexFlat(dimension, metric)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, metric)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        params.update(M=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH)
+    elif index_type in ("ivf", "ivfpq"):
+        quantizer = faiss.IndexFlat(dimension, metric)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+        else:
+            m = _pq_subquantizers(dimension)
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, m, PQ_NBITS, metric)
+            params.update(pq_m=m, pq_nbits=PQ_NBITS)
+        index.train(vectors)
+        # nprobe is stored with the index, so readers search with the same setting
+        index.nprobe = min(nlist, max(8, nlist // 16))
+        params.update(nlist=nlist, nprobe=index.nprobe)
+        # Keeps vectors reconstructable by position (needed for compaction and rebuilds)
+        index.make_direct_map()
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}.")
+
+    if num_vectors:
+        index.add(vectors)
+    return index, params
+
+
+def index_vectors(index: faiss.Index, raw_vectors: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Returns the vectors of an index as a float32 matrix in position order. Lossy indexes
+    (IVF-PQ) are read from raw_vectors when given, since they cannot be reconstructed exactly.
+    """
+    if raw_vectors is not None and raw_vectors.shape[0] == index.ntotal:
+        return np.ascontiguousarray(raw_vectors, dtype="float32")
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+        if isinstance(ivf, faiss.IndexIVFPQ):
+            logger.warning("Reconstructing vectors from an IVF-PQ index without raw vectors; they are approximate.")
+    return np.ascontiguousarray(index.reconstruct_n(0, index.ntotal), dtype="float32")
+
+
+def to_flat_index(index: faiss.Index, raw_vectors: Optional[np.ndarray] = None) -> faiss.Index:
+    """Exact flat copy of any index (same metric and position order), used as the build working copy."""
+    if isinstance(index, faiss.IndexFlat):
+        return index
+    flat = faiss.IndexFlat(index.d, index.metric_type)
+    vectors = index_vectors(index, raw_vectors)
+    if len(vectors):
+        flat.add(vectors)
+    return flat
+
+
+def evaluate_index(ann_index: faiss.Index, vectors: np.ndarray, k: int = 10, num_queries: int = 200) -> Dict[str, Any]:
+    """
+    Recall@k and per-query latency of ann_index against exact search, using a sample of
+    the indexed vectors as queries.
+    """
+    num_vectors = len(vectors)
+    if num_vectors == 0:
+        return {"k": k, "num_queries": 0}
+    k = min(k, num_vectors)
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(num_vectors, size=min(num_queries, num_vectors), replace=False)]
+
+    exact = faiss.IndexFlat(vectors.shape[1], ann_index.metric_type)
+    exact.add(vectors)
+    start = time.perf_counter()
+    _, exact_ids = exact.search(queries, k)
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, ann_ids = ann_index.search(queries, k)
+    ann_seconds = time.perf_counter() - start
+
+    hits = sum(len(set(a[a >= 0]) & set(e)) for a, e in zip(ann_ids, exact_ids))
+    return {
+        "k": k,
+        "num_queries": len(queries),
+        "recall_at_k": hits / (len(queries) * k),
+        "ann_ms_per_query": 1000 * ann_seconds / len(queries),
+        "exact_ms_per_query": 1000 * exact_seconds / len(queries),
+    }
+
+
+def save_index_meta(index_dir: str, collection_name: str, meta: Dict[str, Any]) -> None:
+    with open(index_meta_path(index_dir, collection_name), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_index_meta(index_dir: str, collection_name: str) -> Dict[str, Any]:
+    try:
+        with open(index_meta_path(index_dir, collection_name), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def load_raw_vectors(index_dir: str, collection_name: str) -> Optional[np.ndarray]:
+    path = raw_vectors_path(index_dir, collection_name)
+    return np.load(path) if os.path.exists(path) else None
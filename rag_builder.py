@@ -13,17 +13,35 @@ import os
 import sys
 import argparse
 import logging
-from typing import List, Optional, Set
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 import datetime
 import shutil
+import time
+import random
+import uuid
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 # import re # Not strictly needed with the revised metadata strategy
 
 import dotenv
+import faiss
+import numpy as np
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS # Corrected FAISS import
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from rag_manifest import IngestionManifest, file_content_hash, chunk_text_hash, manifest_path
+from rag_snapshots import current_index_dir, rag_index_exists, new_snapshot_dir, publish_snapshot, garbage_collect_snapshots
+from rag_chunk_store import load_vector_db, save_vector_db
+from rag_lexical import write_lexical_index
+from rag_ann import (
+    INDEX_TYPES, DEFAULT_INDEX_TYPE, build_ann_index, evaluate_index, index_vectors, to_flat_index,
+    save_index_meta, load_index_meta, load_raw_vectors, raw_vectors_path,
+)
 # The google.generativeai package will be imported by langchain_google_genai
 # but we might need to import it directly if we were to use genai.configure explicitly
 # For now, langchain_google_genai handles API key from environment variable.
@@ -53,53 +71,130 @@ def load_environment():
     return api_key
 
 # --- Document Processing ---
-def load_documents_from_folder(folder_path: str) -> List[Document]:
+DEFAULT_PARSE_JOBS = 1
+# PDFs with at least this many pages are parsed in page ranges across the pool
+LARGE_PDF_PAGE_THRESHOLD = 40
+PDF_PAGES_PER_TASK = 20
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+def load_document_file(file_path: str) -> List[Document]:
+    """
+    Loads a single PDF or DOCX file. The source metadata for each document is set
+    to its absolute file path. Returns an empty list for unsupported or unreadable files.
+    Defined at module level so it can run in a worker process.
+    """
+    filename = os.path.basename(file_path)
+    abs_file_path = os.path.abspath(file_path) # Use absolute path for consistent source tracking
+
+    loader: Optional[PyPDFLoader | Docx2txtLoader] = None
+    doc_type = ""
+
+    if filename.lower().endswith(".pdf"):
+        loader = PyPDFLoader(file_path)
+        doc_type = "PDF"
+    elif filename.lower().endswith(".docx"):
+        loader = Docx2txtLoader(file_path)
+        doc_type = "DOCX"
+    else:
+        logger.warning(f"Unsupported file type: {filename}. Skipping.")
+        return []
+
+    try:
+        logger.info(f"Loading {doc_type}: {filename}...")
+        new_docs = loader.load()
+        # Ensure source metadata reflects the absolute path for uniqueness
+        for doc in new_docs:
+            doc.metadata["source"] = abs_file_path
+        logger.info(f"Successfully loaded {len(new_docs)} pages/sections from {filename}.")
+        return new_docs
+    except Exception as e:
+        logger.error(f"Failed to load {filename}: {e}", exc_info=True)
+        return []
+
+def load_pdf_page_range(file_path: str, start_page: int, end_page: int) -> List[Document]:
+    """
+    Loads pages [start_page, end_page) of a PDF, one Document per page, with the same
+    'source' and 'page' metadata PyPDFLoader produces. Runs in a worker process.
+    """
+    abs_file_path = os.path.abspath(file_path)
+    try:
+        reader = PdfReader(file_path)
+        return [
+            Document(
+                page_content=reader.pages[page_number].extract_text() or "",
+                metadata={"source": abs_file_path, "page": page_number},
+            )
+            for page_number in range(start_page, min(end_page, len(reader.pages)))
+        ]
+    except Exception as e:
+        logger.error(f"Failed to load pages {start_page}-{end_page} of {os.path.basename(file_path)}: {e}", exc_info=True)
+        return []
+
+def _pdf_page_count(file_path: str) -> int:
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception:
+        return 0
+
+def load_documents(file_paths: List[str], jobs: int = DEFAULT_PARSE_JOBS) -> List[List[Document]]:
+    """
+    Loads each file in `file_paths` straight from its original location and returns
+    the loaded documents per file, in the same order as `file_paths`.
+    With jobs > 1 files are parsed in a process pool, and large PDFs are split into
+    page ranges so a single big file is spread across several workers.
+    """
+    if jobs <= 1 or len(file_paths) == 0:
+        return [load_document_file(path) for path in file_paths]
+
+    # Each task is (file index, callable, args); results are reassembled per file in order.
+    tasks = []
+    for file_index, path in enumerate(file_paths):
+        page_count = _pdf_page_count(path) if path.lower().endswith(".pdf") else 0
+        if page_count >= LARGE_PDF_PAGE_THRESHOLD:
+            logger.info(f"Splitting {os.path.basename(path)} ({page_count} pages) into ranges of {PDF_PAGES_PER_TASK} pages.")
+            for start in range(0, page_count, PDF_PAGES_PER_TASK):
+                tasks.append((file_index, load_pdf_page_range, (path, start, start + PDF_PAGES_PER_TASK)))
+        else:
+            tasks.append((file_index, load_document_file, (path,)))
+
+    logger.info(f"Parsing {len(file_paths)} files as {len(tasks)} tasks with {jobs} worker processes...")
+    results: List[List[Document]] = [[] for _ in file_paths]
+    # Spawned, not forked: builds run on a worker thread of the server, and forking a process
+    # with other threads running can copy locks held mid-operation into the children.
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(func, *args) for _, func, args in tasks]
+        for (file_index, _, _), future in zip(tasks, futures):
+            try:
+                results[file_index].extend(future.result())
+            except Exception as e:
+                logger.error(f"Worker failed while parsing {os.path.basename(file_paths[file_index])}: {e}", exc_info=True)
+    return results
+
+def load_documents_from_folder(folder_path: str, jobs: int = DEFAULT_PARSE_JOBS) -> List[Document]:
     """
     Loads all documents from PDF and DOCX files in the specified folder.
     The source metadata for each document is set to its absolute file path.
     """
-    loaded_docs: List[Document] = []
     logger.info(f"Scanning document folder for loading: {folder_path}")
 
     if not os.path.isdir(folder_path):
         logger.error(f"Specified document folder does not exist: {folder_path}")
-        return loaded_docs
+        return []
 
+    file_paths = []
     for filename in os.listdir(folder_path):
         file_path = os.path.join(folder_path, filename)
-        abs_file_path = os.path.abspath(file_path) # Use absolute path for consistent source tracking
-
         if not os.path.isfile(file_path):
             logger.debug(f"Skipping non-file item: {filename}")
             continue
-
-        # Removed processed_sources check, as we now delete then add for updates.
-        # All files found will be loaded.
-
-        loader: Optional[PyPDFLoader | Docx2txtLoader] = None
-        doc_type = ""
-
-        if filename.lower().endswith(".pdf"):
-            loader = PyPDFLoader(file_path)
-            doc_type = "PDF"
-        elif filename.lower().endswith(".docx"):
-            loader = Docx2txtLoader(file_path)
-            doc_type = "DOCX"
-        else:
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
             logger.warning(f"Unsupported file type: {filename}. Skipping.")
             continue
+        file_paths.append(file_path)
 
-        try:
-            logger.info(f"Loading {doc_type}: {filename}...")
-            new_docs = loader.load()
-            # Ensure source metadata reflects the absolute path for uniqueness
-            for doc in new_docs:
-                doc.metadata["source"] = abs_file_path
-            loaded_docs.extend(new_docs)
-            logger.info(f"Successfully loaded {len(new_docs)} pages/sections from {filename}.")
-        except Exception as e:
-            logger.error(f"Failed to load {filename}: {e}", exc_info=True)
-
+    loaded_docs: List[Document] = []
+    for docs in load_documents(file_paths, jobs=jobs):
+        loaded_docs.extend(docs)
     return loaded_docs
 
 def split_documents_into_chunks(
@@ -121,6 +216,239 @@ def split_documents_into_chunks(
     logger.info(f"Generated {len(chunks)} chunks from the documents.")
     return chunks
 
+# --- Progress Reporting ---
+# Optional callback receiving progress events as dicts, e.g. {"stage": "embedding", ...}
+# or {"stage": "file", "file": "mydoc.pdf", "status": "queued", ...}. Used by background jobs.
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+def _report_progress(progress_callback: Optional[ProgressCallback], **event: Any) -> None:
+    if progress_callback is None:
+        return
+    try:
+        progress_callback(event)
+    except Exception as e:
+        logger.warning(f"Progress callback failed: {e}")
+
+# --- Embedding Stage ---
+DEFAULT_EMBEDDING_BATCH_SIZE = 100
+DEFAULT_EMBEDDING_CONCURRENCY = 4
+DEFAULT_EMBEDDING_MAX_RETRIES = 5
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    """Best-effort detection of quota/rate-limit errors from the Google embedding API."""
+    message = str(error).lower()
+    return (
+        type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+        or "429" in message
+        or "rate limit" in message
+        or "quota" in message
+        or "resource exhausted" in message
+    )
+
+def _embed_batch_with_retry(
+    embeddings: GoogleGenerativeAIEmbeddings, texts: List[str], batch_number: int, max_retries: int
+) -> List[List[float]]:
+    """Embeds one batch, retrying rate-limit errors with exponential backoff and jitter."""
+    attempt = 0
+    while True:
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt >= max_retries or not _is_rate_limit_error(e):
+                raise
+            delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+            attempt += 1
+            logger.warning(f"Rate limited on embedding batch {batch_number} (attempt {attempt}/{max_retries}); retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+def embed_chunks_in_batches(
+    chunks: List[Document],
+    embeddings: GoogleGenerativeAIEmbeddings,
+    batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE,
+    concurrency: int = DEFAULT_EMBEDDING_CONCURRENCY,
+    max_retries: int = DEFAULT_EMBEDDING_MAX_RETRIES,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> List[Tuple[Document, List[float]]]:
+    """
+    Embeds chunks in fixed-size batches, sending up to `concurrency` batches at once.
+    Returns (chunk, vector) pairs in the original chunk order. Chunks of batches that
+    still fail after retries are left out and logged.
+    """
+    batch_size = max(1, batch_size)
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+    logger.info(f"Embedding {len(chunks)} chunks in {len(batches)} batches (batch size: {batch_size}, concurrency: {concurrency})...")
+
+    batch_vectors: List[Optional[List[List[float]]]] = [None] * len(batches)
+    chunks_done = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(_embed_batch_with_retry, embeddings, [c.page_content for c in batch], n, max_retries): n
+            for n, batch in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            n = futures[future]
+            try:
+                batch_vectors[n] = future.result()
+            except Exception as e:
+                failed_files = sorted({c.metadata.get("original_filename", "unknown") for c in batches[n]})
+                logger.error(f"Failed to embed batch {n} ({len(batches[n])} chunks from {failed_files}): {e}", exc_info=True)
+            chunks_done += len(batches[n])
+            _report_progress(progress_callback, stage="embedding", chunks_done=chunks_done, chunks_total=len(chunks))
+
+    embedded: List[Tuple[Document, List[float]]] = []
+    for batch, vectors in zip(batches, batch_vectors):
+        if vectors is not None:
+            embedded.extend(zip(batch, vectors))
+    logger.info(f"Embedded {len(embedded)} of {len(chunks)} chunks.")
+    return embedded
+
+# --- Index Compaction ---
+# Fraction of dead entries above which a build compacts the index before publishing it
+DEFAULT_COMPACTION_THRESHOLD = 0.3
+
+def index_dead_stats(vector_db: FAISS) -> Dict[str, Any]:
+    """
+    Counts live and dead entries of a FAISS store. A vector is dead when no docstore
+    document backs it; a docstore document is dead (orphaned) when no vector points to it.
+    """
+    docstore_dict = vector_db.docstore._dict
+    total_vectors = vector_db.index.ntotal
+    live_positions = [
+        position for position, doc_id in vector_db.index_to_docstore_id.items()
+        if position < total_vectors and doc_id in docstore_dict
+    ]
+    referenced_ids = set(vector_db.index_to_docstore_id.values())
+    orphaned_docs = sum(1 for doc_id in docstore_dict if doc_id not in referenced_ids)
+    dead_vectors = total_vectors - len(live_positions)
+    total_entries = total_vectors + orphaned_docs
+    return {
+        "live": len(live_positions),
+        "dead_vectors": dead_vectors,
+        "orphaned_docs": orphaned_docs,
+        "dead_ratio": (dead_vectors + orphaned_docs) / total_entries if total_entries else 0.0,
+    }
+
+def compact_vector_db(vector_db: FAISS, manifest: Optional[IngestionManifest] = None) -> Dict[str, Any]:
+    """
+    Rebuilds the FAISS index and docstore in place from live entries only, reusing the
+    stored vectors (no re-embedding). The new index is a reset clone of the old one, so
+    its type, metric and any training are kept. Manifest entries are pruned to live doc IDs.
+    Returns the dead-entry stats from before compaction.
+    """
+    before = index_dead_stats(vector_db)
+    docstore_dict = vector_db.docstore._dict
+    total_vectors = vector_db.index.ntotal
+
+    live_pairs = sorted(
+        (position, doc_id) for position, doc_id in vector_db.index_to_docstore_id.items()
+        if position < total_vectors and doc_id in docstore_dict
+    )
+    new_index = faiss.clone_index(vector_db.index)
+    new_index.reset()
+    if live_pairs:
+        all_vectors = vector_db.index.reconstruct_n(0, total_vectors)
+        live_vectors = np.ascontiguousarray(all_vectors[[position for position, _ in live_pairs]], dtype="float32")
+        new_index.add(live_vectors)
+
+    vector_db.index = new_index
+    vector_db.index_to_docstore_id = {i: doc_id for i, (_, doc_id) in enumerate(live_pairs)}
+    vector_db.docstore = InMemoryDocstore({doc_id: docstore_dict[doc_id] for _, doc_id in live_pairs})
+
+    if manifest is not None:
+        live_ids = set(vector_db.index_to_docstore_id.values())
+        for filename in list(manifest.files):
+            chunks = manifest.file_chunks(filename)
+            live_chunks = [(doc_id, chunk_hash) for doc_id, chunk_hash in chunks if doc_id in live_ids]
+            if len(live_chunks) != len(chunks):
+                # Some chunks are gone, so the file must be re-ingested on its next upload
+                manifest.set_file(filename, None, manifest.version_timestamp(filename) or "", live_chunks)
+
+    logger.info(
+        f"Compacted FAISS index: kept {before['live']} live entries, dropped {before['dead_vectors']} dead vectors "
+        f"and {before['orphaned_docs']} orphaned docstore entries (dead ratio was {before['dead_ratio']:.1%})."
+    )
+    return before
+
+def compact_rag(db_path: str, collection_name: str, embedding_model_name: str) -> Optional[Dict[str, Any]]:
+    """Loads the live snapshot of a RAG, compacts it and publishes the result as a new snapshot."""
+    load_environment()
+    if not rag_index_exists(db_path, collection_name):
+        logger.error(f"No FAISS index '{collection_name}' found in {db_path}. Nothing to compact.")
+        return None
+    index_dir = current_index_dir(db_path, collection_name)
+    vector_db = load_vector_db(index_dir, collection_name, GoogleGenerativeAIEmbeddings(model=embedding_model_name), mmap=False)
+    manifest = IngestionManifest.load(index_dir, collection_name)
+    index_meta = load_index_meta(index_dir, collection_name)
+    vector_db.index = to_flat_index(vector_db.index, load_raw_vectors(index_dir, collection_name))
+    stats = compact_vector_db(vector_db, manifest)
+    # Rebuild with the index type the RAG was built with
+    save_and_publish_index(
+        vector_db, manifest, db_path, collection_name,
+        index_type=index_meta.get("requested_index_type", DEFAULT_INDEX_TYPE),
+    )
+    return stats
+
+# --- Index Publishing ---
+class IndexPublishError(Exception):
+    """Raised when a build changed the index but no snapshot could be published."""
+
+
+def save_and_publish_index(
+    vector_db: FAISS,
+    manifest: IngestionManifest,
+    db_path: str,
+    collection_name: str,
+    index_type: str = DEFAULT_INDEX_TYPE,
+) -> Optional[Dict[str, Any]]:
+    """
+    Converts the flat working index to the requested index type (see rag_ann.py), writes it,
+    its BM25 index (see rag_lexical.py) and the manifest to a new snapshot directory, then atomically switches the RAG's pointer
+    to it (see rag_snapshots.py). Readers keep serving the previous snapshot until the swap;
+    superseded snapshots are removed after a grace period.
+    Returns the index metadata (type, parameters, recall/latency report), or None on failure.
+    """
+    snapshot_dir = None
+    try:
+        vectors = index_vectors(vector_db.index)
+        ann_index, index_meta = build_ann_index(vectors, index_type, vector_db.index.metric_type)
+        index_meta["requested_index_type"] = index_type
+        if index_meta["index_type"] != "flat":
+            index_meta["report"] = evaluate_index(ann_index, vectors)
+            report = index_meta["report"]
+            logger.info(
+                f"Built {index_meta['index_type']} index for '{collection_name}' ({len(vectors)} vectors): "
+                f"recall@{report.get('k')} {report.get('recall_at_k', 0):.3f}, "
+                f"{report.get('ann_ms_per_query', 0):.3f} ms/query vs {report.get('exact_ms_per_query', 0):.3f} ms/query exact."
+            )
+        vector_db.index = ann_index
+
+        snapshot_dir = new_snapshot_dir(db_path)
+        logger.info(f"Saving FAISS index '{collection_name}' to snapshot {snapshot_dir}...")
+        save_vector_db(vector_db, snapshot_dir, collection_name)
+        write_lexical_index(snapshot_dir, collection_name, [
+            vector_db.docstore.search(vector_db.index_to_docstore_id[i]).page_content
+            for i in range(len(vector_db.index_to_docstore_id))
+        ])
+        if index_meta["index_type"] == "ivfpq":
+            # PQ codes are lossy; keep the exact vectors for future rebuilds and compaction
+            np.save(raw_vectors_path(snapshot_dir, collection_name), vectors)
+        save_index_meta(snapshot_dir, collection_name, index_meta)
+        manifest.path = manifest_path(snapshot_dir, collection_name)
+        manifest.save()
+        publish_snapshot(db_path, collection_name, snapshot_dir)
+        logger.info(f"Successfully saved and published FAISS index '{collection_name}' in {db_path}.")
+    except Exception as e:
+        logger.error(f"Failed to save FAISS index '{collection_name}' to {db_path}: {e}", exc_info=True)
+        if snapshot_dir:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+        return None
+
+    try:
+        garbage_collect_snapshots(db_path, collection_name)
+    except Exception as e:
+        logger.warning(f"Failed to garbage-collect old snapshots of '{collection_name}': {e}")
+    return index_meta
+
 # --- Main Application Logic ---
 def process_documents_and_build_db(
     docs_folder: str,
@@ -129,17 +457,35 @@ def process_documents_and_build_db(
     embedding_model_name: str,
     chunk_size: int,
     chunk_overlap: int,
+    embedding_batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE,
+    embedding_concurrency: int = DEFAULT_EMBEDDING_CONCURRENCY,
+    embedding_max_retries: int = DEFAULT_EMBEDDING_MAX_RETRIES,
+    jobs: int = DEFAULT_PARSE_JOBS,
+    progress_callback: Optional[ProgressCallback] = None,
+    compaction_threshold: Optional[float] = DEFAULT_COMPACTION_THRESHOLD,
+    index_type: str = DEFAULT_INDEX_TYPE,
 ):
     """
     Main function to load, process documents, and build/update the FAISS vector store.
     When a document is processed:
-    1. Existing chunks in DB for the same original_filename with an older version_timestamp are deleted.
-    2. New chunks are generated from the uploaded document.
-    3. New chunks are assigned metadata:
+    1. Files whose content hash matches the per-RAG manifest (see rag_manifest.py) are skipped.
+    2. New chunks are generated from the uploaded document and assigned metadata:
         - source: unique ID like 'filename_timestamp_chunkIndex'
         - original_filename: base filename
         - version_timestamp: current processing timestamp
-    4. These new versioned chunks are added to the database.
+    3. Chunks whose text matches a chunk of the previous version keep their existing vector
+       and only get the new metadata; the remaining chunks of older versions of the same
+       original_filename are deleted.
+    4. Chunks from all staged files that still need vectors are embedded in fixed-size
+       batches, several batches concurrently (see embed_chunks_in_batches), and
+       bulk-inserted into the database once.
+    5. The manifest records each file's content hash and the doc IDs of its chunks.
+    6. If more than compaction_threshold of the index is dead, it is compacted before saving
+       (None disables this).
+    7. The index is saved as index_type: flat, ivf, hnsw, ivfpq, or auto (chosen by chunk
+       count), with a recall-vs-latency report for approximate types.
+    If given, progress_callback receives stage and per-file progress events.
+    Returns a summary dict with file and chunk counts for the run.
     """
     load_environment()
 
@@ -152,18 +498,17 @@ def process_documents_and_build_db(
 
     logger.info(f"Initializing/Loading FAISS index from: {db_path} with index name: {collection_name}")
     vector_db: Optional[FAISS] = None
-    faiss_index_path = os.path.join(db_path, collection_name + ".faiss") # FAISS stores as folder/index_name.faiss
-
-    if os.path.exists(faiss_index_path): # More robust check for FAISS index existence
+    existing_index_type: Optional[str] = None
+    # The live snapshot is only read here; changes are written to a new snapshot and published at the end.
+    index_dir = current_index_dir(db_path, collection_name)
+    if rag_index_exists(db_path, collection_name): # More robust check for FAISS index existence
         try:
-            logger.info(f"Attempting to load existing FAISS index: {collection_name} from {db_path}")
-            vector_db = FAISS.load_local(
-                folder_path=db_path,
-                embeddings=embeddings,
-                index_name=collection_name,
-                allow_dangerous_deserialization=True # Required for FAISS with LangChain
-            )
+            logger.info(f"Attempting to load existing FAISS index: {collection_name} from {index_dir}")
+            vector_db = load_vector_db(index_dir, collection_name, embeddings, mmap=False)
             logger.info(f"Successfully loaded FAISS index '{collection_name}'.")
+            # All changes are made on an exact flat copy; the requested index type is built on save.
+            existing_index_type = load_index_meta(index_dir, collection_name).get("index_type", "flat")
+            vector_db.index = to_flat_index(vector_db.index, load_raw_vectors(index_dir, collection_name))
         except Exception as e:
             logger.error(f"Failed to load FAISS index '{collection_name}' from {db_path}: {e}. Will attempt to create a new one.", exc_info=True)
             vector_db = None # Ensure it's None if loading failed
@@ -177,93 +522,97 @@ def process_documents_and_build_db(
         return
 
     total_chunks_added_this_run = 0
+    total_chunks_reused_this_run = 0
     processed_files_count = 0
-
+    skipped_files_count = 0
+    pending_chunks: List[Document] = []
+    pending_chunk_hashes: Dict[str, str] = {} # new doc_id -> chunk_hash
+    file_records: Dict[str, dict] = {} # base_filename -> manifest fields gathered during this run
+
+    # The manifest doubles as the filename -> doc IDs side index, so older versions of a
+    # file are found in O(chunks of that file) instead of scanning the whole docstore.
+    manifest = IngestionManifest.load(index_dir, collection_name)
+    if vector_db is None and manifest.files:
+        logger.warning(f"Manifest found for '{collection_name}' but no FAISS index was loaded. Discarding manifest.")
+        manifest.clear()
+    elif vector_db is not None and not manifest.files and vector_db.docstore._dict:
+        manifest = IngestionManifest.from_docstore(index_dir, collection_name, vector_db.docstore._dict)
+
+    # --- Change Detection Phase ---
+    # Files whose content hash matches the manifest (and whose chunks are all still in the
+    # index) are skipped entirely: no parsing, no chunking, no embedding.
+    staged_files = [] # (base_filename, content_hash)
     for doc_filename_in_temp_folder in os.listdir(docs_folder):
-        original_file_full_path = os.path.join(docs_folder, doc_filename_in_temp_folder)
-        
-        if not os.path.isfile(original_file_full_path):
+        staged_file_path = os.path.join(docs_folder, doc_filename_in_temp_folder)
+        if not os.path.isfile(staged_file_path):
             logger.debug(f"Skipping non-file item: {doc_filename_in_temp_folder}")
             continue
+        try:
+            content_hash = file_content_hash(staged_file_path)
+        except OSError as e:
+            logger.error(f"Failed to hash {doc_filename_in_temp_folder}: {e}", exc_info=True)
+            content_hash = None
+        manifest_entry = manifest.get_file(doc_filename_in_temp_folder)
+        if (
+            vector_db
+            and content_hash
+            and manifest_entry
+            and manifest_entry.get("content_hash") == content_hash
+            and all(doc_id in vector_db.docstore._dict for doc_id, _ in manifest.file_chunks(doc_filename_in_temp_folder))
+        ):
+            logger.info(f"Skipping unchanged document: {doc_filename_in_temp_folder} (content hash matches manifest).")
+            skipped_files_count += 1
+            _report_progress(progress_callback, stage="file", file=doc_filename_in_temp_folder, status="skipped")
+            continue
+        staged_files.append((doc_filename_in_temp_folder, content_hash))
+
+    # --- Parsing Phase ---
+    # Changed files are parsed up front, in parallel when jobs > 1, straight from docs_folder.
+    _report_progress(progress_callback, stage="parsing", files=[name for name, _ in staged_files])
+    loaded_docs_per_file = load_documents(
+        [os.path.join(docs_folder, name) for name, _ in staged_files], jobs=jobs
+    )
+
+    for (doc_filename_in_temp_folder, content_hash), loaded_docs in zip(staged_files, loaded_docs_per_file):
 
         base_filename = doc_filename_in_temp_folder # This is the original name like "mydoc.pdf"
         current_processing_timestamp_str = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
 
         logger.info(f"Processing document: {base_filename} with timestamp {current_processing_timestamp_str}")
 
-        # --- Deletion Phase for older versions of this base_filename ---
-        if vector_db: # Only attempt deletion if a DB is loaded
-            ids_to_delete = []
+        # --- Existing Chunks of this base_filename ---
+        # chunk_hash -> doc_ids of older chunks. Chunks whose text is unchanged keep their
+        # vectors; whatever is left over after matching is deleted.
+        old_chunks_by_hash: Dict[str, List[str]] = {}
+        if vector_db: # Only look for older versions if a DB is loaded
             try:
-                logger.debug(f"Checking for older versions of '{base_filename}' to delete from FAISS index.")
-                # FAISS docstore is a dictionary of id -> Document
-                # We need to iterate through it to find documents with matching 'original_filename'
-                # and an older 'version_timestamp'.
-                # The actual document IDs used by FAISS are in vector_db.index_to_docstore_id
-                # And the documents (with metadata) are in vector_db.docstore._dict
-                
-                # Collect all doc IDs and their metadata
-                candidate_ids_for_deletion = []
-                for doc_id, doc_obj in vector_db.docstore._dict.items():
-                    meta = doc_obj.metadata
-                    if meta and meta.get("original_filename") == base_filename:
-                        stored_version_timestamp = meta.get("version_timestamp")
-                        if stored_version_timestamp and stored_version_timestamp < current_processing_timestamp_str:
-                            candidate_ids_for_deletion.append(doc_id)
-                            logger.debug(f"Marking for deletion (older version): FAISS ID {doc_id}, Source: {meta.get('source', 'N/A')}, Stored Timestamp: {stored_version_timestamp}")
-                
-                if candidate_ids_for_deletion:
-                    # FAISS delete method expects a list of document IDs (the ones in docstore._dict.keys())
-                    # It returns True if successful, False otherwise.
-                    # Note: Deleting from FAISS can be complex and might not shrink the index file immediately.
-                    # It marks entries for future overwrite or requires rebuilding for actual size reduction.
-                    # Langchain's FAISS wrapper handles this.
-                    logger.info(f"Found {len(candidate_ids_for_deletion)} older chunk(s) of '{base_filename}'. Attempting to delete them.")
-                    delete_result = vector_db.delete(ids=candidate_ids_for_deletion)
-                    if delete_result:
-                        logger.info(f"Successfully deleted {len(candidate_ids_for_deletion)} older chunks for '{base_filename}' from FAISS index.")
-                    else:
-                        logger.warning(f"FAISS delete operation for {len(candidate_ids_for_deletion)} chunks of '{base_filename}' returned False. Some chunks may not have been deleted.")
-                else:
-                    logger.info(f"No older versions of chunks found for '{base_filename}' to delete in FAISS index.")
-
+                old_chunk_pairs = [
+                    (doc_id, chunk_hash) for doc_id, chunk_hash in manifest.file_chunks(base_filename)
+                    if doc_id in vector_db.docstore._dict
+                ]
+                for doc_id, chunk_hash in old_chunk_pairs:
+                    old_chunks_by_hash.setdefault(chunk_hash, []).append(doc_id)
             except AttributeError as ae:
-                 logger.error(f"Could not access FAISS docstore for deletion, vector_db might be None or not a FAISS instance: {ae}", exc_info=True)
+                 logger.error(f"Could not access FAISS docstore, vector_db might be None or not a FAISS instance: {ae}", exc_info=True)
             except Exception as e:
-                logger.error(f"Error during FAISS deletion phase for {base_filename}: {e}", exc_info=True)
+                logger.error(f"Error while collecting older chunks for {base_filename}: {e}", exc_info=True)
         else:
             logger.info(f"No FAISS database loaded, skipping deletion phase for {base_filename}.")
 
-        # --- Loading and Processing New Document ---
-        # Create a temporary directory for loading this single file to avoid issues with multi-file loaders
-        temp_single_file_processing_dir = os.path.join(os.path.dirname(docs_folder), "_temp_single_file_processing")
-        os.makedirs(temp_single_file_processing_dir, exist_ok=True)
-        path_to_file_in_temp_single_dir = os.path.join(temp_single_file_processing_dir, base_filename)
-        
-        try:
-            shutil.copy2(original_file_full_path, path_to_file_in_temp_single_dir)
-            # loaded_docs_from_temp will have doc.metadata["source"] = absolute path of the copied file
-            loaded_docs_from_temp = load_documents_from_folder(temp_single_file_processing_dir)
-        finally:
-            shutil.rmtree(temp_single_file_processing_dir)
-
-
-        if not loaded_docs_from_temp:
+        # --- Processing New Document ---
+        new_chunks_from_upload: List[Document] = []
+        if loaded_docs:
+            # The 'source' in loaded_docs is the staged file path.
+            # This is fine as we are about to create new metadata.
+            new_chunks_from_upload = split_documents_into_chunks(loaded_docs, chunk_size, chunk_overlap)
+        else:
             logger.warning(f"Could not load document {base_filename}. Skipping addition for this version.")
-            continue
-        
-        # The 'source' in loaded_docs_from_temp is the path within temp_single_file_processing_dir.
-        # This is fine as we are about to create new metadata.
-        new_chunks_from_upload = split_documents_into_chunks(loaded_docs_from_temp, chunk_size, chunk_overlap)
-
-        if not new_chunks_from_upload:
-            logger.info(f"No chunks generated for {base_filename}. Skipping addition for this version.")
-            continue
 
-        # --- Preparing and Adding New Chunks to DB ---
+        # --- Preparing New Chunks and Reusing Unchanged Ones ---
         chunks_to_add_this_version = []
+        reused_chunks: List[Tuple[str, str]] = []
         for i, fresh_chunk in enumerate(new_chunks_from_upload):
-            # fresh_chunk.metadata currently contains {'source': /path/in/_temp_single_file_processing/..., 'start_index': ...}
+            # fresh_chunk.metadata currently contains {'source': /path/to/staged/file, 'start_index': ...}
             
             chunk_unique_source_id = f"{base_filename}_{current_processing_timestamp_str}_{i}"
             
@@ -274,53 +623,163 @@ def process_documents_and_build_db(
             }
             if 'start_index' in fresh_chunk.metadata: # Preserve start_index
                 final_metadata_for_chunk['start_index'] = fresh_chunk.metadata['start_index']
+            if 'page' in fresh_chunk.metadata: # start_index is relative to the PDF page
+                final_metadata_for_chunk['page'] = fresh_chunk.metadata['page']
             # Potentially copy other relevant metadata from fresh_chunk.metadata if needed
 
+            chunk_hash = chunk_text_hash(fresh_chunk.page_content)
+            matching_old_ids = old_chunks_by_hash.get(chunk_hash)
+            if matching_old_ids:
+                # Same text as an existing chunk: keep its vector and move it to the new version.
+                doc_id = matching_old_ids.pop()
+                vector_db.docstore._dict[doc_id] = Document(
+                    id=doc_id,
+                    page_content=fresh_chunk.page_content,
+                    metadata=final_metadata_for_chunk
+                )
+                reused_chunks.append((doc_id, chunk_hash))
+                continue
+
             chunk_doc_to_add = Document(
+                id=str(uuid.uuid4()),
                 page_content=fresh_chunk.page_content,
                 metadata=final_metadata_for_chunk
             )
+            pending_chunk_hashes[chunk_doc_to_add.id] = chunk_hash
             chunks_to_add_this_version.append(chunk_doc_to_add)
 
+        # --- Deletion Phase for chunks of older versions that were not reused ---
+        candidate_ids_for_deletion = [doc_id for doc_ids in old_chunks_by_hash.values() for doc_id in doc_ids]
+        if candidate_ids_for_deletion:
+            try:
+                # Note: Deleting from FAISS can be complex and might not shrink the index file immediately.
+                # It marks entries for future overwrite or requires rebuilding for actual size reduction.
+                # Langchain's FAISS wrapper handles this.
+                logger.info(f"Found {len(candidate_ids_for_deletion)} stale chunk(s) of older versions of '{base_filename}'. Attempting to delete them.")
+                delete_result = vector_db.delete(ids=candidate_ids_for_deletion)
+                if delete_result:
+                    logger.info(f"Successfully deleted {len(candidate_ids_for_deletion)} older chunks for '{base_filename}' from FAISS index.")
+                else:
+                    logger.warning(f"FAISS delete operation for {len(candidate_ids_for_deletion)} chunks of '{base_filename}' returned False. Some chunks may not have been deleted.")
+            except Exception as e:
+                logger.error(f"Error during FAISS deletion phase for {base_filename}: {e}", exc_info=True)
+        elif vector_db:
+            logger.info(f"No stale chunks of older versions found for '{base_filename}' to delete in FAISS index.")
+
+        if reused_chunks:
+            logger.info(f"Reused {len(reused_chunks)} unchanged chunks of '{base_filename}' without re-embedding.")
+            total_chunks_reused_this_run += len(reused_chunks)
+
         if chunks_to_add_this_version:
+            # Embedding is deferred so chunks from all staged files can be sent in shared batches
+            logger.info(f"Queued {len(chunks_to_add_this_version)} new chunks for '{base_filename}' (version: {current_processing_timestamp_str}) for embedding.")
+            pending_chunks.extend(chunks_to_add_this_version)
+        else: 
+            logger.info(f"No new chunks need embedding for {base_filename} (version: {current_processing_timestamp_str}).")
+
+        _report_progress(
+            progress_callback, stage="file", file=base_filename, status="queued",
+            chunks_total=len(new_chunks_from_upload), chunks_new=len(chunks_to_add_this_version),
+            chunks_reused=len(reused_chunks), chunks_deleted=len(candidate_ids_for_deletion),
+        )
+        file_records[base_filename] = {
+            # Only a fully loaded file may be skipped on its next upload
+            "content_hash": content_hash if loaded_docs else None,
+            "version_timestamp": current_processing_timestamp_str,
+            "chunks": reused_chunks,
+            "pending": len(chunks_to_add_this_version),
+            "loaded": bool(loaded_docs),
+        }
+        processed_files_count += 1
+
+    # --- Embedding and Bulk Insert Phase ---
+    if pending_chunks:
+        embedded_chunks = embed_chunks_in_batches(
+            pending_chunks,
+            embeddings,
+            batch_size=embedding_batch_size,
+            concurrency=embedding_concurrency,
+            max_retries=embedding_max_retries,
+            progress_callback=progress_callback,
+        )
+        if embedded_chunks:
+            text_embeddings = [(chunk.page_content, vector) for chunk, vector in embedded_chunks]
+            metadatas = [chunk.metadata for chunk, _ in embedded_chunks]
+            ids = [chunk.id for chunk, _ in embedded_chunks]
             try:
                 if vector_db is None: # Create new FAISS index
-                    logger.info(f"Creating new FAISS index with {len(chunks_to_add_this_version)} chunks for '{base_filename}'.")
-                    vector_db = FAISS.from_documents(chunks_to_add_this_version, embeddings)
-                    logger.info(f"Successfully created new FAISS index and added {len(chunks_to_add_this_version)} chunks.")
+                    logger.info(f"Creating new FAISS index with {len(text_embeddings)} chunks.")
+                    vector_db = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
                 else: # Add to existing FAISS index
-                    logger.info(f"Adding {len(chunks_to_add_this_version)} new chunks for '{base_filename}' to existing FAISS index.")
-                    vector_db.add_documents(chunks_to_add_this_version)
-                    logger.info(f"Successfully added {len(chunks_to_add_this_version)} new chunks.")
-                total_chunks_added_this_run += len(chunks_to_add_this_version)
+                    logger.info(f"Adding {len(text_embeddings)} new chunks to existing FAISS index.")
+                    vector_db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                total_chunks_added_this_run = len(text_embeddings)
+                logger.info(f"Successfully inserted {total_chunks_added_this_run} chunks into FAISS index.")
+                for chunk, _ in embedded_chunks:
+                    record = file_records[chunk.metadata["original_filename"]]
+                    record["chunks"].append((chunk.id, pending_chunk_hashes[chunk.id]))
+                    record["pending"] -= 1
             except Exception as e:
-                logger.error(f"Failed to add new chunks for {base_filename} (version: {current_processing_timestamp_str}) to FAISS: {e}", exc_info=True)
-        else: 
-            logger.info(f"No chunks were prepared to be added for {base_filename} (version: {current_processing_timestamp_str}).")
-        
-        processed_files_count += 1
+                logger.error(f"Failed to insert {len(text_embeddings)} embedded chunks into FAISS: {e}", exc_info=True)
 
-    if vector_db and total_chunks_added_this_run > 0: # Only save if DB exists and chunks were added/updated
+    # --- Manifest Update ---
+    for base_filename, record in file_records.items():
+        if not record["loaded"]:
+            file_status = "failed"
+        else:
+            file_status = "done" if record["pending"] == 0 else "partial"
+        _report_progress(progress_callback, stage="file", file=base_filename, status=file_status, chunks_failed=record["pending"])
+        # A file with chunks that failed to embed is recorded without a content hash,
+        # so the next run re-ingests it instead of skipping it.
+        manifest.set_file(
+            base_filename,
+            record["content_hash"] if record["pending"] == 0 else None,
+            record["version_timestamp"],
+            record["chunks"],
+        )
+
+    # --- Compaction Phase ---
+    if vector_db and processed_files_count > 0 and compaction_threshold is not None:
         try:
-            logger.info(f"Saving FAISS index '{collection_name}' to {db_path}...")
-            vector_db.save_local(folder_path=db_path, index_name=collection_name)
-            logger.info(f"Successfully saved FAISS index '{collection_name}' to {db_path}.")
+            dead_stats = index_dead_stats(vector_db)
+            if dead_stats["dead_ratio"] > compaction_threshold:
+                _report_progress(progress_callback, stage="compacting")
+                compact_vector_db(vector_db, manifest)
         except Exception as e:
-            logger.error(f"Failed to save FAISS index '{collection_name}' to {db_path}: {e}", exc_info=True)
-    elif vector_db and total_chunks_added_this_run == 0 and processed_files_count > 0:
-        # This case handles when only deletions might have occurred.
+            logger.error(f"Failed to compact FAISS index '{collection_name}': {e}", exc_info=True)
+
+    _report_progress(progress_callback, stage="saving")
+    # An explicitly requested index type different from the live one forces a rebuild
+    index_type_changed = (
+        vector_db is not None and existing_index_type is not None
+        and index_type != "auto" and index_type != existing_index_type
+    )
+    index_meta = None
+    save_attempted = False
+    if vector_db and total_chunks_added_this_run > 0: # Only save if DB exists and chunks were added/updated
+        save_attempted = True
+        index_meta = save_and_publish_index(vector_db, manifest, db_path, collection_name, index_type)
+    elif vector_db and total_chunks_added_this_run == 0 and (processed_files_count > 0 or index_type_changed):
+        # This case handles when only deletions, reused-chunk metadata updates or an index type change might have occurred.
         # FAISS deletions are in-memory until save.
-        try:
-            logger.info(f"Saving FAISS index '{collection_name}' to {db_path} after potential deletions...")
-            vector_db.save_local(folder_path=db_path, index_name=collection_name)
-            logger.info(f"Successfully saved FAISS index '{collection_name}' to {db_path} after potential deletions.")
-        except Exception as e:
-            logger.error(f"Failed to save FAISS index '{collection_name}' to {db_path} after potential deletions: {e}", exc_info=True)
+        logger.info(f"Saving FAISS index '{collection_name}' after potential deletions...")
+        save_attempted = True
+        index_meta = save_and_publish_index(vector_db, manifest, db_path, collection_name, index_type)
     else:
         logger.info("No changes made to the FAISS index, or no index was created/loaded. Skipping save.")
+    if save_attempted and index_meta is None:
+        # Nothing was published: callers must not report the documents as ingested
+        raise IndexPublishError(f"Failed to save and publish FAISS index '{collection_name}' in {db_path}; see the log for details.")
 
 
-    logger.info(f"Finished processing all documents. Added/updated a total of {total_chunks_added_this_run} versioned chunks from {processed_files_count} files processed in this run.")
+    logger.info(f"Finished processing all documents. Added a total of {total_chunks_added_this_run} new chunks and reused {total_chunks_reused_this_run} unchanged chunks from {processed_files_count} files processed in this run ({skipped_files_count} unchanged files skipped).")
+    return {
+        "files_processed": processed_files_count,
+        "files_skipped": skipped_files_count,
+        "chunks_added": total_chunks_added_this_run,
+        "chunks_reused": total_chunks_reused_this_run,
+        "index": index_meta,
+    }
 
 # --- Command-Line Interface ---
 def main():
@@ -355,6 +814,27 @@ def main():
     parser.add_argument(
         "--chunk_overlap", type=int, default=200, help="Overlap between text chunks."
     )
+    parser.add_argument(
+        "--embedding_batch_size", type=int, default=DEFAULT_EMBEDDING_BATCH_SIZE, help="Number of chunks sent per embedding request."
+    )
+    parser.add_argument(
+        "--embedding_concurrency", type=int, default=DEFAULT_EMBEDDING_CONCURRENCY, help="Maximum number of embedding batches in flight at once."
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=DEFAULT_PARSE_JOBS, help="Number of worker processes used to parse documents."
+    )
+    parser.add_argument(
+        "--compaction_threshold", type=float, default=DEFAULT_COMPACTION_THRESHOLD,
+        help="Compact the index after a build when more than this fraction of it is dead (e.g. 0.3)."
+    )
+    parser.add_argument(
+        "--index_type", type=str, choices=INDEX_TYPES, default=DEFAULT_INDEX_TYPE,
+        help="FAISS index type: flat (exact), ivf, hnsw, ivfpq, or auto to choose by chunk count."
+    )
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="Only compact the existing index (drop dead vectors and docstore entries) and exit; no documents are processed."
+    )
     parser.add_argument(
         "--env_file", type=str, default=None, help="Path to .env file (optional, uses os.environ by default)."
     )
@@ -370,6 +850,11 @@ def main():
         dotenv.load_dotenv(override=True) # Load default .env, override os.environ if keys exist
 
 
+    if args.compact:
+        actual_db_path = os.path.join("custom_rag", args.db_name)
+        compact_rag(actual_db_path, args.collection_name, args.embedding_model)
+        return
+
     # Create docs_folder if it doesn't exist, with a message
     if not os.path.exists(args.docs_folder):
         logger.info(f"Documents folder '{args.docs_folder}' not found. Creating it.")
@@ -399,6 +884,11 @@ def main():
         embedding_model_name=args.embedding_model,
         chunk_size=args.chunk_size,
         chunk_overlap=args.chunk_overlap,
+        embedding_batch_size=args.embedding_batch_size,
+        embedding_concurrency=args.embedding_concurrency,
+        jobs=args.jobs,
+        compaction_threshold=args.compaction_threshold,
+        index_type=args.index_type,
     )
 
 if __name__ == "__main__":
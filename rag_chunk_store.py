@@ -0,0 +1,204 @@
+import os
+import json
+import logging
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+# On-disk chunk store written next to <collection>.faiss in every snapshot, replacing the
+# pickled (InMemoryDocstore, index_to_docstore_id) pair:
+#   <collection>.chunks/ids.npy            docstore ID of each FAISS position (fixed-width bytes)
+#   <collection>.chunks/sorted_ids.npy     the same IDs sorted, for binary search by ID
+#   <collection>.chunks/sorted_rows.npy    FAISS position of each sorted ID
+#   <collection>.chunks/text.npy           UTF-8 chunk texts, concatenated
+#   <collection>.chunks/text_offsets.npy   start of each row's text (n + 1 entries)
+#   <collection>.chunks/meta.npy           JSON metadata of each row, concatenated
+#   <collection>.chunks/meta_offsets.npy   start of each row's metadata (n + 1 entries)
+# Every column is a plain .npy array, so readers memory-map it read-only: opening a RAG
+# costs a few header reads regardless of its size, and all workers share the page cache
+# instead of each holding an unpickled copy.
+CHUNK_STORE_SUFFIX = ".chunks"
+CHUNK_STORE_COLUMNS = ("ids", "sorted_ids", "sorted_rows", "text", "text_offsets", "meta", "meta_offsets")
+
+
+def chunk_store_dir(index_dir: str, collection_name: str) -> str:
+    return os.path.join(index_dir, collection_name + CHUNK_STORE_SUFFIX)
+
+
+def chunk_store_files(index_dir: str, collection_name: str) -> List[str]:
+    """Paths of the chunk store's column files."""
+    store_dir = chunk_store_dir(index_dir, collection_name)
+    return [os.path.join(store_dir, column + ".npy") for column in CHUNK_STORE_COLUMNS]
+
+
+def chunk_store_exists(index_dir: str, collection_name: str) -> bool:
+    return all(os.path.exists(path) for path in chunk_store_files(index_dir, collection_name))
+
+
+def _concat_utf8(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def write_chunk_store(index_dir: str, collection_name: str, index_to_docstore_id: Dict[int, str], docstore: Any) -> None:
+    """Writes the docstore entries of every FAISS position (0..ntotal-1) as memory-mappable columns."""
+    store_dir = chunk_store_dir(index_dir, collection_name)
+    os.makedirs(store_dir, exist_ok=True)
+
+    doc_ids = [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))]
+    texts, metas = [], []
+    for doc_id in doc_ids:
+        doc = docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            raise ValueError(f"Docstore entry '{doc_id}' referenced by the index is missing.")
+        texts.append(doc.page_content or "")
+        metas.append(json.dumps(doc.metadata or {}, default=str))
+
+    encoded_ids = [doc_id.encode("utf-8") for doc_id in doc_ids]
+    width = max((len(b) for b in encoded_ids), default=1)
+    ids = np.array(encoded_ids, dtype=f"S{width}")
+    sorted_rows = np.argsort(ids, kind="stable").astype(np.int64)
+    text, text_offsets = _concat_utf8(texts)
+    meta, meta_offsets = _concat_utf8(metas)
+
+    columns = {
+        "ids": ids,
+        "sorted_ids": ids[sorted_rows],
+        "sorted_rows": sorted_rows,
+        "text": text,
+        "text_offsets": text_offsets,
+        "meta": meta,
+        "meta_offsets": meta_offsets,
+    }
+    for column in CHUNK_STORE_COLUMNS:
+        np.save(os.path.join(store_dir, column + ".npy"), columns[column], allow_pickle=False)
+    logger.info(f"Wrote chunk store for '{collection_name}' ({len(doc_ids)} chunks, {text.nbytes} bytes of text).")
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view of a chunk store."""
+
+    def __init__(self, index_dir: str, collection_name: str):
+        store_dir = chunk_store_dir(index_dir, collection_name)
+        for column in CHUNK_STORE_COLUMNS:
+            setattr(self, column, np.load(os.path.join(store_dir, column + ".npy"), mmap_mode="r", allow_pickle=False))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def doc_id(self, row: int) -> str:
+        return self.ids[row].decode("utf-8")
+
+    def row_of(self, doc_id: str) -> int:
+        """FAISS position of a docstore ID, or -1 if it is not in the store."""
+        encoded = doc_id.encode("utf-8")
+        if len(encoded) > self.sorted_ids.dtype.itemsize:
+            return -1
+        key = np.array(encoded, dtype=self.sorted_ids.dtype)
+        i = int(np.searchsorted(self.sorted_ids, key))
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == key:
+            return int(self.sorted_rows[i])
+        return -1
+
+    def document(self, row: int) -> Document:
+        text = self.text[self.text_offsets[row]:self.text_offsets[row + 1]].tobytes().decode("utf-8")
+        meta = self.meta[self.meta_offsets[row]:self.meta_offsets[row + 1]].tobytes().decode("utf-8")
+        return Document(id=self.doc_id(row), page_content=text, metadata=json.loads(meta))
+
+
+class ChunkStoreDocstore(Docstore):
+    """LangChain docstore backed by a ChunkStore. Documents are decoded on lookup."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self.store.row_of(search)
+        if row < 0:
+            return f"ID {search} not found."
+        return self.store.document(row)
+
+
+class ChunkStoreIdMapping(Mapping):
+    """index_to_docstore_id view over a ChunkStore (FAISS position -> docstore ID)."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def __getitem__(self, position: int) -> str:
+        position = int(position)
+        if not 0 <= position < len(self.store):
+            raise KeyError(position)
+        return self.store.doc_id(position)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.store)))
+
+
+def read_index_mmap(faiss_path: str) -> faiss.Index:
+    """
+    Reads a FAISS index read-only with memory-mapped storage where the installed faiss
+    supports it (IVF inverted lists; flat codes with IO_FLAG_MMAP_IFC), else reads it normally.
+    """
+    flags = faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    try:
+        return faiss.read_index(faiss_path, flags)
+    except RuntimeError as e:
+        logger.warning(f"Memory-mapped read of {faiss_path} failed, reading it into memory: {e}")
+        return faiss.read_index(faiss_path)
+
+
+def save_vector_db(vector_db: FAISS, index_dir: str, collection_name: str) -> None:
+    """Writes <collection>.faiss and the chunk store for a LangChain FAISS store."""
+    faiss.write_index(vector_db.index, os.path.join(index_dir, collection_name + ".faiss"))
+    write_chunk_store(index_dir, collection_name, vector_db.index_to_docstore_id, vector_db.docstore)
+
+
+def load_vector_db(index_dir: str, collection_name: str, embeddings: Embeddings, mmap: bool = True) -> FAISS:
+    """
+    Loads a LangChain FAISS store from index_dir. With mmap=True (serving) the index and
+    chunk store stay memory-mapped and read-only; with mmap=False (building) they are
+    copied into a mutable index and InMemoryDocstore. Indexes saved before the chunk store
+    existed are read from their .pkl.
+    """
+    if not chunk_store_exists(index_dir, collection_name):
+        return FAISS.load_local(
+            folder_path=index_dir,
+            embeddings=embeddings,
+            index_name=collection_name,
+            allow_dangerous_deserialization=True # Pre-chunk-store snapshots are pickled
+        )
+
+    faiss_path = os.path.join(index_dir, collection_name + ".faiss")
+    store = ChunkStore(index_dir, collection_name)
+    if mmap:
+        return FAISS(
+            embedding_function=embeddings,
+            index=read_index_mmap(faiss_path),
+            docstore=ChunkStoreDocstore(store),
+            index_to_docstore_id=ChunkStoreIdMapping(store),
+        )
+
+    index_to_docstore_id = {row: store.doc_id(row) for row in range(len(store))}
+    docstore = InMemoryDocstore({doc_id: store.document(row) for row, doc_id in index_to_docstore_id.items()})
+    return FAISS(
+        embedding_function=embeddings,
+        index=faiss.read_index(faiss_path),
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
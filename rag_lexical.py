@@ -0,0 +1,147 @@
+import os
+import re
+import math
+import logging
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# BM25 index written next to <collection>.faiss in every snapshot. Rows are FAISS positions,
+# so a lexical hit resolves through the same index_to_docstore_id map as a vector hit.
+#   <collection>.bm25/terms.npy             vocabulary, sorted (fixed-width UTF-8 bytes)
+#   <collection>.bm25/postings_offsets.npy  start of each term's postings (V + 1 entries)
+#   <collection>.bm25/postings_rows.npy     rows containing the term, grouped by term
+#   <collection>.bm25/postings_tf.npy       term frequency in each of those rows
+#   <collection>.bm25/doc_lengths.npy       number of tokens in each row
+# Columns are memory-mapped read-only, like the chunk store (see rag_chunk_store.py).
+LEXICAL_INDEX_SUFFIX = ".bm25"
+LEXICAL_INDEX_COLUMNS = ("terms", "postings_offsets", "postings_rows", "postings_tf", "doc_lengths")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words, numbers and codes; "shl-opq32" is indexed as itself and as its parts
+_TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+_PART_RE = re.compile(r"[-./]")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its me my of on or "
+    "our tell that the their there this to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens of a text without stopwords. Compound tokens are followed by their parts."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.casefold()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if _PART_RE.search(token):
+            tokens.extend(part for part in _PART_RE.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+def lexical_index_dir(index_dir: str, collection_name: str) -> str:
+    return os.path.join(index_dir, collection_name + LEXICAL_INDEX_SUFFIX)
+
+
+def lexical_index_files(index_dir: str, collection_name: str) -> List[str]:
+    """Paths of the lexical index's column files."""
+    store_dir = lexical_index_dir(index_dir, collection_name)
+    return [os.path.join(store_dir, column + ".npy") for column in LEXICAL_INDEX_COLUMNS]
+
+
+def lexical_index_exists(index_dir: str, collection_name: str) -> bool:
+    return all(os.path.exists(path) for path in lexical_index_files(index_dir, collection_name))
+
+
+def write_lexical_index(index_dir: str, collection_name: str, texts: List[str]) -> None:
+    """Builds the BM25 postings for texts (row i = FAISS position i) and writes them."""
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doc_lengths = np.zeros(len(texts), dtype=np.float32)
+    for row, text in enumerate(texts):
+        counts = Counter(tokenize(text or ""))
+        doc_lengths[row] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((row, tf))
+
+    terms = sorted(postings)
+    encoded_terms = [term.encode("utf-8") for term in terms]
+    width = max((len(b) for b in encoded_terms), default=1)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    rows, tfs = [], []
+    for i, term in enumerate(terms):
+        term_postings = postings[term]
+        offsets[i + 1] = offsets[i] + len(term_postings)
+        rows.extend(row for row, _ in term_postings)
+        tfs.extend(tf for _, tf in term_postings)
+
+    columns = {
+        # UTF-8 byte order matches str order, so the sorted terms stay sorted once encoded
+        "terms": np.array(encoded_terms, dtype=f"S{width}"),
+        "postings_offsets": offsets,
+        "postings_rows": np.array(rows, dtype=np.int32),
+        "postings_tf": np.array(tfs, dtype=np.float32),
+        "doc_lengths": doc_lengths,
+    }
+    store_dir = lexical_index_dir(index_dir, collection_name)
+    os.makedirs(store_dir, exist_ok=True)
+    for column in LEXICAL_INDEX_COLUMNS:
+        np.save(os.path.join(store_dir, column + ".npy"), columns[column], allow_pickle=False)
+    logger.info(f"Wrote BM25 index for '{collection_name}' ({len(texts)} chunks, {len(terms)} terms).")
+
+
+class LexicalIndex:
+    """Read-only, memory-mapped BM25 index over the chunks of one snapshot."""
+
+    def __init__(self, index_dir: str, collection_name: str):
+        store_dir = lexical_index_dir(index_dir, collection_name)
+        for column in LEXICAL_INDEX_COLUMNS:
+            setattr(self, column, np.load(os.path.join(store_dir, column + ".npy"), mmap_mode="r", allow_pickle=False))
+        self.num_docs = len(self.doc_lengths)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.num_docs else 0.0
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        encoded = term.encode("utf-8")
+        if len(encoded) <= self.terms.dtype.itemsize:
+            key = np.array(encoded, dtype=self.terms.dtype)
+            i = int(np.searchsorted(self.terms, key))
+            if i < len(self.terms) and self.terms[i] == key:
+                start, end = self.postings_offsets[i], self.postings_offsets[i + 1]
+                return self.postings_rows[start:end], self.postings_tf[start:end]
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+    def document_frequency(self, term: str) -> int:
+        """Number of rows containing the (already tokenized) term."""
+        return len(self._postings(term)[0])
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float, float]]:
+        """
+        Top-k rows for a query as (row, bm25_score, coverage) tuples, best first. coverage
+        is the fraction of the query's distinct terms that occur in the row.
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms or self.num_docs == 0:
+            return []
+
+        all_rows, all_scores = [], []
+        for term in query_terms:
+            rows, tf = self._postings(term)
+            if len(rows) == 0:
+                continue
+            df = len(rows)
+            idf = math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_lengths[rows] / self.avg_doc_length)
+            all_rows.append(np.asarray(rows))
+            all_scores.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+        if not all_rows:
+            return []
+
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        matched_terms = np.bincount(inverse)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(int(rows[i]), float(scores[i]), float(matched_terms[i]) / len(query_terms)) for i in top]
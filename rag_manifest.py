@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def manifest_path(db_path: str, collection_name: str) -> str:
+    """Path of the ingestion manifest saved next to <collection_name>.faiss."""
+    return os.path.join(db_path, collection_name + MANIFEST_SUFFIX)
+
+
+def file_content_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_text_hash(text: str) -> str:
+    """SHA-256 of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestionManifest:
+    """
+    Per-RAG record of what has been embedded, used to make ingestion incremental and as the
+    filename -> doc IDs side index for version deletion (no docstore scans per file).
+
+    For every original_filename it stores the hash of the file content that was last
+    ingested, its version_timestamp and the (doc_id, chunk_hash) pairs of its chunks
+    in the FAISS docstore. A file whose content hash is unchanged can be skipped, and
+    chunks of an edited file whose text is unchanged can keep their existing vectors.
+
+    Layout on disk (<collection_name>.manifest.json):
+        {"version": 1, "files": {"mydoc.pdf": {"content_hash": "...", "version_timestamp": "...",
+                                               "chunks": [["<doc_id>", "<chunk_hash>"], ...]}}}
+    """
+
+    def __init__(self, path: str, files: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = files or {}
+
+    @classmethod
+    def load(cls, db_path: str, collection_name: str) -> "IngestionManifest":
+        path = manifest_path(db_path, collection_name)
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                logger.warning(f"Ignoring manifest {path} with unsupported version {data.get('version')}.")
+                return cls(path)
+            return cls(path, data.get("files", {}))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Failed to read manifest {path}, starting from an empty one: {e}")
+            return cls(path)
+
+    @classmethod
+    def from_docstore(cls, db_path: str, collection_name: str, docstore_dict: Dict[str, Any]) -> "IngestionManifest":
+        """
+        Builds a manifest for an index created before manifests existed, by grouping the
+        docstore's chunks by original_filename. This is the only full docstore scan; the
+        content hashes are unknown, so every bootstrapped file is re-ingested on its next upload.
+        """
+        manifest = cls(manifest_path(db_path, collection_name))
+        for doc_id, doc_obj in docstore_dict.items():
+            meta = doc_obj.metadata or {}
+            filename = meta.get("original_filename")
+            if not filename:
+                continue
+            entry = manifest.files.setdefault(
+                filename, {"content_hash": None, "version_timestamp": "", "chunks": []}
+            )
+            entry["chunks"].append([doc_id, chunk_text_hash(doc_obj.page_content or "")])
+            entry["version_timestamp"] = max(entry["version_timestamp"], meta.get("version_timestamp") or "")
+        logger.info(f"Bootstrapped manifest for '{collection_name}' from docstore: {len(manifest.files)} files.")
+        return manifest
+
+    def get_file(self, filename: str) -> Optional[Dict[str, Any]]:
+        return self.files.get(filename)
+
+    def file_chunks(self, filename: str) -> List[Tuple[str, str]]:
+        """(doc_id, chunk_hash) pairs recorded for a file."""
+        entry = self.files.get(filename)
+        return [tuple(chunk) for chunk in entry["chunks"]] if entry else []
+
+    def doc_ids(self, filename: str) -> List[str]:
+        """Doc IDs of a file's chunks."""
+        return [doc_id for doc_id, _ in self.file_chunks(filename)]
+
+    def version_timestamp(self, filename: str) -> Optional[str]:
+        entry = self.files.get(filename)
+        return entry["version_timestamp"] if entry else None
+
+    def set_file(
+        self,
+        filename: str,
+        content_hash: Optional[str],
+        version_timestamp: str,
+        chunks: List[Tuple[str, str]],
+    ) -> None:
+        """Records a file. A content_hash of None forces the file to be re-ingested next time."""
+        self.files[filename] = {
+            "content_hash": content_hash,
+            "version_timestamp": version_timestamp,
+            "chunks": [list(chunk) for chunk in chunks],
+        }
+
+    def remove_file(self, filename: str) -> None:
+        self.files.pop(filename, None)
+
+    def clear(self) -> None:
+        self.files = {}
+
+    def save(self) -> None:
+        """Writes the manifest atomically (temp file + rename)."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
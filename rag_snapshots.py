@@ -0,0 +1,134 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+import datetime
+from typing import List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Layout of a RAG directory (custom_rag/<rag_name>/):
+#   snapshots/<timestamp>_<id>/<collection>.faiss, .chunks/, .manifest.json   one directory per build
+#   <collection>.current                                                        name of the live snapshot
+# Builds write a complete new snapshot directory and then atomically replace the pointer
+# file, so readers always see a matching index and chunk store: either the old one or the new one.
+# (Snapshots written before the chunk store existed hold a .pkl instead of .chunks/.)
+# Indexes built before snapshots existed live directly in the RAG directory and are still
+# read from there until the first snapshot is published; they are never deleted.
+SNAPSHOTS_DIR_NAME = "snapshots"
+POINTER_SUFFIX = ".current"
+# How long a superseded snapshot is kept for readers that resolved it just before a swap
+DEFAULT_GRACE_SECONDS = float(os.getenv("RAG_SNAPSHOT_GRACE_SECONDS", "600"))
+
+
+def _pointer_path(db_path: str, collection_name: str) -> str:
+    return os.path.join(db_path, collection_name + POINTER_SUFFIX)
+
+
+def _snapshots_root(db_path: str) -> str:
+    return os.path.join(db_path, SNAPSHOTS_DIR_NAME)
+
+
+def current_snapshot_name(db_path: str, collection_name: str) -> Optional[str]:
+    """Name of the published snapshot directory, or None if nothing has been published."""
+    try:
+        with open(_pointer_path(db_path, collection_name), "r") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return name or None
+
+
+def current_index_dir(db_path: str, collection_name: str) -> str:
+    """
+    Directory holding the live <collection>.faiss/.pkl pair: the published snapshot if
+    there is one, otherwise db_path itself (indexes built before snapshots existed).
+    """
+    name = current_snapshot_name(db_path, collection_name)
+    if name is None:
+        return db_path
+    return os.path.join(_snapshots_root(db_path), name)
+
+
+def rag_index_exists(db_path: str, collection_name: str) -> bool:
+    """Whether a FAISS index has been built for a RAG (a couple of stats, no directory scan)."""
+    index_dir = current_index_dir(db_path, collection_name)
+    return os.path.exists(os.path.join(index_dir, collection_name + ".faiss"))
+
+
+def new_snapshot_dir(db_path: str) -> str:
+    """Creates and returns an empty, uniquely named snapshot directory. Names sort by creation time."""
+    name = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:8]}"
+    path = os.path.join(_snapshots_root(db_path), name)
+    os.makedirs(path)
+    return path
+
+
+def publish_snapshot(db_path: str, collection_name: str, snapshot_dir: str) -> None:
+    """Makes snapshot_dir the live index by atomically replacing the pointer file."""
+    pointer_path = _pointer_path(db_path, collection_name)
+    tmp_path = f"{pointer_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(os.path.basename(snapshot_dir))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, pointer_path)
+    logger.info(f"Published snapshot '{os.path.basename(snapshot_dir)}' for '{collection_name}'.")
+
+
+def _collection_snapshot_names(snapshots_root: str, collection_name: str) -> List[str]:
+    """Snapshots holding a build of collection_name, oldest first. The snapshots directory is
+    shared by every collection of the RAG directory, so other collections' builds are skipped."""
+    try:
+        names = sorted(os.listdir(snapshots_root))
+    except FileNotFoundError:
+        return []
+    return [name for name in names if os.path.exists(os.path.join(snapshots_root, name, collection_name + ".faiss"))]
+
+
+def _published_snapshot_names(db_path: str) -> Set[str]:
+    """Snapshots currently named by any collection's pointer file."""
+    names = set()
+    for entry in os.listdir(db_path):
+        if entry.endswith(POINTER_SUFFIX):
+            name = current_snapshot_name(db_path, entry[:-len(POINTER_SUFFIX)])
+            if name:
+                names.add(name)
+    return names
+
+
+def garbage_collect_snapshots(
+    db_path: str, collection_name: str, grace_seconds: float = DEFAULT_GRACE_SECONDS
+) -> List[str]:
+    """
+    Deletes snapshots that were superseded more than grace_seconds ago. A snapshot counts
+    as superseded when the next newer snapshot of the same collection was created. Only this collection's snapshots are candidates; snapshots
+    newer than the live one (e.g. a build in progress) and snapshots any collection's pointer
+    names are never touched. Index files of the pre-snapshot layout are left in place: they
+    are no longer read once a snapshot is published, and may be files checked into the repo.
+    Returns the names of the removed snapshots.
+    """
+    current = current_snapshot_name(db_path, collection_name)
+    if current is None:
+        return []
+
+    snapshots_root = _snapshots_root(db_path)
+    names = _collection_snapshot_names(snapshots_root, collection_name)
+    published = _published_snapshot_names(db_path)
+    now = time.time()
+    removed = []
+    for i, name in enumerate(names):
+        if name >= current:
+            break
+        if name in published:
+            continue
+        successor_path = os.path.join(snapshots_root, names[i + 1])
+        if now - os.path.getmtime(successor_path) < grace_seconds:
+            continue
+        shutil.rmtree(os.path.join(snapshots_root, name), ignore_errors=True)
+        removed.append(name)
+
+    if removed:
+        logger.info(f"Garbage-collected superseded snapshots of '{collection_name}': {removed}")
+    return removed
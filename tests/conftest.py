@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The agent package is imported from the repository root, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the session database out of the working tree and give the Google clients a key
+os.environ.setdefault("SESSION_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="agent_sessions_"), "agent_sessions.db"))
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
@@ -0,0 +1,62 @@
+import faiss
+import numpy as np
+import pytest
+
+from rag_ann import (
+    AUTO_HNSW_MIN_CHUNKS, AUTO_IVF_MIN_CHUNKS, AUTO_IVFPQ_MIN_CHUNKS, PQ_NBITS, TRAINING_POINTS_PER_CENTROID,
+    build_ann_index, choose_index_type, evaluate_index, index_vectors, load_index_meta, save_index_meta, to_flat_index,
+)
+
+
+def _vectors(count, dimension=16, seed=0):
+    return np.random.default_rng(seed).random((count, dimension), dtype="float32")
+
+
+def test_auto_picks_index_type_by_chunk_count():
+    assert choose_index_type(AUTO_HNSW_MIN_CHUNKS - 1) == "flat"
+    assert choose_index_type(AUTO_HNSW_MIN_CHUNKS) == "hnsw"
+    assert choose_index_type(AUTO_IVF_MIN_CHUNKS) == "ivf"
+    assert choose_index_type(AUTO_IVFPQ_MIN_CHUNKS) == "ivfpq"
+    _, params = build_ann_index(_vectors(50), "auto")
+    assert params["index_type"] == "flat"
+
+
+def test_untrainable_types_fall_back_to_simpler_ones():
+    _, params = build_ann_index(_vectors(3 * TRAINING_POINTS_PER_CENTROID), "ivfpq")
+    assert params["index_type"] == "ivf" and params["nlist"] == 3
+    _, params = build_ann_index(_vectors(TRAINING_POINTS_PER_CENTROID), "ivf")
+    assert params["index_type"] == "flat"
+    with pytest.raises(ValueError):
+        build_ann_index(_vectors(10), "lsh")
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf"])
+def test_built_index_keeps_row_order_and_reports_recall(index_type):
+    vectors = _vectors(2000)
+    index, params = build_ann_index(vectors, index_type)
+
+    assert params["index_type"] == index_type and index.ntotal == len(vectors)
+    np.testing.assert_array_equal(index_vectors(index), vectors)
+    np.testing.assert_array_equal(index_vectors(to_flat_index(index)), vectors)
+    # Each vector's nearest neighbour is itself, at its original position
+    _, ids = index.search(vectors[:20], 1)
+    assert ids[:, 0].tolist() == list(range(20))
+
+    report = evaluate_index(index, vectors, k=10, num_queries=100)
+    assert report["num_queries"] == 100 and report["k"] == 10
+    assert report["recall_at_k"] >= (1.0 if index_type == "flat" else 0.5)
+    assert report["ann_ms_per_query"] >= 0 and report["exact_ms_per_query"] >= 0
+
+
+def test_ivfpq_rebuilds_exactly_from_raw_vectors(tmp_path):
+    vectors = _vectors((1 << PQ_NBITS) * TRAINING_POINTS_PER_CENTROID, dimension=8)
+    index, params = build_ann_index(vectors, "ivfpq")
+    assert params["index_type"] == "ivfpq" and params["pq_m"] == 8
+
+    np.testing.assert_array_equal(index_vectors(to_flat_index(index, vectors)), vectors)
+    flat = to_flat_index(index)  # lossy PQ reconstruction without the raw vectors
+    assert isinstance(flat, faiss.IndexFlat) and flat.ntotal == len(vectors)
+
+    save_index_meta(str(tmp_path), "docs", params)
+    assert load_index_meta(str(tmp_path), "docs") == params
+    assert load_index_meta(str(tmp_path), "missing") == {}
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from rag_chunk_store import (
+    ChunkStore, ChunkStoreDocstore, ChunkStoreIdMapping, chunk_store_exists, chunk_store_files,
+    load_vector_db, save_vector_db, write_chunk_store,
+)
+
+TEXTS = ["alpha", "Größe café ünïcode", "", "gamma ray burst"]
+
+
+class FixedEmbeddings(Embeddings):
+    def embed_query(self, text):
+        return [float(len(text)), float(text.count("a")), 1.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def _store():
+    embeddings = FixedEmbeddings()
+    ids = ["doc-b", "doc-a", "a-much-longer-document-id", "doc-c"]
+    metadatas = [{"original_filename": f"{i}.pdf", "page": i, "start_index": 10 * i} for i in range(len(TEXTS))]
+    return FAISS.from_embeddings(
+        list(zip(TEXTS, embeddings.embed_documents(TEXTS))), embeddings, metadatas=metadatas, ids=ids
+    ), ids
+
+
+def test_chunk_store_round_trips_texts_metadata_and_ids(tmp_path):
+    vector_db, ids = _store()
+    save_vector_db(vector_db, str(tmp_path), "docs")
+    assert chunk_store_exists(str(tmp_path), "docs")
+    assert not (tmp_path / "docs.pkl").exists()
+
+    store = ChunkStore(str(tmp_path), "docs")
+    assert all(isinstance(getattr(store, column), np.memmap) for column in ("ids", "text", "meta"))
+    assert [store.doc_id(row) for row in range(len(store))] == ids
+    for row, doc_id in enumerate(ids):
+        assert store.row_of(doc_id) == row
+        document = store.document(row)
+        assert document.id == doc_id and document.page_content == TEXTS[row]
+        assert document.metadata == {"original_filename": f"{row}.pdf", "page": row, "start_index": 10 * row}
+    assert store.row_of("missing") == -1
+    assert store.row_of("x" * 100) == -1  # longer than any stored ID
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_loaded_store_searches_like_the_original(tmp_path, mmap):
+    vector_db, ids = _store()
+    save_vector_db(vector_db, str(tmp_path), "docs")
+    loaded = load_vector_db(str(tmp_path), "docs", FixedEmbeddings(), mmap=mmap)
+
+    if mmap:
+        assert isinstance(loaded.docstore, ChunkStoreDocstore)
+        assert isinstance(loaded.index_to_docstore_id, ChunkStoreIdMapping)
+        assert list(loaded.index_to_docstore_id) == list(range(len(ids)))
+        with pytest.raises(KeyError):
+            loaded.index_to_docstore_id[len(ids)]
+    else:
+        assert loaded.docstore._dict.keys() == set(ids)
+    for text in TEXTS:
+        expected = vector_db.similarity_search(text, k=2)
+        assert loaded.similarity_search(text, k=2) == expected
+
+
+def test_missing_docstore_entry_is_rejected(tmp_path):
+    vector_db, ids = _store()
+    del vector_db.docstore._dict[ids[1]]
+    with pytest.raises(ValueError):
+        write_chunk_store(str(tmp_path), "docs", vector_db.index_to_docstore_id, vector_db.docstore)
+
+
+def test_indexes_without_a_chunk_store_load_from_pickle(tmp_path):
+    vector_db, ids = _store()
+    vector_db.save_local(str(tmp_path), index_name="docs")
+    assert not any((tmp_path / path).exists() for path in chunk_store_files(str(tmp_path), "docs"))
+
+    loaded = load_vector_db(str(tmp_path), "docs", FixedEmbeddings())
+    assert loaded.docstore.search(ids[0]) == vector_db.docstore.search(ids[0])
@@ -0,0 +1,63 @@
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from rag_builder import compact_vector_db, index_dead_stats
+from rag_manifest import IngestionManifest
+
+
+class FixedEmbeddings(Embeddings):
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def _store(texts):
+    embeddings = FixedEmbeddings()
+    ids = [f"id-{i}" for i in range(len(texts))]
+    metadatas = [{"original_filename": "a.pdf" if i % 2 == 0 else "b.pdf"} for i in range(len(texts))]
+    vector_db = FAISS.from_embeddings(
+        list(zip(texts, embeddings.embed_documents(texts))), embeddings, metadatas=metadatas, ids=ids
+    )
+    return vector_db, ids
+
+
+def test_dead_stats_count_dead_vectors_and_orphaned_docs():
+    vector_db, ids = _store(["a", "bb", "ccc", "dddd"])
+    assert index_dead_stats(vector_db) == {"live": 4, "dead_vectors": 0, "orphaned_docs": 0, "dead_ratio": 0.0}
+
+    # A vector whose docstore entry is gone, and a docstore entry no vector points to
+    del vector_db.docstore._dict[ids[0]]
+    vector_db.docstore._dict["orphan"] = Document(page_content="orphan")
+    stats = index_dead_stats(vector_db)
+    assert stats["live"] == 3 and stats["dead_vectors"] == 1 and stats["orphaned_docs"] == 1
+    assert stats["dead_ratio"] == 2 / 5
+
+
+def test_compaction_keeps_live_vectors_and_prunes_the_manifest(tmp_path):
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    vector_db, ids = _store(texts)
+    live_vectors = {doc_id: vector_db.index.reconstruct(i) for i, doc_id in vector_db.index_to_docstore_id.items()}
+    manifest = IngestionManifest(str(tmp_path / "docs.manifest.json"))
+    manifest.set_file("a.pdf", "hash-a", "1", [(ids[0], "h0"), (ids[2], "h2"), (ids[4], "h4")])
+    manifest.set_file("b.pdf", "hash-b", "1", [(ids[1], "h1"), (ids[3], "h3")])
+
+    del vector_db.docstore._dict[ids[2]]
+    vector_db.docstore._dict["orphan"] = Document(page_content="orphan")
+    before = compact_vector_db(vector_db, manifest)
+
+    assert before["dead_vectors"] == 1 and before["orphaned_docs"] == 1
+    assert index_dead_stats(vector_db)["dead_ratio"] == 0.0
+    assert vector_db.index.ntotal == 4
+    assert sorted(vector_db.docstore._dict) == sorted(set(ids) - {ids[2]})
+    for position, doc_id in vector_db.index_to_docstore_id.items():
+        np.testing.assert_array_equal(vector_db.index.reconstruct(position), live_vectors[doc_id])
+    assert vector_db.similarity_search("dddd", k=1)[0].page_content == "dddd"
+
+    # a.pdf lost a chunk, so it must be re-ingested; b.pdf is untouched
+    assert manifest.file_chunks("a.pdf") == [(ids[0], "h0"), (ids[4], "h4")]
+    assert manifest.get_file("a.pdf")["content_hash"] is None
+    assert manifest.get_file("b.pdf")["content_hash"] == "hash-b"
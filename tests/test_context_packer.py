@@ -0,0 +1,66 @@
+from langchain_core.documents import Document
+
+from multi_tool_agent.context_packer import CHARS_PER_TOKEN, TRUNCATION_MARKER, estimate_tokens, pack_context
+
+PAGE = "".join(f"Sentence number {i:02d} of the page. " for i in range(40))
+
+
+def _chunk(start, length, filename="a.pdf", page=0, version="v1"):
+    return Document(
+        page_content=PAGE[start:start + length],
+        metadata={"original_filename": filename, "page": page, "version_timestamp": version, "start_index": start},
+    )
+
+
+def test_overlapping_and_adjacent_chunks_are_merged_once():
+    # Retrieved out of order: [200, 400) ranks first, [100, 250) overlaps it, [400, 500) touches it
+    documents = [_chunk(200, 200), _chunk(100, 150), _chunk(400, 100), _chunk(150, 50)]
+    context, stats = pack_context(documents, token_budget=10_000)
+
+    assert context == f"From a.pdf (page 1): {PAGE[100:500]}"
+    assert stats["chunks"] == 4 and stats["segments"] == 1 and not stats["truncated"]
+    assert stats["packed_tokens"] == estimate_tokens(context)
+    assert stats["tokens_saved"] == stats["raw_tokens"] - stats["packed_tokens"] > 0
+
+
+def test_chunks_of_other_pages_versions_or_without_offsets_are_kept_apart():
+    documents = [
+        _chunk(0, 100),
+        _chunk(0, 100, page=1),
+        _chunk(50, 100, version="v2"),
+        Document(page_content="No offsets here.", metadata={"source": "notes.docx"}),
+        _chunk(300, 50),
+    ]
+    context, stats = pack_context(documents, token_budget=10_000)
+
+    parts = context.split("\n\n")
+    assert stats["segments"] == 5
+    # Segments follow the rank of their best chunk
+    assert parts[0] == f"From a.pdf (page 1): {PAGE[0:100]}"
+    assert parts[1] == f"From a.pdf (page 2): {PAGE[0:100]}"
+    assert parts[2] == f"From a.pdf (page 1): {PAGE[50:150]}"
+    assert parts[3] == "From notes.docx: No offsets here."
+    assert parts[4] == f"From a.pdf (page 1): {PAGE[300:350]}"
+
+
+def test_disagreeing_text_at_the_same_offsets_is_not_merged():
+    first = _chunk(0, 100)
+    second = Document(page_content="x" * 100, metadata=dict(first.metadata, start_index=50))
+    _, stats = pack_context([first, second], token_budget=10_000)
+    assert stats["segments"] == 2
+
+
+def test_budget_truncates_the_last_segment_and_drops_the_rest():
+    documents = [_chunk(0, 200), _chunk(600, 200), _chunk(1000, 200)]
+    budget = estimate_tokens(f"From a.pdf (page 1): {PAGE[0:200]}") + 20
+    context, stats = pack_context(documents, token_budget=budget)
+
+    assert stats["truncated"] and stats["segments"] == 2
+    assert stats["packed_tokens"] <= budget
+    assert context.endswith(TRUNCATION_MARKER)
+    assert PAGE[1000:1200] not in context
+
+    # Too little room left for even the label of the next segment
+    context, stats = pack_context(documents, token_budget=budget - 19)
+    assert stats["segments"] == 1 and stats["truncated"]
+    assert len(context) <= (budget - 19) * CHARS_PER_TOKEN
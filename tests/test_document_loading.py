@@ -0,0 +1,36 @@
+import os
+
+from pypdf import PdfWriter
+
+import rag_builder
+from rag_builder import load_documents
+
+
+def _pdf(path, pages: int) -> str:
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(100, 100)
+    writer.write(str(path))
+    return str(path)
+
+
+def test_process_pool_splits_large_pdfs_and_keeps_file_order(tmp_path, caplog):
+    large = _pdf(tmp_path / "large.pdf", rag_builder.LARGE_PDF_PAGE_THRESHOLD + 5)
+    small = _pdf(tmp_path / "small.pdf", 2)
+    unsupported = tmp_path / "notes.txt"
+    unsupported.write_text("not parsed")
+
+    with caplog.at_level("INFO", logger="rag_builder"):
+        parallel = load_documents([large, str(unsupported), small], jobs=2)
+
+    # The large PDF is spread over page-range tasks in spawned workers
+    pages = rag_builder.LARGE_PDF_PAGE_THRESHOLD + 5
+    ranges = -(-pages // rag_builder.PDF_PAGES_PER_TASK)
+    assert f"as {ranges + 2} tasks with 2 worker processes" in caplog.text
+    assert [doc.metadata["page"] for doc in parallel[0]] == list(range(pages))
+    assert parallel[1] == []
+    assert [doc.metadata["page"] for doc in parallel[2]] == [0, 1]
+    assert all(doc.metadata["source"] == os.path.abspath(large) for doc in parallel[0])
+
+    sequential = load_documents([large, str(unsupported), small], jobs=1)
+    assert [len(docs) for docs in sequential] == [len(docs) for docs in parallel]
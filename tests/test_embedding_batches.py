@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+from langchain_core.documents import Document
+
+import rag_builder
+from rag_builder import _embed_batch_with_retry, embed_chunks_in_batches
+
+
+class RateLimitedEmbeddings:
+    """Fails the first `failures` calls with a quota error, then embeds each text as [len(text)]."""
+
+    def __init__(self, failures=0, error="429 Resource exhausted: quota exceeded", fail_texts=()):
+        self.failures = failures
+        self.error = error
+        self.fail_texts = set(fail_texts)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError(self.error)
+        if self.fail_texts & set(texts):
+            raise ValueError("invalid input")
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(rag_builder.time, "sleep", delays.append)
+    monkeypatch.setattr(rag_builder.random, "uniform", lambda a, b: 0.0)
+    return delays
+
+
+def test_rate_limits_are_retried_with_exponential_backoff(sleeps):
+    embeddings = RateLimitedEmbeddings(failures=3)
+    assert _embed_batch_with_retry(embeddings, ["ab", "c"], batch_number=0, max_retries=5) == [[2.0], [1.0]]
+    assert sleeps == [1.0, 2.0, 4.0]
+
+
+def test_retries_stop_after_max_retries(sleeps):
+    with pytest.raises(RuntimeError):
+        _embed_batch_with_retry(RateLimitedEmbeddings(failures=10), ["a"], batch_number=0, max_retries=2)
+    assert sleeps == [1.0, 2.0]
+
+
+def test_other_errors_are_not_retried(sleeps):
+    embeddings = RateLimitedEmbeddings(failures=1, error="400 invalid argument")
+    with pytest.raises(RuntimeError):
+        _embed_batch_with_retry(embeddings, ["a"], batch_number=0, max_retries=5)
+    assert sleeps == [] and len(embeddings.calls) == 1
+
+
+def test_batches_keep_chunk_order_and_skip_failed_batches(sleeps):
+    chunks = [Document(page_content="x" * (i + 1), metadata={"original_filename": f"f{i // 3}"}) for i in range(10)]
+    embeddings = RateLimitedEmbeddings(failures=1, fail_texts=["x" * 5])
+    events = []
+
+    embedded = embed_chunks_in_batches(chunks, embeddings, batch_size=3, concurrency=3, progress_callback=events.append)
+
+    # Batch 1 (chunks 3-5) holds the invalid text and is left out; the rest keep their order
+    assert [chunk.page_content for chunk, _ in embedded] == [c.page_content for i, c in enumerate(chunks) if i not in (3, 4, 5)]
+    assert all(vector == [float(len(chunk.page_content))] for chunk, vector in embedded)
+    assert max(len(call) for call in embeddings.calls) <= 3
+    assert events[-1] == {"stage": "embedding", "chunks_done": 10, "chunks_total": 10}
@@ -0,0 +1,25 @@
+import sqlite3
+
+from multi_tool_agent import embedding_cache
+from multi_tool_agent.embedding_cache import QueryEmbeddingCache
+
+
+def _rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+
+def test_expired_rows_are_purged_on_open_and_on_a_write_cadence(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "embeddings.db")
+    cache = QueryEmbeddingCache(ttl_seconds=-1, db_path=db_path)  # everything is expired once written
+    monkeypatch.setattr(embedding_cache, "PURGE_EVERY_WRITES", 5)
+    for i in range(4):
+        cache.put("model", f"question {i}", [0.1, 0.2])
+    assert _rows(db_path) == 4
+    cache.put("model", "question 4", [0.1, 0.2])
+    assert _rows(db_path) == 0
+
+    cache.put("model", "question 5", [0.1, 0.2])
+    assert _rows(db_path) == 1
+    QueryEmbeddingCache(ttl_seconds=-1, db_path=db_path)
+    assert _rows(db_path) == 0
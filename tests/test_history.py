@@ -0,0 +1,94 @@
+from google.genai import types
+
+from multi_tool_agent.history import (
+    FOREIGN_EVENT_PREFIX, HistoryManager, content_tokens, split_turns, summarize_turn,
+)
+
+
+def _user(text):
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def _model(text):
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+def _tool_turn(i, output_chars=40):
+    """A question, a tool call, its response and the answer."""
+    return [
+        _user(f"Question {i}?"),
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(id=f"call-{i}", name="rag_answer", args={"q": i}))]),
+        types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(
+            id=f"call-{i}", name="rag_answer", response={"result": "r" * output_chars},
+        ))]),
+        _model(f"Answer {i}."),
+    ]
+
+
+def _conversation(turns, output_chars=40):
+    return [content for i in range(turns) for content in _tool_turn(i, output_chars)]
+
+
+def test_turns_start_at_user_messages_only():
+    contents = _conversation(2) + [_user(f"{FOREIGN_EVENT_PREFIX} [other_agent] said: hi")]
+    turns = split_turns(contents)
+    # Tool responses and other agents' messages stay in the turn that caused them
+    assert [len(turn) for turn in turns] == [4, 5]
+    assert summarize_turn(turns[0]) == "- User: Question 0? | Tools: rag_answer | Assistant: Answer 0."
+
+
+def test_old_turns_are_folded_into_a_summary():
+    manager = HistoryManager(max_turns=2, token_budget=100_000)
+    contents = _conversation(5)
+    bounded, info = manager.bound_history(contents, key=("app", "u", "s", "agent"))
+
+    assert info["turns"] == 5 and info["folded"] == 3 and info["compacted"] == 0
+    assert bounded[0].parts[0].text.splitlines()[1:] == [
+        f"- User: Question {i}? | Tools: rag_answer | Assistant: Answer {i}." for i in range(3)
+    ]
+    assert bounded[1:] == contents[-8:]
+    assert info["tokens_after"] == sum(content_tokens(content) for content in bounded)
+
+
+def test_summary_lines_are_cached_per_session_and_extended():
+    manager = HistoryManager(max_turns=1, token_budget=100_000)
+    key = ("app", "u", "s", "agent")
+    manager.bound_history(_conversation(3), key)
+    manager.bound_history(_conversation(4), key)
+    assert (manager.summary_misses, manager.summary_hits) == (1, 1)
+
+    # A shorter history (e.g. a rewound session) does not reuse the longer cached prefix
+    bounded, _ = manager.bound_history(_conversation(2), key)
+    assert manager.summary_misses == 2
+    assert bounded[0].parts[0].text.count("- User:") == 1
+
+    manager.bound_history(_conversation(3), None)
+    assert manager.stats()["cached_summaries"] == 1
+
+
+def test_summary_cache_is_bounded():
+    manager = HistoryManager(max_turns=1, token_budget=100_000, cache_max_entries=2)
+    for session in ("a", "b", "c"):
+        manager.bound_history(_conversation(2), ("app", "u", session, "agent"))
+    assert manager.stats()["cached_summaries"] == 2
+    manager.bound_history(_conversation(2), ("app", "u", "a", "agent"))
+    assert manager.summary_misses == 4  # "a" was evicted
+
+
+def test_over_budget_compacts_earlier_tool_outputs_then_folds():
+    contents = _conversation(3, output_chars=2000)
+    current_turn_tokens = sum(content_tokens(content) for content in contents[-4:])
+
+    manager = HistoryManager(max_turns=3, token_budget=current_turn_tokens + 200)
+    bounded, info = manager.bound_history(contents)
+    assert info["folded"] == 0 and info["compacted"] == 2
+    assert "omitted" in bounded[2].parts[0].function_response.response
+    assert bounded[2].parts[0].function_response.id == "call-0"
+    # The current turn is never changed
+    assert bounded[-4:] == contents[-4:]
+    assert info["tokens_after"] <= manager.token_budget
+
+    manager = HistoryManager(max_turns=3, token_budget=current_turn_tokens + 30)
+    bounded, info = manager.bound_history(contents)
+    assert info["folded"] == 2
+    assert bounded[1:] == contents[-4:]
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+import httpx
+
+from multi_tool_agent import html_extract
+from multi_tool_agent.html_extract import extract_text
+
+PAGE = (
+    "<html><head><script>var x = 1;</script></head><body><nav>Menu</nav>"
+    "<p>First paragraph.</p><p>Second paragraph.</p><footer>Footer</footer></body></html>"
+)
+
+
+def _response(body: str, content_type: str = "text/html; charset=utf-8") -> httpx.Response:
+    data = body.encode()
+    chunks = [data[i:i + 16] for i in range(0, len(data), 16)]
+
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    return httpx.Response(200, headers={"Content-Type": content_type}, content=stream())
+
+
+def test_html_is_parsed_off_the_event_loop(monkeypatch):
+    feed_threads = set()
+    parse_chunk = html_extract._parse_chunk
+
+    def recording_parse_chunk(*args, **kwargs):
+        feed_threads.add(threading.get_ident())
+        return parse_chunk(*args, **kwargs)
+
+    monkeypatch.setattr(html_extract, "_parse_chunk", recording_parse_chunk)
+
+    async def run():
+        return threading.get_ident(), await extract_text(_response(PAGE), parser="html.parser")
+
+    loop_thread, (text, details) = asyncio.run(run())
+    assert "First paragraph." in text and "Second paragraph." in text
+    assert "Menu" not in text and "var x" not in text and "Footer" not in text
+    assert details["parser"] == "html.parser"
+    assert feed_threads and loop_thread not in feed_threads
+
+
+def test_plain_text_is_kept_verbatim():
+    text, details = asyncio.run(extract_text(_response("line one\nline two", "text/plain")))
+    assert "line one" in text and "line two" in text
+    assert details["parser"] == "text"
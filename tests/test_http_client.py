@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from multi_tool_agent.http_client import AsyncHttpClient
+
+
+@pytest.fixture
+def stub_server():
+    """Local HTTP/1.1 server that records the client port of every request."""
+    ports = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            ports.append(self.client_address[1])
+            body = b"ok"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", ports
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused_across_requests(stub_server):
+    base_url, ports = stub_server
+    client = AsyncHttpClient(http2=False)
+
+    async def run():
+        for i in range(5):
+            response = await client.get(f"{base_url}/page/{i}")
+            assert response.text == "ok"
+        await client.aclose()
+
+    asyncio.run(run())
+    assert len(ports) == 5
+    assert len(set(ports)) == 1  # one keep-alive connection served every request
+
+
+def test_per_host_limit_and_idle_hosts_are_dropped():
+    in_flight = {}
+    peak = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        in_flight[host] = in_flight.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200, text=host)
+
+    client = AsyncHttpClient(per_host_limit=2, http2=False, transport=httpx.MockTransport(handler))
+
+    async def run():
+        urls = [f"https://{host}.example/{i}" for host in ("a", "b") for i in range(8)]
+        responses = await asyncio.gather(*(client.get(url) for url in urls))
+        stats = client.stats()
+        await client.aclose()
+        return responses, stats
+
+    responses, stats = asyncio.run(run())
+    assert all(response.status_code == 200 for response in responses)
+    assert peak == {"a.example": 2, "b.example": 2}
+    assert stats["requests"] == 16
+    assert stats["active_hosts"] == 0  # no per-host state kept once a host is idle
@@ -0,0 +1,32 @@
+from multi_tool_agent.hybrid_retrieval import _is_lexical_match
+from rag_lexical import LexicalIndex, write_lexical_index
+
+TEXTS = [
+    "Error E1234 means the refund service timed out.",
+    "How do I reset my password? Open the account settings page.",
+    "Password rules: at least twelve characters.",
+    "Release v2.1 adds single sign-on.",
+]
+
+
+def _index(tmp_path):
+    write_lexical_index(str(tmp_path), "docs", TEXTS)
+    return LexicalIndex(str(tmp_path), "docs")
+
+
+def _matches(index, question):
+    return _is_lexical_match(question, index.search(question, 10), index)
+
+
+def test_identifier_lookups_skip_vector_search(tmp_path):
+    index = _index(tmp_path)
+    assert _matches(index, "E1234")
+    assert _matches(index, "what is v2.1")
+
+
+def test_short_natural_language_questions_still_fuse(tmp_path):
+    index = _index(tmp_path)
+    # Fully matched by one chunk, but nothing in it identifies that chunk the way a code does
+    assert index.search("reset password", 10)[0][2] >= 1.0
+    assert not _matches(index, "reset password")
+    assert not _matches(index, "refund service")
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from multi_tool_agent.index_cache import IndexRegistry
+
+
+def _write(path, content: str, mtime_ns=None):
+    with open(path, "w") as f:
+        f.write(content)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+class Loader:
+    def __init__(self, path):
+        self.path = path
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        with open(self.path) as f:
+            return f.read()
+
+
+def test_hits_until_mtime_or_size_changes(tmp_path):
+    path = str(tmp_path / "a.faiss")
+    _write(path, "v1", mtime_ns=1_000_000_000)
+    registry, loader = IndexRegistry(), Loader(path)
+
+    assert registry.get("a", (path,), loader) == "v1"
+    assert registry.get("a", (path,), loader) == "v1"
+    assert loader.calls == 1
+
+    _write(path, "v2", mtime_ns=2_000_000_000)  # same size, newer mtime
+    assert registry.get("a", (path,), loader) == "v2"
+    _write(path, "v333", mtime_ns=2_000_000_000)  # same mtime, new size
+    assert registry.get("a", (path,), loader) == "v333"
+    assert loader.calls == 3
+    assert registry.stats()["reloads"] == 2 and registry.stats()["hits"] == 1
+
+
+def test_new_snapshot_paths_reload_and_missing_files_drop_the_entry(tmp_path):
+    old_path, new_path = str(tmp_path / "old.faiss"), str(tmp_path / "new.faiss")
+    _write(old_path, "old")
+    _write(new_path, "new")
+    registry = IndexRegistry()
+    assert registry.get("a", (old_path,), Loader(old_path)) == "old"
+    assert registry.get("a", (new_path,), Loader(new_path)) == "new"
+
+    os.remove(new_path)
+    assert registry.get("a", (new_path,), Loader(new_path)) is None
+    assert registry.stats()["entries"] == 0
+
+
+def test_failed_reload_keeps_serving_the_loaded_value(tmp_path):
+    path = str(tmp_path / "a.faiss")
+    _write(path, "v1", mtime_ns=1_000_000_000)
+    registry = IndexRegistry()
+    registry.get("a", (path,), Loader(path))
+    _write(path, "v2", mtime_ns=2_000_000_000)
+
+    def broken():
+        raise OSError("truncated index")
+
+    assert registry.get("a", (path,), broken) == "v1"
+    with pytest.raises(OSError):
+        registry.get("b", (path,), broken)  # nothing to fall back to
+
+
+def test_lru_eviction_by_count_and_bytes(tmp_path):
+    paths = {}
+    for name, size in (("a", 10), ("b", 10), ("c", 30)):
+        paths[name] = str(tmp_path / f"{name}.faiss")
+        _write(paths[name], "x" * size)
+
+    registry = IndexRegistry(max_entries=2, max_bytes=0)
+    for name in ("a", "b"):
+        registry.get(name, (paths[name],), Loader(paths[name]))
+    registry.get("a", (paths["a"],), Loader(paths["a"]))  # a is now most recently used
+    registry.get("c", (paths["c"],), Loader(paths["c"]))
+    assert registry.stats()["keys"] == ["a", "c"]
+
+    registry = IndexRegistry(max_entries=0, max_bytes=25)
+    for name in ("a", "b", "c"):
+        registry.get(name, (paths[name],), Loader(paths[name]))
+    # c alone exceeds the byte budget but the entry just loaded is never evicted
+    stats = registry.stats()
+    assert stats["keys"] == ["c"] and stats["bytes"] == 30 and stats["evictions"] == 2
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+
+from ingestion_jobs import IngestionJobManager
+
+
+def _stage(folder, *names):
+    os.makedirs(folder, exist_ok=True)
+    for name in names:
+        with open(os.path.join(folder, name), "w") as f:
+            f.write(name)
+
+
+def _wait(manager, job_id):
+    for _ in range(200):
+        job = manager.get(job_id)
+        if job["finished_at"] is not None:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_failed_job_restores_staged_files(tmp_path):
+    staged = str(tmp_path / "alice_temp_uploads")
+    _stage(staged, "a.pdf", "b.pdf")
+    manager = IngestionJobManager(max_workers=1)
+
+    def failing_build(docs_folder, progress_callback):
+        raise RuntimeError("publish failed")
+
+    job = _wait(manager, manager.submit("alice", staged, failing_build)["job_id"])
+    assert job["status"] == "failed"
+    assert sorted(os.listdir(staged)) == ["a.pdf", "b.pdf"]
+    assert os.listdir(tmp_path) == ["alice_temp_uploads"]  # no job folder or lock file left
+
+
+def test_orphaned_job_folders_are_restored_on_startup(tmp_path):
+    orphan = tmp_path / ("alice_temp_uploads_job_" + "a" * 32)
+    _stage(str(orphan), "a.pdf")
+    _stage(str(tmp_path / "alice_temp_uploads"), "new.pdf")
+
+    recovered = IngestionJobManager(max_workers=1).recover_orphaned_jobs(str(tmp_path))
+
+    assert recovered == [str(orphan)]
+    assert sorted(os.listdir(tmp_path / "alice_temp_uploads")) == ["a.pdf", "new.pdf"]
+    assert not orphan.exists()
+
+
+def test_running_jobs_of_other_workers_are_not_recovered(tmp_path):
+    staged = str(tmp_path / "bob_temp_uploads")
+    _stage(staged, "a.pdf")
+    release = threading.Event()
+    worker = IngestionJobManager(max_workers=1)
+    job_id = worker.submit("bob", staged, lambda docs_folder, progress_callback: release.wait(5))["job_id"]
+
+    # A restarted worker starting up while the job runs elsewhere
+    assert IngestionJobManager(max_workers=1).recover_orphaned_jobs(str(tmp_path)) == []
+    release.set()
+    assert _wait(worker, job_id)["status"] == "completed"
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,168 @@
+import hashlib
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+import rag_builder
+from rag_manifest import IngestionManifest, chunk_text_hash, file_content_hash, manifest_path
+from rag_snapshots import current_index_dir
+
+PARAGRAPHS = [f"Paragraph {i} of the handbook: " + "x" * 20 for i in range(6)]
+
+
+class CountingEmbeddings:
+    """Deterministic 8-d vectors derived from the text; records every text it embeds."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255.0 for byte in digest[:8]]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _load_text_files(file_paths, jobs=1):
+    loaded = []
+    for path in file_paths:
+        with open(path) as f:
+            loaded.append([Document(page_content=f.read(), metadata={"source": path})])
+    return loaded
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    fake = CountingEmbeddings()
+    monkeypatch.setattr(rag_builder, "load_environment", lambda: None)
+    monkeypatch.setattr(rag_builder, "GoogleGenerativeAIEmbeddings", lambda model: fake)
+    monkeypatch.setattr(rag_builder, "load_documents", _load_text_files)
+    return fake
+
+
+def _stage(folder, name, paragraphs):
+    folder.mkdir(exist_ok=True)
+    (folder / name).write_text("\n\n".join(paragraphs))
+
+
+def _build(docs_folder, db_path):
+    return rag_builder.process_documents_and_build_db(
+        docs_folder=str(docs_folder), db_path=str(db_path), collection_name="docs",
+        embedding_model_name="fake", chunk_size=60, chunk_overlap=0, compaction_threshold=None,
+    )
+
+
+def _manifest(db_path):
+    return IngestionManifest.load(current_index_dir(str(db_path), "docs"), "docs")
+
+
+def test_manifest_round_trips_and_ignores_unknown_versions(tmp_path):
+    manifest = IngestionManifest(manifest_path(str(tmp_path), "docs"))
+    manifest.set_file("a.pdf", "hash-a", "20240101", [("id-1", "c1"), ("id-2", "c2")])
+    manifest.save()
+
+    loaded = IngestionManifest.load(str(tmp_path), "docs")
+    assert loaded.get_file("a.pdf")["content_hash"] == "hash-a"
+    assert loaded.file_chunks("a.pdf") == [("id-1", "c1"), ("id-2", "c2")]
+    assert loaded.file_chunks("missing.pdf") == []
+
+    with open(manifest.path, "w") as f:
+        f.write('{"version": 99, "files": {"a.pdf": {}}}')
+    assert IngestionManifest.load(str(tmp_path), "docs").files == {}
+
+
+def test_file_content_hash_matches_sha256(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"abc" * 1000)
+    assert file_content_hash(str(path), block_size=7) == hashlib.sha256(b"abc" * 1000).hexdigest()
+
+
+def test_unchanged_files_are_skipped_without_embedding(tmp_path, embeddings):
+    docs, db_path = tmp_path / "staged", tmp_path / "rag"
+    _stage(docs, "handbook.txt", PARAGRAPHS)
+    first = _build(docs, db_path)
+    assert first["files_processed"] == 1 and first["chunks_added"] == len(PARAGRAPHS)
+    entry = _manifest(db_path).get_file("handbook.txt")
+    assert entry["content_hash"] == file_content_hash(str(docs / "handbook.txt"))
+
+    embeddings.embedded.clear()
+    second = _build(docs, db_path)
+    assert second["files_skipped"] == 1 and second["files_processed"] == 0
+    assert embeddings.embedded == []
+
+
+def test_edited_file_reuses_vectors_of_unchanged_chunks(tmp_path, embeddings):
+    docs, db_path = tmp_path / "staged", tmp_path / "rag"
+    _stage(docs, "handbook.txt", PARAGRAPHS)
+    _build(docs, db_path)
+    old_ids = {chunk_hash: doc_id for doc_id, chunk_hash in _manifest(db_path).file_chunks("handbook.txt")}
+
+    edited = PARAGRAPHS[:-1] + ["A rewritten final paragraph."]
+    _stage(docs, "handbook.txt", edited)
+    embeddings.embedded.clear()
+    summary = _build(docs, db_path)
+
+    assert embeddings.embedded == ["A rewritten final paragraph."]
+    assert summary["chunks_reused"] == len(PARAGRAPHS) - 1 and summary["chunks_added"] == 1
+    new_chunks = _manifest(db_path).file_chunks("handbook.txt")
+    assert len(new_chunks) == len(edited)
+    for paragraph in PARAGRAPHS[:-1]:
+        chunk_hash = chunk_text_hash(paragraph)
+        assert (old_ids[chunk_hash], chunk_hash) in new_chunks
+
+
+def test_from_docstore_groups_chunks_by_original_filename(tmp_path):
+    docstore = {
+        "id-1": Document(page_content="one", metadata={"original_filename": "a.pdf", "version_timestamp": "2"}),
+        "id-2": Document(page_content="two", metadata={"original_filename": "a.pdf", "version_timestamp": "3"}),
+        "id-3": Document(page_content="three", metadata={"original_filename": "b.pdf", "version_timestamp": "1"}),
+        "id-4": Document(page_content="no filename", metadata={}),
+    }
+    manifest = IngestionManifest.from_docstore(str(tmp_path), "docs", docstore)
+
+    assert sorted(manifest.files) == ["a.pdf", "b.pdf"]
+    assert manifest.doc_ids("a.pdf") == ["id-1", "id-2"]
+    assert manifest.file_chunks("b.pdf") == [("id-3", chunk_text_hash("three"))]
+    assert manifest.version_timestamp("a.pdf") == "3"
+    # Content hashes are unknown, so bootstrapped files are never skipped
+    assert manifest.get_file("a.pdf")["content_hash"] is None
+
+
+def test_replaced_version_is_deleted_through_the_side_index(tmp_path, embeddings):
+    docs, db_path = tmp_path / "staged", tmp_path / "rag"
+    _stage(docs, "handbook.txt", PARAGRAPHS)
+    _stage(docs, "other.txt", ["Unrelated notes."])
+    _build(docs, db_path)
+    old_ids = set(_manifest(db_path).doc_ids("handbook.txt"))
+    other_ids = _manifest(db_path).doc_ids("other.txt")
+
+    (docs / "other.txt").unlink()
+    _stage(docs, "handbook.txt", ["Entirely new text."])
+    _build(docs, db_path)
+
+    index_dir = current_index_dir(str(db_path), "docs")
+    vector_db = rag_builder.load_vector_db(index_dir, "docs", embeddings, mmap=False)
+    new_ids = _manifest(db_path).doc_ids("handbook.txt")
+    assert set(vector_db.docstore._dict) == set(new_ids) | set(other_ids)
+    assert not old_ids & set(vector_db.docstore._dict)
+
+
+def test_index_without_manifest_is_bootstrapped_from_the_docstore(tmp_path, embeddings):
+    docs, db_path = tmp_path / "staged", tmp_path / "rag"
+    _stage(docs, "handbook.txt", PARAGRAPHS)
+    _build(docs, db_path)
+    os.remove(manifest_path(current_index_dir(str(db_path), "docs"), "docs"))
+
+    embeddings.embedded.clear()
+    summary = _build(docs, db_path)
+
+    # Re-ingested (hash unknown) but every chunk is matched to its bootstrapped vector
+    assert summary["files_processed"] == 1 and summary["chunks_reused"] == len(PARAGRAPHS)
+    assert embeddings.embedded == []
+    assert _manifest(db_path).get_file("handbook.txt")["content_hash"] is not None
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.genai import types
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from multi_tool_agent.memory_store import MEMORY_SCHEMA, SqliteMemoryService
+from multi_tool_agent.sqlite_db import SqliteDatabase
+
+
+def _session(session_id: str, texts, timestamp: float) -> Session:
+    events = [
+        Event(
+            id=f"{session_id}-{i}",
+            author="user",
+            timestamp=timestamp + i,
+            content=types.Content(role="user", parts=[types.Part(text=text)]),
+        )
+        for i, text in enumerate(texts)
+    ]
+    return Session(id=session_id, app_name="app", user_id="alice", events=events)
+
+
+def test_stats_totals_track_indexing_and_archiving(tmp_path):
+    db = SqliteDatabase(str(tmp_path / "memory.db"), MEMORY_SCHEMA)
+    service = SqliteMemoryService(db, embeddings=DeterministicFakeEmbedding(size=8), max_events_per_user=3)
+    now = time.time()
+
+    async def run():
+        await service.add_session_to_memory(_session("old", ["refund policy for orders", "shipping takes two days"], now - 100))
+        await service.add_session_to_memory(_session("new", ["reset my password", "password rules", "account locked"], now))
+        await service.add_session_to_memory(_session("new", ["reset my password"], now))  # nothing new
+
+    asyncio.run(run())
+    stats = service.stats()
+    # The older session was archived to keep the user within max_events_per_user
+    assert stats["indexed_events"] == 3 and stats["archived_events"] == 2
+    assert stats["archived_sessions"] == 1
+    assert {key: stats[key] for key in service._load_totals()} == service._load_totals()
@@ -0,0 +1,54 @@
+import pytest
+
+from multi_tool_agent.passage_ranker import PASSAGE_SEPARATOR, score_passages, split_passages, top_passages
+from rag_lexical import LexicalIndex, write_lexical_index
+
+FILLER = " ".join(f"Background sentence {i} about the company history." for i in range(30))
+PAGE = (
+    FILLER
+    + "\n\nThe refund window is thirty days from delivery. Refunds go to the original card.\n\n"
+    + FILLER
+    + " Shipping to Norway takes five business days."
+)
+
+
+def test_split_passages_keeps_sentences_whole_and_cuts_long_runs():
+    passages = split_passages(PAGE, target_chars=200)
+    assert all(len(passage) <= 2 * 200 for passage in passages)
+    assert any("The refund window is thirty days from delivery." in passage for passage in passages)
+    assert all(passage.endswith(".") for passage in passages)
+
+    unpunctuated = " ".join(["word"] * 500)
+    pieces = split_passages(unpunctuated, target_chars=100)
+    assert len(pieces) > 1 and all(len(piece) <= 200 for piece in pieces)
+    assert " ".join(pieces) == unpunctuated
+
+
+def test_scores_match_the_persisted_bm25_index(tmp_path):
+    passages = split_passages(PAGE, target_chars=200)
+    write_lexical_index(str(tmp_path), "passages", passages)
+    expected = {row: score for row, score, _ in LexicalIndex(str(tmp_path), "passages").search("refund card", k=len(passages))}
+
+    scores = score_passages("refund card", passages)
+    assert {i: float(s) for i, s in enumerate(scores) if s > 0} == pytest.approx(expected)
+    assert not score_passages("", passages).any()
+
+
+def test_top_passages_picks_matches_in_document_order_within_budget():
+    text, info = top_passages("refund window shipping norway", PAGE, max_chars=1000)
+
+    assert info["matched"] and info["selected"] == 2 < info["passages"]
+    first, second = text.split(PASSAGE_SEPARATOR)
+    assert "refund window" in first and "Norway" in second
+    assert len(text) <= 1000
+    assert info["content_chars"] == len(PAGE) and info["chars"] == len(text)
+
+
+def test_unmatched_queries_fall_back_to_the_opening_and_budget_is_hard():
+    text, info = top_passages("quantum chromodynamics", PAGE, max_chars=300)
+    assert not info["matched"]
+    assert PAGE.startswith(text.split(PASSAGE_SEPARATOR)[0])
+
+    text, info = top_passages("refund", "Refund " * 200, max_chars=50)
+    assert info["selected"] == 1 and len(text) == 50
+    assert top_passages("refund", "") == ("", {"passages": 0, "selected": 0, "matched": False, "chars": 0, "content_chars": 0})
@@ -0,0 +1,27 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from multi_tool_agent import agent
+from multi_tool_agent.context_packer import DEFAULT_CONTEXT_TOKEN_BUDGET, estimate_tokens
+from multi_tool_agent.hybrid_retrieval import hybrid_search
+from multi_tool_agent.request_context import rag_request_context
+
+TOPICS = ["refunds", "shipping", "passwords", "invoices", "warranty"]
+
+
+def test_batch_keeps_each_questions_top_chunks(monkeypatch):
+    # Chunks long enough that 3 per question overflow one question's budget
+    texts = [f"{topic} chunk {i}: " + f"details about {topic} " * 60 for topic in TOPICS for i in range(3)]
+    assert estimate_tokens("".join(texts)) > DEFAULT_CONTEXT_TOKEN_BUDGET
+    vector_db = FAISS.from_texts(texts, DeterministicFakeEmbedding(size=16))
+    monkeypatch.setattr(agent, "get_vector_db", lambda rag_name=None: vector_db)
+    questions = [f"what about {topic}" for topic in TOPICS]
+
+    with rag_request_context("batch_rag", "instructions"):
+        result = agent.rag_answer_batch(questions)
+
+    assert result["status"] == "success"
+    for question in questions:
+        documents, _ = hybrid_search(vector_db, question, k=3)
+        for document in documents:
+            assert document.page_content in result["answer"], question
@@ -0,0 +1,81 @@
+import math
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from rag_builder import save_and_publish_index
+from rag_lexical import BM25_B, BM25_K1, LexicalIndex, lexical_index_exists, tokenize, write_lexical_index
+from rag_manifest import IngestionManifest
+from rag_snapshots import current_index_dir
+
+TEXTS = [
+    "The refund service returns error E1234 when the refund times out.",
+    "Passwords are reset from the account page.",
+    "",
+    "Naïve café menus list the refund policy.",
+]
+
+
+class FixedEmbeddings(Embeddings):
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def _reference_bm25(query, texts):
+    docs = [tokenize(text) for text in texts]
+    avg_length = sum(len(doc) for doc in docs) / len(docs)
+    scores = {}
+    for term in dict.fromkeys(tokenize(query)):
+        df = sum(1 for doc in docs if term in doc)
+        if not df:
+            continue
+        idf = math.log(1.0 + (len(docs) - df + 0.5) / (df + 0.5))
+        for row, doc in enumerate(docs):
+            tf = doc.count(term)
+            if tf:
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * len(doc) / avg_length)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+    return scores
+
+
+def test_tokenize_drops_stopwords_and_splits_compounds():
+    assert tokenize("What is the SHL-OPQ32 score?") == ["shl-opq32", "shl", "opq32", "score"]
+    assert tokenize("v2.1 of the API") == ["v2.1", "v2", "1", "api"]
+
+
+def test_persisted_index_matches_reference_bm25(tmp_path):
+    write_lexical_index(str(tmp_path), "docs", TEXTS)
+    assert lexical_index_exists(str(tmp_path), "docs")
+    index = LexicalIndex(str(tmp_path), "docs")
+
+    assert index.num_docs == len(TEXTS)
+    assert index.document_frequency("refund") == 2
+    assert index.document_frequency("café") == 1
+    assert index.document_frequency("missing") == 0
+
+    for query in ["refund error", "naïve café refund", "password reset"]:
+        expected = _reference_bm25(query, TEXTS)
+        results = index.search(query, k=10)
+        assert {row: score for row, score, _ in results} == pytest.approx(expected)
+        assert [score for _, score, _ in results] == pytest.approx(sorted(expected.values(), reverse=True))
+    row, _, coverage = index.search("refund error unknownterm", k=1)[0]
+    assert row == 0 and coverage == pytest.approx(2 / 3)
+    assert index.search("the of and", k=10) == []
+
+
+def test_published_snapshot_rows_follow_faiss_positions(tmp_path):
+    embeddings = FixedEmbeddings()
+    vector_db = FAISS.from_embeddings(
+        list(zip(TEXTS, embeddings.embed_documents(TEXTS))), embeddings, ids=[f"id-{i}" for i in range(len(TEXTS))]
+    )
+    manifest = IngestionManifest(str(tmp_path / "unused.json"))
+    assert save_and_publish_index(vector_db, manifest, str(tmp_path), "docs", index_type="flat") is not None
+
+    index_dir = current_index_dir(str(tmp_path), "docs")
+    index = LexicalIndex(index_dir, "docs")
+    row = index.search("E1234", k=1)[0][0]
+    assert vector_db.docstore.search(vector_db.index_to_docstore_id[row]).page_content == TEXTS[0]
@@ -0,0 +1,57 @@
+import os
+import time
+
+from rag_snapshots import current_index_dir, garbage_collect_snapshots, new_snapshot_dir, publish_snapshot
+
+
+def _build(db_path, collection_name):
+    snapshot_dir = new_snapshot_dir(db_path)
+    with open(os.path.join(snapshot_dir, collection_name + ".faiss"), "w") as f:
+        f.write(collection_name)
+    publish_snapshot(db_path, collection_name, snapshot_dir)
+    return os.path.basename(snapshot_dir)
+
+
+def _age(db_path, name, seconds):
+    path = os.path.join(db_path, "snapshots", name)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_gc_keeps_other_collections_live_snapshots(tmp_path):
+    db_path = str(tmp_path)
+    other = _build(db_path, "other")
+    first = _build(db_path, "docs")
+    _age(db_path, other, 3600)
+    _age(db_path, first, 3600)
+    second = _build(db_path, "docs")
+    _age(db_path, second, 3600)
+
+    removed = garbage_collect_snapshots(db_path, "docs", grace_seconds=60)
+
+    assert removed == [first]
+    assert os.path.exists(os.path.join(current_index_dir(db_path, "other"), "other.faiss"))
+    assert os.path.exists(os.path.join(current_index_dir(db_path, "docs"), "docs.faiss"))
+
+
+def test_gc_respects_grace_period_of_the_collections_own_successor(tmp_path):
+    db_path = str(tmp_path)
+    first = _build(db_path, "docs")
+    _age(db_path, first, 3600)
+    _build(db_path, "docs")  # just published: readers may still hold `first`
+
+    assert garbage_collect_snapshots(db_path, "docs", grace_seconds=60) == []
+
+
+def test_gc_leaves_pre_snapshot_index_files_in_place(tmp_path):
+    db_path = str(tmp_path)
+    legacy_files = [tmp_path / "docs.faiss", tmp_path / "docs.pkl"]
+    for path in legacy_files:
+        path.write_text("checked-in index")
+    first = _build(db_path, "docs")
+    _age(db_path, first, 3600)
+    second = _build(db_path, "docs")
+    _age(db_path, second, 3600)
+
+    assert garbage_collect_snapshots(db_path, "docs", grace_seconds=60) == [first]
+    assert all(path.read_text() == "checked-in index" for path in legacy_files)
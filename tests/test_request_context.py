@@ -0,0 +1,77 @@
+import re
+import asyncio
+import random
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from google.adk.tools import FunctionTool
+
+from multi_tool_agent import agent
+from multi_tool_agent.request_context import rag_request_context
+
+RAG_NAMES = ["rag_alpha", "rag_beta", "rag_gamma"]
+
+
+def build_index(rag_name: str, generation: int) -> FAISS:
+    texts = [f"{rag_name} generation {generation} fact number {i}" for i in range(5)]
+    return FAISS.from_texts(texts, DeterministicFakeEmbedding(size=16))
+
+
+@pytest.fixture
+def indexes(monkeypatch):
+    """Serves one index per RAG name; bumping a RAG's generation simulates a newly published snapshot."""
+    generations = {name: 1 for name in RAG_NAMES}
+    loads = []
+
+    def fake_get_vector_db(rag_name=None):
+        rag_name = rag_name or agent.get_active_rag_name()
+        loads.append(rag_name)
+        return build_index(rag_name, generations[rag_name])
+
+    monkeypatch.setattr(agent, "get_vector_db", fake_get_vector_db)
+    return generations, loads
+
+
+async def _call_tool(tool: FunctionTool, **args):
+    # ADK runs each function call of a model response in its own task (asyncio.create_task
+    # in flows/llm_flows/functions.py) and calls sync tools inline through FunctionTool.run_async
+    return await asyncio.create_task(tool.run_async(args=args, tool_context=None))
+
+
+async def _request(rag_name: str, generations: dict):
+    instruction = f"instructions for {rag_name}"
+    tool = FunctionTool(agent.rag_answer)
+    with rag_request_context(rag_name, instruction):
+        await asyncio.sleep(random.random() / 100)
+        seen_instruction, _ = await agent.root_agent.canonical_instruction(None)
+        first = await _call_tool(tool, question=f"{rag_name} fact")
+        # A snapshot published mid-request must not change the index this request searches
+        generations[rag_name] += 1
+        await asyncio.sleep(random.random() / 100)
+        second = await _call_tool(tool, question=f"{rag_name} fact")
+    return rag_name, seen_instruction, first, second
+
+
+def test_overlapping_requests_see_only_their_own_rag(indexes):
+    generations, loads = indexes
+
+    async def run_all():
+        requests = [_request(RAG_NAMES[i % len(RAG_NAMES)], generations) for i in range(30)]
+        return await asyncio.gather(*requests)
+
+    results = asyncio.run(run_all())
+    for rag_name, seen_instruction, first, second in results:
+        assert seen_instruction == f"instructions for {rag_name}"
+        for response in (first, second):
+            assert response["status"] == "success"
+            assert set(re.findall(r"rag_\w+", response["answer"])) == {rag_name}
+        # Both tool calls of the request searched the same snapshot
+        assert set(re.findall(r"generation (\d+)", first["answer"])) == set(re.findall(r"generation (\d+)", second["answer"]))
+    # The index is resolved once per request and pinned for its later tool calls
+    assert len(loads) == len(results)
+
+
+def test_instruction_falls_back_outside_a_request():
+    assert agent.root_agent_instruction(None) == agent.ROOT_AGENT_INSTRUCTION
+    assert agent.get_active_rag_name() == agent.ACTIVE_RAG_NAME
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+from google.adk.events import Event
+from google.genai import types
+
+from multi_tool_agent.memory_store import MEMORY_SCHEMA
+from multi_tool_agent.session_store import SESSION_SCHEMA, SqliteSessionService
+from multi_tool_agent.sqlite_db import SqliteDatabase
+
+APP = "app"
+
+
+def _service(db_path) -> SqliteSessionService:
+    # Each call stands for one worker process: its own connections, writer and caches
+    return SqliteSessionService(SqliteDatabase(str(db_path), SESSION_SCHEMA + MEMORY_SCHEMA))
+
+
+def _event(text: str, **state) -> Event:
+    event = Event(author="user", invocation_id="inv", content=types.Content(role="user", parts=[types.Part(text=text)]))
+    if state:
+        event.actions.state_delta.update(state)
+    return event
+
+
+def _texts(session):
+    return [event.content.parts[0].text for event in session.events]
+
+
+def test_appended_events_reload_in_a_fresh_instance(tmp_path):
+    db_path = tmp_path / "sessions.db"
+
+    async def write():
+        service = _service(db_path)
+        session = await service.create_session(app_name=APP, user_id="alice", session_id="s1")
+        await service.append_event(session, _event("hello", topic="refunds", **{"user:lang": "en"}))
+        await service.append_event(session, _event("again"))
+
+    async def read():
+        return await _service(db_path).get_session(app_name=APP, user_id="alice", session_id="s1")
+
+    asyncio.run(write())
+    session = asyncio.run(read())
+    assert _texts(session) == ["hello", "again"]
+    assert session.state["topic"] == "refunds" and session.state["user:lang"] == "en"
+
+
+def test_concurrent_appends_from_threads_are_all_kept(tmp_path):
+    db_path = tmp_path / "sessions.db"
+    service = _service(db_path)
+    asyncio.run(service.create_session(app_name=APP, user_id="alice", session_id="s1"))
+    errors = []
+
+    def worker(n: int):
+        async def append_all():
+            session = await service.get_session(app_name=APP, user_id="alice", session_id="s1")
+            for i in range(20):
+                await service.append_event(session, _event(f"t{n}-{i}"))
+        try:
+            asyncio.run(append_all())
+        except Exception as e:  # surfaced below; a thread's exception would otherwise be lost
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    texts = _texts(asyncio.run(_service(db_path).get_session(app_name=APP, user_id="alice", session_id="s1")))
+    assert len(texts) == 80
+    for n in range(4):
+        assert [t for t in texts if t.startswith(f"t{n}-")] == [f"t{n}-{i}" for i in range(20)]
+
+
+def test_ensure_session_recreates_a_session_deleted_by_another_worker(tmp_path):
+    db_path = tmp_path / "sessions.db"
+    worker_a, worker_b = _service(db_path), _service(db_path)
+
+    async def run():
+        assert await worker_a.ensure_session(app_name=APP, user_id="alice", session_id="s1") is True
+        assert await worker_a.ensure_session(app_name=APP, user_id="alice", session_id="s1") is False
+        await worker_b.delete_session(app_name=APP, user_id="alice", session_id="s1")
+        created = await worker_a.ensure_session(app_name=APP, user_id="alice", session_id="s1")
+        return created, await worker_a.get_session(app_name=APP, user_id="alice", session_id="s1")
+
+    created, session = asyncio.run(run())
+    assert created is True and session is not None
+
+
+def test_append_recreates_a_session_deleted_during_a_run(tmp_path):
+    db_path = tmp_path / "sessions.db"
+    worker_a, worker_b = _service(db_path), _service(db_path)
+
+    async def run():
+        session = await worker_a.create_session(app_name=APP, user_id="alice", session_id="s1", state={"topic": "refunds"})
+        await worker_b.delete_session(app_name=APP, user_id="alice", session_id="s1")
+        await worker_a.append_event(session, _event("after delete"))
+        return await worker_b.get_session(app_name=APP, user_id="alice", session_id="s1")
+
+    session = asyncio.run(run())
+    assert _texts(session) == ["after delete"]
+    assert session.state["topic"] == "refunds"
@@ -0,0 +1,79 @@
+import json
+
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from multi_tool_agent.sse_events import EventProjector, sse_message
+
+
+def _event(*parts, author="rag_agent", **kwargs):
+    content = types.Content(role="model", parts=list(parts)) if parts else None
+    return Event(author=author, invocation_id="inv", content=content, **kwargs)
+
+
+def _decode(messages):
+    decoded = []
+    for message in messages:
+        assert message.startswith("data: ") and message.endswith("\n\n")
+        decoded.append(json.loads(message[len("data: "):]))
+    return [(item["event"], item["data"]) for item in decoded]
+
+
+def test_sse_message_is_one_compact_data_line():
+    assert sse_message("final", {"text": "hi"}) == 'data: {"event":"final","data":{"text":"hi"}}\n\n'
+
+
+def test_streamed_text_is_not_resent_by_the_aggregate():
+    projector = EventProjector()
+    assert _decode(projector.project(_event(types.Part(text="Hel"), partial=True))) == [
+        ("text_delta", {"author": "rag_agent", "text": "Hel"})
+    ]
+    assert _decode(projector.project(_event(types.Part(text="lo"), partial=True))) == [
+        ("text_delta", {"author": "rag_agent", "text": "lo"})
+    ]
+    # The aggregated event only closes the response
+    assert _decode(projector.project(_event(types.Part(text="Hello")))) == [
+        ("final", {"author": "rag_agent", "text": "Hello"})
+    ]
+    # Without streaming, the whole text is sent as one delta
+    assert _decode(projector.project(_event(types.Part(text="Again")))) == [
+        ("text_delta", {"author": "rag_agent", "text": "Again"}),
+        ("final", {"author": "rag_agent", "text": "Again"}),
+    ]
+
+
+def test_tool_calls_and_transfers_omit_arguments_and_outputs():
+    projector = EventProjector()
+    call = _event(types.Part(function_call=types.FunctionCall(name="rag_answer", args={"question": "secret"})))
+    response = _event(types.Part(function_response=types.FunctionResponse(
+        name="rag_answer", response={"status": "error", "error_message": "boom"},
+    )))
+    transfer = _event(
+        types.Part(function_response=types.FunctionResponse(name="transfer_to_agent", response={"result": None})),
+        author="root_agent", actions=EventActions(transfer_to_agent="rag_agent"),
+    )
+
+    assert _decode(projector.project(call)) == [("tool_start", {"author": "rag_agent", "tool": "rag_answer"})]
+    assert _decode(projector.project(response)) == [("tool_end", {"author": "rag_agent", "tool": "rag_answer", "status": "error"})]
+    assert _decode(projector.project(transfer)) == [
+        ("tool_end", {"author": "root_agent", "tool": "transfer_to_agent", "status": "success"}),
+        ("agent_transfer", {"author": "root_agent", "agent": "rag_agent"}),
+    ]
+
+
+def test_thoughts_are_hidden_and_errors_reported():
+    projector = EventProjector()
+    thought = _event(types.Part(text="thinking...", thought=True), types.Part(text="Answer"))
+    assert _decode(projector.project(thought)) == [
+        ("text_delta", {"author": "rag_agent", "text": "Answer"}),
+        ("final", {"author": "rag_agent", "text": "Answer"}),
+    ]
+    failed = _event(error_code="SAFETY", error_message="Blocked by safety filters")
+    assert _decode(projector.project(failed)) == [("error", {"message": "Blocked by safety filters"})]
+
+
+def test_debug_mode_prepends_the_raw_event():
+    messages = EventProjector(debug=True).project(_event(types.Part(text="Hi")))
+    events = _decode(messages)
+    assert events[0][0] == "debug" and events[0][1]["author"] == "rag_agent"
+    assert [name for name, _ in events[1:]] == ["text_delta", "final"]
@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import multiprocessing
+
+import pytest
+
+import user_store
+from user_store import UserStore
+
+
+def _add_users(path: str, prefix: str, count: int) -> None:
+    store = UserStore(path)
+    for i in range(count):
+        assert store.add_user(f"{prefix}{i}", "secret")
+
+
+def test_concurrent_signups_from_threads_are_all_kept(tmp_path):
+    path = str(tmp_path / "users.json")
+    threads = [threading.Thread(target=_add_users, args=(path, f"t{n}_", 10)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(path) as f:
+        assert len(json.load(f)) == 40
+
+
+@pytest.mark.skipif(user_store.fcntl is None, reason="cross-process locking needs fcntl")
+def test_concurrent_signups_from_processes_are_all_kept(tmp_path):
+    path = str(tmp_path / "users.json")
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_add_users, args=(path, f"p{n}_", 10)) for n in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    assert UserStore(path).exists("p0_9")
+    with open(path) as f:
+        assert len(json.load(f)) == 30
+
+
+def test_a_crash_mid_write_leaves_the_users_file_intact(tmp_path, monkeypatch):
+    path = str(tmp_path / "users.json")
+    store = UserStore(path)
+    assert store.add_user("alice", "secret")
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(user_store.json, "dump", crash)
+    with pytest.raises(OSError):
+        store.add_user("bob", "secret")
+
+    with open(path) as f:
+        assert json.load(f) == {"alice": "secret"}
+    assert sorted(os.listdir(tmp_path)) == ["users.json", "users.json.lock"]
+    assert store.verify("alice", "secret") and not store.exists("bob")
+
+
+def test_a_password_change_invalidates_the_cached_credential(tmp_path):
+    path = str(tmp_path / "users.json")
+    store = UserStore(path, reload_check_seconds=0, verified_ttl_seconds=3600)
+    assert store.add_user("alice", "old-password")
+    assert store.verify("alice", "old-password")
+
+    # Changed by another process (e.g. an admin editing the file)
+    with open(path, "w") as f:
+        json.dump({"alice": "new-password-123"}, f)
+
+    assert not store.verify("alice", "old-password")
+    assert store.verify("alice", "new-password-123")
+
+
+def test_verified_credentials_are_served_from_the_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "users.json")
+    store = UserStore(path, reload_check_seconds=3600, verified_ttl_seconds=3600)
+    assert store.add_user("alice", "secret")
+    assert store.verify("alice", "secret")
+    monkeypatch.setattr(user_store.hmac, "compare_digest", lambda a, b: pytest.fail("password compared again"))
+    assert store.verify("alice", "secret")
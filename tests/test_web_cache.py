@@ -0,0 +1,66 @@
+import asyncio
+import sqlite3
+
+from multi_tool_agent import web_cache
+from multi_tool_agent.web_cache import FetchResult, WebResultCache
+
+
+def test_waiters_survive_cancellation_of_the_fetching_request():
+    cache = WebResultCache(db_path=None)
+    fetches = []
+
+    async def fetch(stale_entry):
+        fetches.append(asyncio.current_task())
+        await asyncio.sleep(0.05)
+        return FetchResult({"page": "content"})
+
+    async def scenario():
+        owner = asyncio.create_task(cache.get_or_fetch("page:https://example.com/", fetch))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.get_or_fetch("page:https://example.com/", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        results = await asyncio.gather(*waiters)
+        assert owner.cancelled()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [value for value, _ in results] == [{"page": "content"}] * 3
+    # One waiter re-fetched; the others joined its fetch
+    assert len(fetches) == 2
+    assert sorted(source for _, source in results) == ["coalesced", "coalesced", "fetched"]
+    assert cache.stats()["inflight"] == 0
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = WebResultCache(db_path=None)
+    calls = 0
+
+    async def fetch(stale_entry):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return FetchResult(["result"])
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_fetch("search:google:q", fetch) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert calls == 1
+    assert all(value == ["result"] for value, _ in results)
+
+
+def test_expired_rows_are_purged_on_open_and_on_a_write_cadence(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "web.db")
+    rows = lambda: sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM web_cache").fetchone()[0]
+    cache = WebResultCache(ttl_seconds=-1, stale_seconds=0, db_path=db_path)
+    monkeypatch.setattr(web_cache, "PURGE_EVERY_WRITES", 3)
+    cache.put("search:google:a", ["a"])
+    cache.put("search:google:b", ["b"])
+    assert rows() == 2
+    cache.put("search:google:c", ["c"])
+    assert rows() == 0
+
+    cache.put("search:google:d", ["d"])
+    WebResultCache(ttl_seconds=-1, stale_seconds=0, db_path=db_path)
+    assert rows() == 0
@@ -0,0 +1,137 @@
+import os
+import json
+import hmac
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# How often the users file is stat'ed for changes made by other processes
+DEFAULT_RELOAD_CHECK_SECONDS = float(os.getenv("USER_STORE_RELOAD_CHECK_SECONDS", "1"))
+# How long a successful login is remembered (keeps future password hashing off the hot path)
+DEFAULT_VERIFIED_TTL_SECONDS = float(os.getenv("USER_STORE_VERIFIED_TTL_SECONDS", "60"))
+
+
+class UserStore:
+    """
+    In-memory view of users.json ({username: password}).
+
+    The file is parsed once and re-read only when its (mtime, size) changes, which is checked
+    at most every reload_check_seconds. Successful verifications are remembered for
+    verified_ttl_seconds. add_user holds a thread lock and an exclusive lock on
+    `<file>.lock`, re-reads the file, and replaces it atomically (temp file + rename), so
+    concurrent signups in any worker process cannot overwrite each other.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        reload_check_seconds: float = DEFAULT_RELOAD_CHECK_SECONDS,
+        verified_ttl_seconds: float = DEFAULT_VERIFIED_TTL_SECONDS,
+    ):
+        self.path = str(path)
+        self.reload_check_seconds = reload_check_seconds
+        self.verified_ttl_seconds = verified_ttl_seconds
+        self._lock = threading.RLock()
+        self._users: Dict[str, str] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._verified: Dict[Tuple[str, str], float] = {}
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_file(self) -> Dict[str, str]:
+        try:
+            with open(self.path, "r") as f:
+                users = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Users file {self.path} is malformed, treating it as empty: {e}")
+            return {}
+        return users if isinstance(users, dict) else {}
+
+    def _refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._checked_at < self.reload_check_seconds:
+                return
+            self._checked_at = now
+            signature = self._file_signature()
+            if not force and signature == self._signature:
+                return
+            self._users = self._read_file()
+            self._signature = signature
+            self._verified.clear()
+            logger.info(f"Loaded {len(self._users)} users from {self.path}")
+
+    def verify(self, username: str, password: str) -> bool:
+        self._refresh()
+        key = (username, hashlib.sha256(password.encode("utf-8")).hexdigest())
+        now = time.monotonic()
+        with self._lock:
+            expires = self._verified.get(key)
+            if expires is not None and expires > now:
+                return True
+            stored = self._users.get(username)
+            if not stored or not hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8")):
+                return False
+            self._verified[key] = now + self.verified_ttl_seconds
+            return True
+
+    def exists(self, username: str) -> bool:
+        self._refresh()
+        with self._lock:
+            return username in self._users
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def add_user(self, username: str, password: str) -> bool:
+        """Adds a user and persists the file. Returns False if the username already exists."""
+        with self._file_lock():
+            # Another process may have added users since our last read
+            users = self._read_file()
+            if username in users:
+                self._refresh(force=True)
+                return False
+            users[username] = password
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(users, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                # users.json is untouched; only the partial temp file needs to go
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._refresh(force=True)
+        return True